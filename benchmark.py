@@ -0,0 +1,767 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2015 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+"""
+MediaEval Person Discovery Task benchmarks.
+
+  - submission  End-to-end submission against a local Camomile stand-in.
+  - startup     Start-up time (and heavy imports) of short commands.
+  - evaluation  Differential test of evaluation.py against the original
+                (pandas, per query) algorithm on random and adversarial
+                data: per-query results must be identical.
+  - leaderboard Burst of submissions (and deletion) consumed by the
+                leaderboard worker: scores must be identical to those of
+                evaluation.py.
+
+Usage:
+  benchmark [options] submission
+  benchmark [options] startup
+  benchmark [options] evaluation
+  benchmark [options] leaderboard
+
+Options:
+  -h --help                Show this screen.
+  --videos=<videos>        Number of videos in synthetic corpus [default: 100]
+  --shots=<shots>          Number of shots per video [default: 100]
+  --names=<names>          Number of labels per shot [default: 1]
+  --persons=<persons>      Number of distinct person names [default: 200]
+  --latency=<seconds>      Delay added to every request [default: 0]
+  --failure=<rate>         Ratio of requests failing with error 500
+                           [default: 0]
+  --seed=<seed>            Random seed [default: 0]
+  --bandwidth=<bytes/s>    Simulated upload bandwidth [default: 0]
+  --stream                 Use streaming label upload.
+  --gzip                   Send annotations gzip-compressed.
+  --no-gzip-server         Make server refuse gzip-compressed bodies.
+  --repeat=<n>             Number of runs per command [default: 5]
+  --scales=<videos>        Comma-separated numbers of videos of synthetic
+                           references [default: 1,10,100]
+  --runs=<n>               Number of submitted runs [default: 10]
+  --workers=<n>            Maximum number of concurrent downloads
+                           [default: 8]
+"""
+
+from docopt import docopt
+import pandas as pd
+import numpy as np
+import subprocess
+import tempfile
+import time
+import sys
+import os
+
+
+class Timer(object):
+    """Record elapsed time of successive named stages"""
+
+    def __init__(self):
+        super(Timer, self).__init__()
+        self.stages = []
+
+    def __call__(self, stage):
+        self._stage = stage
+        return self
+
+    def __enter__(self):
+        self._start = time.time()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.stages.append((self._stage, time.time() - self._start))
+
+    def report(self):
+        for stage, elapsed in self.stages:
+            print '%-24s %9.3f s' % (stage, elapsed)
+        print '%-24s %9.3f s' % ('TOTAL', sum(e for _, e in self.stages))
+
+
+def syntheticSubmission(shot, names=1, persons=200, seed=0):
+    """Random label and evidence submissions for a list of shots"""
+
+    random = np.random.RandomState(seed)
+
+    videoID, shotNumber = zip(*shot)
+    nLabels = len(shot) * names
+    personNames = np.array(['person_%05d' % p for p in range(persons)])
+
+    label = pd.DataFrame({
+        'videoID': np.repeat(videoID, names),
+        'shotNumber': np.repeat(shotNumber, names),
+        'personName': personNames[random.randint(persons, size=nLabels)],
+        'confidence': random.rand(nLabels)},
+        columns=['videoID', 'shotNumber', 'personName', 'confidence'])
+
+    # evidence is the first occurrence of each name
+    evidence = label.drop_duplicates('personName')
+    evidence = pd.DataFrame({
+        'personName': evidence['personName'].values,
+        'videoID': evidence['videoID'].values,
+        'shotNumber': evidence['shotNumber'].values,
+        'source': 'image'},
+        columns=['personName', 'videoID', 'shotNumber', 'source'])
+
+    return label, evidence
+
+
+def benchmarkSubmission(videos=100, shots=100, names=1, persons=200,
+                        latency=0., failure=0., seed=0, stream=False,
+                        bandwidth=0., compress=False, serverGzip=True):
+
+    from mockserver import MockCamomile, MockServer, USERNAME, PASSWORD
+    import submission
+
+    camomile = MockCamomile(latency=latency, failure=failure, seed=seed,
+                            bandwidth=bandwidth, gzip=serverGzip)
+    shot = camomile.populate(videos=videos, shots=shots)
+    label, evidence = syntheticSubmission(shot, names=names,
+                                          persons=persons, seed=seed)
+
+    print '%d videos, %d shots, %d labels, %d evidences' % (
+        videos, len(shot), len(label), len(evidence))
+
+    if stream:
+        # streaming upload reads labels from file
+        fd, pathToLabel = tempfile.mkstemp(suffix='.label')
+        os.close(fd)
+        label.to_csv(pathToLabel, sep=' ', header=False, index=False)
+
+    server = MockServer(camomile).start()
+    submission.GLOBAL_DEV_OR_TEST = 'test'
+
+    timer = Timer()
+    try:
+        with timer('initialize'):
+            submission.initialize(server.url,
+                                  username=USERNAME, password=PASSWORD,
+                                  compress=compress)
+
+        with timer('initializeForSubmission'):
+            submission.initializeForSubmission()
+
+        with timer('loadSubmission'):
+            label, evidence = submission.loadSubmission(
+                pathToLabel if stream else label, evidence, stream=stream)
+
+        with timer('createNewSubmission'):
+            submission.createNewSubmission(
+                'primary', 'primary', label, evidence)
+
+        with timer('getSubmissions'):
+            submission.getSubmissions()
+
+    except SystemExit:
+        print
+        print 'Submission failed during %s.' % (
+            timer.stages[-1][0] if timer.stages else 'start')
+
+    finally:
+        server.stop()
+        if stream:
+            os.remove(pathToLabel)
+
+    print
+    timer.report()
+    print
+    print submission.GLOBAL_SESSION.summary()
+
+
+# modules whose import cost dominates start-up time
+HEAVY_MODULES = ['numpy', 'pandas', 'Levenshtein',
+                 'requests', 'camomile', 'progressbar']
+
+# run a script and report (on stderr) which heavy modules it imported
+STARTUP_WRAPPER = """
+import sys, atexit, runpy
+def report():
+    sys.stderr.write('\\nIMPORTED:' + ' '.join(
+        m for m in %r if m in sys.modules) + '\\n')
+atexit.register(report)
+sys.argv = sys.argv[1:]
+runpy.run_path(sys.argv[0], run_name='__main__')
+""" % (HEAVY_MODULES, )
+
+
+def benchmarkStartup(repeat=5):
+
+    from mockserver import MockCamomile, MockServer, USERNAME, PASSWORD
+
+    camomile = MockCamomile()
+    camomile.populate(videos=1, shots=1)
+    server = MockServer(camomile).start()
+
+    login = ['--url=%s' % server.url,
+             '--login=%s' % USERNAME, '--password=%s' % PASSWORD]
+
+    commands = [
+        ['evaluation.py', '--help'],
+        ['evaluation.py'],
+        ['evaluation_MAP.py', '--help'],
+        ['submission.py', '--help'],
+        ['submission.py', 'date'] + login,
+        ['submission.py', 'list'] + login,
+    ]
+
+    print '%-24s %9s  %s' % ('command', 'time(ms)', 'heavy imports')
+
+    try:
+        for command in commands:
+            elapsed = []
+            for _ in range(repeat):
+                t = time.time()
+                process = subprocess.Popen(
+                    [sys.executable, '-c', STARTUP_WRAPPER] + command,
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                _, stderr = process.communicate()
+                elapsed.append(time.time() - t)
+            imported = stderr.rsplit('IMPORTED:', 1)[-1].strip()
+            print '%-24s %9.0f  %s' % (
+                ' '.join(command[:2]), 1000. * np.median(elapsed),
+                imported if imported else '-')
+    finally:
+        server.stop()
+
+    # import cost of each heavy module, in a fresh interpreter
+    print
+    print '%-24s %9s' % ('module', 'time(ms)')
+    for module in HEAVY_MODULES:
+        elapsed = []
+        for _ in range(repeat):
+            output = subprocess.check_output([
+                sys.executable, '-c',
+                'import time; t = time.time(); import %s; '
+                'print time.time() - t' % module])
+            elapsed.append(float(output))
+        print '%-24s %9.0f' % (module, 1000. * np.median(elapsed))
+
+# =============================================================================
+# EVALUATION
+# =============================================================================
+
+def syntheticEvaluation(videos=10, shots=100, persons=200, seed=0):
+    """Random reference and hypothesis, full of evaluation corner cases
+
+    - hypothesis names are either exact, one character longer (Levenshtein
+      ratio of 24/25 = 0.96, i.e. just above default threshold), with one
+      substituted character (just below) or unrelated to any query, and
+      some persons are only referred to by one kind of variant;
+    - confidences are heavily tied and shots are often returned twice
+      with different confidences;
+    - some queries have no relevant shots and some are duplicated;
+    - evidence sources include 'both' on reference and hypothesis sides;
+    - half of the shots are in the consensus subset.
+
+    Returns
+    -------
+    files : dict
+        DataFrame of each file type (shot, ref, eviref, label, evidence and
+        consensus), and list of queries.
+    """
+
+    random = np.random.RandomState(seed)
+
+    videoID = np.repeat(['video_%04d' % v for v in range(videos)], shots)
+    shotNumber = np.tile(np.arange(1, shots + 1), videos)
+    nShots = len(videoID)
+
+    shot = pd.DataFrame({
+        'videoID': videoID, 'shotNumber': shotNumber,
+        'startTime': shotNumber - 1., 'endTime': 1. * shotNumber,
+        'startFrame': 25 * (shotNumber - 1), 'endFrame': 25 * shotNumber},
+        columns=['videoID', 'shotNumber', 'startTime', 'endTime',
+                 'startFrame', 'endFrame'])
+
+    # frequent and rare persons
+    names = np.array(['person_%05d' % p for p in range(persons)])
+    popularity = 1. / np.arange(1, persons + 1)
+    popularity /= popularity.sum()
+
+    # reference (with a few duplicate lines)
+    rows = np.repeat(np.arange(nShots), random.poisson(1., size=nShots))
+    reference = pd.DataFrame({
+        'videoID': videoID[rows], 'shotNumber': shotNumber[rows],
+        'personName': names[random.choice(persons, size=len(rows),
+                                          p=popularity)]},
+        columns=['videoID', 'shotNumber', 'personName'])
+    reference = pd.concat([reference, reference.iloc[:len(reference) // 50]])
+
+    # reference evidences are chosen among reference labels
+    sources = np.array(['audio', 'image', 'both'])
+    evireference = reference.iloc[
+        random.rand(len(reference)) < 0.3].drop_duplicates()
+    evireference = pd.DataFrame({
+        'videoID': evireference['videoID'].values,
+        'shotNumber': evireference['shotNumber'].values,
+        'personName': evireference['personName'].values,
+        'source': sources[random.randint(3, size=len(evireference))]},
+        columns=['videoID', 'shotNumber', 'personName', 'source'])
+
+    # hypothesis names
+    letters = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+    nLabels = 2 * nShots
+    p = random.choice(persons, size=nLabels, p=popularity)
+    person = names[p]
+    # persons always referred to with the same kind of variant, but one
+    # out of four for which it changes from one label to the other
+    variant = np.where(p % 4 == 3, random.randint(4, size=nLabels), p % 4)
+    hypothesis = np.array([
+        p if v == 0 else
+        p + letters[random.randint(3)] if v == 1 else
+        p[:-1] + letters[random.randint(26)] if v == 2 else
+        'other_%05d' % random.randint(persons)
+        for p, v in zip(person, variant)], dtype=object)
+
+    # tied confidences (e.g. constant 9.0) and random ones
+    confidence = np.where(random.rand(nLabels) < 0.5,
+                          np.array([9., 1., 0.5])[random.randint(
+                              3, size=nLabels)],
+                          random.rand(nLabels))
+
+    rows = random.randint(nShots, size=nLabels)
+    label = pd.DataFrame({
+        'videoID': videoID[rows], 'shotNumber': shotNumber[rows],
+        'personName': hypothesis, 'confidence': confidence},
+        columns=['videoID', 'shotNumber', 'personName', 'confidence'])
+
+    # same shots returned again, with other confidences
+    duplicate = label.iloc[random.rand(nLabels) < 0.2].copy()
+    duplicate['confidence'] = random.rand(len(duplicate))
+    label = pd.concat([label, duplicate])
+    label = label.iloc[random.permutation(len(label))]
+
+    # one evidence per name: either a labeled shot, or (more likely to be
+    # correct) a reference evidence of the person it stands for
+    evidence = label.drop_duplicates('personName')
+    evidence = pd.DataFrame({
+        'personName': evidence['personName'].values,
+        'videoID': evidence['videoID'].values,
+        'shotNumber': evidence['shotNumber'].values,
+        'source': sources[random.choice(3, size=len(evidence),
+                                        p=[.45, .45, .1])]},
+        columns=['personName', 'videoID', 'shotNumber', 'source'])
+    standsFor = dict(zip(hypothesis, person))
+    for i, personName in enumerate(evidence['personName']):
+        candidates = evireference[
+            evireference.personName == standsFor[personName]]
+        if len(candidates) == 0 or random.rand() < 0.3:
+            continue
+        c = candidates.iloc[random.randint(len(candidates))]
+        evidence.loc[i, 'videoID'] = c['videoID']
+        evidence.loc[i, 'shotNumber'] = c['shotNumber']
+        if c['source'] != 'both':
+            evidence.loc[i, 'source'] = c['source']
+
+    consensus = shot.iloc[random.rand(nShots) < 0.5]
+
+    # queries with and without relevant shots, some of them twice
+    queries = sorted(set(evireference['personName']))
+    queries += ['nobody_%05d' % q for q in range(5)]
+    queries += queries[:5]
+
+    return {'shot': shot, 'ref': reference, 'eviref': evireference,
+            'label': label, 'evidence': evidence, 'consensus': consensus,
+            'queries': queries}
+
+
+# original evaluation.py algorithm (pandas, one query at a time), kept
+# as reference implementation for `benchmark evaluation`
+def legacyEvaluation(shot, reference, evireference, label, evidence,
+                     queries, threshold=0.95, consensus=None):
+
+    from common import loadShot, loadLabel, loadEvidence
+    from common import loadLabelReference, loadEvidenceReference
+    from Levenshtein import ratio
+    import warnings
+
+    shot = loadShot(shot)
+    label = loadLabel(label)
+    evidence = loadEvidence(evidence)
+
+    if consensus:
+        consensus = loadShot(consensus)
+        mask = label.apply(
+            lambda x: (x['videoID'], x['shotNumber']) in set(consensus.index),
+            axis=1)
+        label = label[mask]
+
+    reference = loadLabelReference(reference)
+    evireference = loadEvidenceReference(evireference)
+
+    def computeAveragePrecision(vReturned, vRelevant):
+
+        nReturned = len(vReturned)
+        nRelevant = len(vRelevant)
+
+        if nRelevant == 0:
+            return 1.
+
+        if nReturned == 0:
+            return 0.
+
+        returnedIsRelevant = np.array(
+            [item in vRelevant for item in vReturned])
+        precision = np.cumsum(returnedIsRelevant) / (
+            1. + np.arange(nReturned))
+
+        return np.sum(precision * returnedIsRelevant) / nRelevant
+
+    averagePrecision = {}
+    correctness = {}
+
+    for query in queries:
+
+        ratios = [(personName, ratio(query, personName))
+                  for personName in evidence.personName.unique()]
+        best = sorted(ratios, key=lambda x: x[1], reverse=True)[0]
+
+        personName = best[0] if best[1] > threshold else None
+
+        qRelevant = reference[reference.personName == query]
+        qRelevant = qRelevant[['videoID', 'shotNumber']]
+        qRelevant = set((videoID, shotNumber)
+                        for _, videoID, shotNumber in qRelevant.itertuples())
+
+        qReturned = label[label.personName == personName]
+
+        if len(qReturned) == 0:
+            averagePrecision[query] = 0. if len(qRelevant) > 0. else 1.
+
+        else:
+            # DataFrame.sort is deprecated in recent pandas
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', FutureWarning)
+                qReturned = (qReturned.groupby(['videoID', 'shotNumber'])
+                                      .aggregate(np.max)
+                                      .sort(['confidence'], ascending=False))
+            qReturned = list(qReturned.index)
+            averagePrecision[query] = computeAveragePrecision(qReturned,
+                                                              qRelevant)
+
+        if personName is None:
+            correctness[query] = 0. if len(qRelevant) > 0. else 1.
+            continue
+
+        qRelevant = evireference[evireference.personName == query]
+        qRelevant = qRelevant[['videoID', 'shotNumber', 'source']]
+
+        _qRelevant = set([])
+        for _, videoID, shotNumber, source in qRelevant.itertuples():
+
+            if source == 'both':
+                _qRelevant.add((videoID, shotNumber, 'audio'))
+                _qRelevant.add((videoID, shotNumber, 'image'))
+            else:
+                _qRelevant.add((videoID, shotNumber, source))
+
+        qRelevant = _qRelevant
+
+        qReturned = evidence[evidence.personName == personName][[
+            'videoID', 'shotNumber', 'source']]
+        for _, videoID, shotNumber, source in qReturned.itertuples():
+            break
+
+        if (videoID, shotNumber, source) in qRelevant:
+            correctness[query] = 1. if best[1] > threshold else 0.
+        else:
+            correctness[query] = 0.
+
+    return averagePrecision, correctness
+
+
+def fastEvaluation(shot, reference, evireference, label, evidence,
+                   queries, threshold=0.95, consensus=None):
+
+    from evaluation import loadFiles, evaluateQuery
+    from collections import OrderedDict
+
+    reference, evireference, label, evidence = loadFiles(
+        shot, reference, evireference, label, evidence, consensus=consensus)
+
+    names = evidence.uniqueNames()
+
+    averagePrecision = {}
+    correctness = {}
+    for query in OrderedDict.fromkeys(queries):
+        result = evaluateQuery(query, names, reference, evireference,
+                               label, evidence, threshold)
+        averagePrecision[query] = result['averagePrecision']
+        correctness[query] = result['correctness']
+
+    return averagePrecision, correctness
+
+
+def benchmarkEvaluation(scales=[1, 10, 100], shots=100, persons=200,
+                        seed=0, repeat=5):
+
+    import shutil
+
+    print '%6s %6s %9s %5s %7s %7s %10s %10s %8s  %s' % (
+        'videos', 'seed', 'consensus', 'lev', 'queries', 'labels',
+        'legacy(s)', 'fast(s)', 'speedup', 'result')
+
+    failures = 0
+    legacyTotal, fastTotal = 0., 0.
+
+    for videos in scales:
+        for s in range(seed, seed + repeat):
+
+            files = syntheticEvaluation(videos=videos, shots=shots,
+                                        persons=persons, seed=s)
+            queries = files['queries']
+
+            directory = tempfile.mkdtemp(prefix='evaluation')
+            paths = {}
+            for fileType, frame in files.items():
+                if fileType == 'queries':
+                    continue
+                paths[fileType] = os.path.join(
+                    directory, 'synthetic.' + fileType)
+                frame.to_csv(paths[fileType], sep=' ', header=False,
+                             index=False, float_format='%r')
+
+            failed = False
+
+            # default threshold and one equal to the Levenshtein ratio of
+            # names one character longer (which must then be rejected)
+            for consensus in [None, paths['consensus']]:
+                for threshold in [0.95, 24. / 25]:
+
+                    args = [paths['shot'], paths['ref'], paths['eviref'],
+                            paths['label'], paths['evidence'], queries]
+                    kwargs = {'threshold': threshold,
+                              'consensus': consensus}
+
+                    t = time.time()
+                    expected = legacyEvaluation(*args, **kwargs)
+                    legacy = time.time() - t
+
+                    t = time.time()
+                    actual = fastEvaluation(*args, **kwargs)
+                    fast = time.time() - t
+
+                    legacyTotal += legacy
+                    fastTotal += fast
+
+                    different = [
+                        query for query in queries
+                        if (expected[0][query] != actual[0][query] or
+                            expected[1][query] != actual[1][query])]
+
+                    print '%6d %6d %9s %5.2f %7d %7d %10.3f %10.3f ' \
+                          '%7.1fx  %s' % (
+                              videos, s, 'yes' if consensus else 'no',
+                              threshold, len(queries), len(files['label']),
+                              legacy, fast, legacy / fast,
+                              'different for %s' % ', '.join(different[:3])
+                              if different else 'identical')
+                    sys.stdout.flush()
+
+                    failed |= bool(different)
+
+            # keep files of failed runs to reproduce them
+            if failed:
+                failures += 1
+                print 'files kept in %s' % directory
+            else:
+                shutil.rmtree(directory)
+
+    print
+    print 'overall speedup: %.1fx' % (legacyTotal / fastTotal)
+
+    if failures:
+        sys.exit('%d synthetic runs led to different results.' % failures)
+
+
+def benchmarkLeaderboard(videos=10, shots=100, persons=200, runs=10,
+                         workers=8, latency=0., seed=0):
+
+    from mockserver import MockCamomile, MockServer, USERNAME, PASSWORD
+    from mockserver import USER_ROBOT_LEADERBOARD
+    from leaderboard import Leaderboard, dequeueMessages, processMessages
+    from evaluation import computeScores
+    import submission
+    import shutil
+
+    camomile = MockCamomile(latency=latency, seed=seed)
+    camomile.populate(videos=videos, shots=shots)
+
+    # synthetic reference, renamed after videos of the mock corpus
+    files = syntheticEvaluation(videos=videos, shots=shots,
+                                persons=persons, seed=seed)
+    queries = files['queries']
+    videoIDs = dict(('video_%04d' % v, 'VIDEO_%06d' % v)
+                    for v in range(videos))
+    for fileType in ['shot', 'ref', 'eviref', 'label', 'evidence']:
+        files[fileType]['videoID'] = files[fileType]['videoID'].map(videoIDs)
+
+    # runs only differ by their confidence scores. labels and evidences
+    # are sorted by video, i.e. in the order in which they are stored on
+    # the server (first evidence of each name is the one evaluated)
+    random = np.random.RandomState(seed)
+    for fileType in ['label', 'evidence']:
+        files[fileType] = files[fileType].sort_values('videoID',
+                                                      kind='mergesort')
+    label = files['label']
+    labels = []
+    for r in range(runs):
+        label = label.copy()
+        label['confidence'] = random.permutation(label['confidence'].values)
+        labels.append(label)
+
+    directory = tempfile.mkdtemp(prefix='leaderboard')
+    paths = {}
+    for fileType, frame in files.items():
+        if fileType == 'queries':
+            continue
+        paths[fileType] = os.path.join(directory, 'synthetic.' + fileType)
+        frame.to_csv(paths[fileType], sep=' ', header=False, index=False,
+                     float_format='%r')
+
+    print '%d videos, %d runs of %d labels, %d queries' % (
+        videos, runs, len(files['label']), len(queries))
+
+    server = MockServer(camomile).start()
+    submission.GLOBAL_DEV_OR_TEST = 'test'
+
+    timer = Timer()
+    failed = []
+    try:
+        submission.initialize(server.url,
+                              username=USERNAME, password=PASSWORD)
+        submission.initializeForSubmission()
+
+        # burst of submissions (the last one being deleted right away)
+        names = ['primary'] + ['contrastive%d' % r for r in range(1, runs)]
+        with timer('createNewSubmission'):
+            for name, label in zip(names, labels):
+                label, evidence = submission.loadSubmission(
+                    label, files['evidence'])
+                submission.createNewSubmission(
+                    'primary' if name == 'primary' else 'contrastive',
+                    name, label, evidence, showProgress=False)
+
+        deleted = submission.getSubmissions().iloc[-1]
+        submission.GLOBAL_CLIENT.deleteLayer(deleted['label'])
+        submission.GLOBAL_CLIENT.deleteLayer(deleted['evidence'])
+        submission.GLOBAL_CLIENT.enqueue(submission.getSubmissionQueue(), {
+            'deletedBy': submission.getMe()._id,
+            'id_label': deleted['label'],
+            'id_evidence': deleted['evidence']})
+
+        submission.initialize(server.url, username=USER_ROBOT_LEADERBOARD,
+                              password=PASSWORD)
+
+        with timer('load reference'):
+            leaderboard = Leaderboard(paths['shot'], paths['ref'],
+                                      paths['eviref'], queries=queries)
+
+        with timer('leaderboard'):
+            while True:
+                messages = dequeueMessages(
+                    submission.getSubmissionQueue(), batch=100)
+                if not messages:
+                    break
+                processMessages(leaderboard, messages, workers=workers)
+
+        leaderboard.printTable()
+        print
+
+        # compare with evaluation.py scores of the very same runs
+        expected = {}
+        with timer('evaluation'):
+            for name, label in zip(names, labels):
+                paths['label'] = os.path.join(directory, name + '.label')
+                label.to_csv(paths['label'], sep=' ', header=False,
+                             index=False, float_format='%r')
+                averagePrecision, correctness = fastEvaluation(
+                    paths['shot'], paths['ref'], paths['eviref'],
+                    paths['label'], paths['evidence'], queries)
+                expected[name] = computeScores(
+                    queries, averagePrecision, correctness)
+
+        actual = dict((entry['name'], (entry['EwMAP'], entry['MAP'],
+                                       entry['C']))
+                      for entry in leaderboard.entries.values())
+
+        if deleted['name'] in actual:
+            failed.append('deleted submission %s' % deleted['name'])
+        del expected[deleted['name']]
+
+        failed.extend(name for name in sorted(expected)
+                      if actual.get(name) != expected[name])
+
+    finally:
+        server.stop()
+        shutil.rmtree(directory)
+
+    timer.report()
+    print
+    print submission.GLOBAL_SESSION.summary()
+
+    if failed:
+        sys.exit('Different leaderboard for %s.' % ', '.join(failed))
+    print
+    print 'leaderboard identical to evaluation.py'
+
+
+if __name__ == '__main__':
+
+    arguments = docopt(__doc__)
+
+    if arguments['submission']:
+        benchmarkSubmission(videos=int(arguments['--videos']),
+                            shots=int(arguments['--shots']),
+                            names=int(arguments['--names']),
+                            persons=int(arguments['--persons']),
+                            latency=float(arguments['--latency']),
+                            failure=float(arguments['--failure']),
+                            seed=int(arguments['--seed']),
+                            stream=arguments['--stream'],
+                            bandwidth=float(arguments['--bandwidth']),
+                            compress=arguments['--gzip'],
+                            serverGzip=not arguments['--no-gzip-server'])
+
+    if arguments['startup']:
+        benchmarkStartup(repeat=int(arguments['--repeat']))
+
+    if arguments['evaluation']:
+        benchmarkEvaluation(scales=[int(videos) for videos in
+                                    arguments['--scales'].split(',')],
+                            shots=int(arguments['--shots']),
+                            persons=int(arguments['--persons']),
+                            seed=int(arguments['--seed']),
+                            repeat=int(arguments['--repeat']))
+
+    if arguments['leaderboard']:
+        benchmarkLeaderboard(videos=int(arguments['--videos']),
+                             shots=int(arguments['--shots']),
+                             persons=int(arguments['--persons']),
+                             runs=int(arguments['--runs']),
+                             workers=int(arguments['--workers']),
+                             latency=float(arguments['--latency']),
+                             seed=int(arguments['--seed']))
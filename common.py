@@ -26,30 +26,909 @@
 # AUTHORS
 # Hervé BREDIN - http://herve.niderb.fr
 
+from collections import namedtuple, OrderedDict
+import bz2
+import json
+import io
+import os
+
+import numpy as np
 import pandas as pd
 
 
+# =============================================================================
+# FILE FORMATS
+# =============================================================================
+
+# text files with these extensions are decompressed on the fly
+COMPRESSION = {'.gz': 'gzip', '.bz2': 'bz2', '.zst': 'zstd'}
+
+# columnar files (Parquet or Arrow IPC files with the same columns as text
+# files) need pyarrow
+COLUMNAR = ['.parquet', '.arrow']
+
+# formats of RecordWriter files
+RECORD_FORMATS = ['.jsonl', '.csv', '.parquet']
+
+# columns of each file type
+SCHEMA = {
+    'shot': ['videoID', 'shotNumber', 'startTime', 'endTime',
+             'startFrame', 'endFrame'],
+    'label': ['videoID', 'shotNumber', 'personName', 'confidence'],
+    'evidence': ['personName', 'videoID', 'shotNumber', 'source'],
+    'ref': ['videoID', 'shotNumber', 'personName'],
+    'eviref': ['videoID', 'shotNumber', 'personName', 'source'],
+    'segments': ['videoID', 'startTime', 'endTime', 'personName',
+                 'confidence'],
+}
+
+
+def extension(path):
+    return os.path.splitext(path)[1].lower()
+
+
+def fileType(path):
+    """File type (key of SCHEMA) inferred from path, e.g. 'x.label.gz'"""
+    root, ext = os.path.splitext(path)
+    if ext.lower() in COMPRESSION or ext.lower() in COLUMNAR:
+        root, ext = os.path.splitext(root)
+    ext = ext.lower()[1:]
+    return ext if ext in SCHEMA else None
+
+
+class BZ2Reader(object):
+    """Readable bz2 stream, decompressed from file object `raw`
+
+    Unlike bz2.BZ2File, it reads compressed data through `raw` (so that
+    `raw.tell` follows decompression). Concatenated streams (e.g. from
+    pbzip2) are supported.
+    """
+
+    def __init__(self, raw):
+        super(BZ2Reader, self).__init__()
+        self._raw = raw
+        self._decompressor = bz2.BZ2Decompressor()
+        self._buffer = ''
+
+    def _decompress(self, data):
+        decompressed = []
+        while data:
+            try:
+                decompressed.append(self._decompressor.decompress(data))
+            except EOFError:
+                # previous stream ended exactly at the end of last data
+                self._decompressor = bz2.BZ2Decompressor()
+                continue
+            # data following the end of a stream starts a new one
+            data = self._decompressor.unused_data
+            if data:
+                self._decompressor = bz2.BZ2Decompressor()
+        return ''.join(decompressed)
+
+    def read(self, size=-1):
+        chunks = [self._buffer]
+        available = len(self._buffer)
+        while size < 0 or available < size:
+            data = self._raw.read(1 << 16)
+            if not data:
+                break
+            chunk = self._decompress(data)
+            chunks.append(chunk)
+            available += len(chunk)
+        data = ''.join(chunks)
+        if size < 0:
+            size = len(data)
+        self._buffer = data[size:]
+        return data[:size]
+
+    def close(self):
+        pass
+
+
+class TextFile(object):
+    """Text file opened for reading, decompressed on the fly if needed
+
+    Iterating over it yields lines. `tell` is the position in the file
+    as stored on disk (i.e. compressed), to report progress.
+    """
+
+    def __init__(self, path):
+        super(TextFile, self).__init__()
+
+        self._raw = io.open(path, 'rb')
+        compression = COMPRESSION.get(extension(path), None)
+
+        # zstd and bz2 streams are read by chunks
+        self._chunked = compression in ['zstd', 'bz2']
+
+        if compression == 'gzip':
+            import gzip
+            self._file = gzip.GzipFile(fileobj=self._raw, mode='rb')
+
+        elif compression == 'bz2':
+            self._file = BZ2Reader(self._raw)
+
+        elif compression == 'zstd':
+            import zstandard
+            self._file = zstandard.ZstdDecompressor().stream_reader(
+                self._raw)
+
+        else:
+            self._file = self._raw
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def __iter__(self):
+
+        if not self._chunked:
+            for line in self._file:
+                yield line
+            return
+
+        remainder = ''
+        while True:
+            chunk = self._file.read(1 << 20)
+            if not chunk:
+                break
+            lines = (remainder + chunk).split('\n')
+            remainder = lines.pop()
+            for line in lines:
+                yield line + '\n'
+        if remainder:
+            yield remainder
+
+    def tell(self):
+        return self._raw.tell()
+
+    def close(self):
+        self._file.close()
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
+def createTextFile(path):
+    """Open text file for writing, compressed according to its extension"""
+
+    compression = COMPRESSION.get(extension(path), None)
+
+    if compression == 'gzip':
+        import gzip
+        return gzip.open(path, 'wb')
+
+    if compression == 'bz2':
+        import bz2
+        return bz2.BZ2File(path, 'wb')
+
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor().stream_writer(open(path, 'wb'))
+
+    return open(path, 'wb')
+
+
+# columns are converted from/to numpy arrays directly
+# (rather than through pandas) to support older versions of pandas
+def loadColumnar(path):
+
+    import pyarrow
+
+    if extension(path) == '.parquet':
+        import pyarrow.parquet
+        table = pyarrow.parquet.read_table(path)
+    else:
+        with pyarrow.OSFile(path, 'rb') as f:
+            table = pyarrow.ipc.open_file(f).read_all()
+
+    columns = [column.name if hasattr(column, 'name') else name
+               for name, column in zip(table.schema.names, table.columns)]
+    return pd.DataFrame(
+        dict((name, np.concatenate(
+            [chunk.to_numpy(zero_copy_only=False)
+             for chunk in table.column(name).chunks]))
+            for name in columns),
+        columns=columns)
+
+
+def loadTable(path, names):
+    """Load text (possibly compressed) or columnar file as a DataFrame
+
+    `path` can also be a file-like object, read as (uncompressed) text.
+    """
+
+    if not isinstance(path, basestring):
+        return pd.read_table(path, sep=' ', names=names)
+
+    ext = extension(path)
+
+    if ext in COLUMNAR:
+        frame = loadColumnar(path)
+        missing = [name for name in names if name not in frame.columns]
+        if missing:
+            msg = '%s is missing columns %s.' % (path, ', '.join(missing))
+            raise ValueError(msg)
+        return frame[names]
+
+    # pandas decompresses gzip and bz2 files itself
+    if COMPRESSION.get(ext, None) == 'zstd':
+        with TextFile(path) as f:
+            return pd.read_table(f, sep=' ', names=names)
+
+    return pd.read_table(path, sep=' ', names=names)
+
+
+def saveTable(frame, path, compression='zstd'):
+    """Save DataFrame (as returned by load* functions) to `path`
+
+    Format is chosen by extension: columnar (.parquet or .arrow),
+    compressed text (.gz, .bz2, .zst) or plain text. `compression` is the
+    codec of Parquet files.
+    """
+
+    if 'videoID' not in frame.columns:
+        frame = frame.reset_index()
+
+    ext = extension(path)
+
+    if ext in COLUMNAR:
+
+        import pyarrow
+
+        table = pyarrow.Table.from_arrays(
+            [pyarrow.array(frame[column].values) for column in frame.columns],
+            names=list(frame.columns))
+
+        if ext == '.parquet':
+            import pyarrow.parquet
+            pyarrow.parquet.write_table(table, path, compression=compression)
+            return
+
+        with pyarrow.OSFile(path, 'wb') as f:
+            writer = pyarrow.ipc.RecordBatchFileWriter(f, table.schema)
+            writer.write_table(table)
+            writer.close()
+        return
+
+    # text, with zero-padded shot numbers and lossless floats
+    formats = []
+    for column in frame.columns:
+        if column == 'shotNumber':
+            formats.append('%06d')
+        elif frame[column].dtype.kind == 'f':
+            formats.append('%r')
+        else:
+            formats.append('%s')
+    template = ' '.join(formats) + '\n'
+
+    with createTextFile(path) as f:
+        # write by chunks of rows to bound memory usage
+        for start in range(0, len(frame), 100000):
+            chunk = frame.iloc[start:start + 100000]
+            f.write(''.join(template % row for row in zip(
+                *[chunk[column].values.tolist() for column in frame.columns])))
+
+
+class RecordWriter(object):
+    """Write records (dicts) to file as they come
+
+    Format is chosen by extension: JSON lines (.jsonl), CSV (.csv) or
+    Parquet (.parquet, written by batches of `batchSize` records).
+
+    Parameters
+    ----------
+    path : str
+    fields : list
+        List of (name, type) pairs, where type is str, int or float.
+        Missing values are None.
+    """
+
+    def __init__(self, path, fields, batchSize=10000):
+        super(RecordWriter, self).__init__()
+
+        self.fields = fields
+        self.names = [name for name, _ in fields]
+        self.format = extension(path)[1:]
+        self.batchSize = batchSize
+
+        if self.format == 'parquet':
+            import pyarrow
+            import pyarrow.parquet
+            types = {str: pyarrow.string(), int: pyarrow.int64(),
+                     float: pyarrow.float64()}
+            self._schema = pyarrow.schema(
+                [pyarrow.field(name, types[type_]) for name, type_ in fields])
+            self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+            self._batch = []
+
+        elif self.format == 'csv':
+            import csv
+            self._file = open(path, 'wb')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.names)
+
+        elif self.format == 'jsonl':
+            self._file = open(path, 'w')
+
+        else:
+            msg = 'Unsupported export format: %s.' % path
+            raise ValueError(msg)
+
+    def write(self, record):
+
+        if self.format == 'parquet':
+            self._batch.append(record)
+            if len(self._batch) >= self.batchSize:
+                self._flush()
+
+        elif self.format == 'csv':
+            self._writer.writerow(
+                ['' if record[name] is None else
+                 repr(record[name]) if isinstance(record[name], float) else
+                 record[name] for name in self.names])
+
+        else:
+            self._file.write(json.dumps(
+                OrderedDict((name, record[name]) for name in self.names)))
+            self._file.write('\n')
+
+    def _flush(self):
+        import pyarrow
+        arrays = [pyarrow.array([record[name] for record in self._batch],
+                                type=field.type)
+                  for name, field in zip(self.names, self._schema)]
+        self._writer.write_table(
+            pyarrow.Table.from_arrays(arrays, schema=self._schema))
+        self._batch = []
+
+    def close(self):
+        if self.format == 'parquet':
+            if self._batch:
+                self._flush()
+            self._writer.close()
+        else:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
 def loadShot(shot):
-    names = ['videoID', 'shotNumber', 'startTime', 'endTime',
-             'startFrame', 'endFrame']
-    return pd.read_table(shot, sep=' ', names=names, index_col=[0, 1])
+    names = SCHEMA['shot']
+    return loadTable(shot, names).set_index(names[:2])
 
 
 def loadLabel(label):
-    names = ['videoID', 'shotNumber', 'personName', 'confidence']
-    return pd.read_table(label, sep=' ', names=names)
+    return loadTable(label, SCHEMA['label'])
 
 
 def loadEvidence(evidence):
-    names = ['personName', 'videoID', 'shotNumber', 'source']
-    return pd.read_table(evidence, sep=' ', names=names)
+    return loadTable(evidence, SCHEMA['evidence'])
 
 
 def loadLabelReference(reference):
-    names = ['videoID', 'shotNumber', 'personName']
-    return pd.read_table(reference, sep=' ', names=names)
+    return loadTable(reference, SCHEMA['ref'])
 
 
 def loadEvidenceReference(evireference):
-    names = ['videoID', 'shotNumber', 'personName', 'source']
-    return pd.read_table(evireference, sep=' ', names=names)
+    return loadTable(evireference, SCHEMA['eviref'])
+
+
+def loadSegments(segments):
+    return loadTable(segments, SCHEMA['segments'])
+
+
+# =============================================================================
+# COMPACT TABLES
+# =============================================================================
+
+# (videoID, shotNumber) pairs are packed into 64-bit integer shot keys:
+# video code in the upper 32 bits, shot number in the lower 32 bits.
+# as video codes follow videoID order, shot keys order is (videoID,
+# shotNumber) order. unknown videos (code -1) lead to negative keys.
+def packShot(video, shotNumber):
+    video = np.asarray(video, dtype=np.int64)
+    shotNumber = np.asarray(shotNumber, dtype=np.int64)
+    return (video << 32) | shotNumber
+
+
+def unpackShot(key):
+    key = np.asarray(key, dtype=np.int64)
+    return key >> 32, key & 0xffffffff
+
+
+class Vocabulary(object):
+    """Sorted set of strings, each of them coded by its rank
+
+    Parameters
+    ----------
+    *values : iterables of strings
+        Vocabulary is the union of all values.
+    """
+
+    def __init__(self, *values):
+        super(Vocabulary, self).__init__()
+        values = [np.asarray(v, dtype=object) for v in values]
+        if values:
+            values = np.concatenate(values)
+        else:
+            values = np.array([], dtype=object)
+        self.strings = np.array(sorted(pd.unique(values)), dtype=object)
+        self._index = pd.Index(self.strings)
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __iter__(self):
+        return iter(self.strings)
+
+    def __contains__(self, string):
+        return string in self._index
+
+    def index(self, string):
+        """Code of `string` (-1 if not in vocabulary)"""
+        try:
+            return self._index.get_loc(string)
+        except KeyError:
+            return -1
+
+    def encode(self, values):
+        """Codes of `values` (-1 for values not in vocabulary)"""
+        values = np.asarray(values, dtype=object)
+        return self._index.get_indexer(values).astype(np.int32)
+
+    def decode(self, codes):
+        return self.strings[codes]
+
+
+class GroupIndex(object):
+    """Rows of a table grouped by (integer) key
+
+    Parameters
+    ----------
+    keys : (n, ) array
+        Key of each row.
+
+    Attributes
+    ----------
+    order : (n, ) array
+        Rows sorted by key (in order of appearance within each group).
+    keys : array
+        Sorted unique keys.
+    starts, stops : array
+        Group of keys[i] is order[starts[i]:stops[i]].
+    """
+
+    def __init__(self, keys):
+        super(GroupIndex, self).__init__()
+        self.order = np.argsort(keys, kind='mergesort')
+        self.keys, self.starts = np.unique(keys[self.order],
+                                           return_index=True)
+        self.stops = np.r_[self.starts[1:], len(keys)].astype(int)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return self.slice(key).stop > 0
+
+    def slice(self, key):
+        """Position of `key` group in `order` (empty slice if unknown key)"""
+        i = np.searchsorted(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return slice(0, 0)
+        return slice(self.starts[i], self.stops[i])
+
+    def rows(self, key):
+        return self.order[self.slice(key)]
+
+    def __iter__(self):
+        for key, start, stop in zip(self.keys, self.starts, self.stops):
+            yield key, self.order[start:stop]
+
+
+class Table(object):
+    """Column-oriented table with integer-coded strings
+
+    Each column is stored as one numpy array. Strings (video IDs, person
+    names and sources) are stored as codes of the table vocabularies.
+    Tables are meant to be built with `fromFrame` (or `loadTables`).
+
+    Indexing with a column name (e.g. table['personName']) returns the
+    (decoded) values of this column. Indexing with a slice returns a view
+    sharing memory with the table; with a mask or an array of rows, a copy.
+    """
+
+    # (file column, attribute, vocabulary, dtype)
+    FIELDS = []
+
+    def __init__(self, videos=None, names=None, sources=None, **columns):
+        super(Table, self).__init__()
+        self.videos = videos
+        self.names = names
+        self.sources = sources
+        self.columns = [attribute for _, attribute, _, _ in self.FIELDS
+                        if attribute in columns]
+        for attribute in self.columns:
+            setattr(self, attribute, columns[attribute])
+        self._key = None
+        self._groups = {}
+
+    @classmethod
+    def fromFrame(cls, frame, videos=None, names=None, sources=None):
+        """Build table from DataFrame (as returned by `load*` functions)
+
+        Vocabularies are built from the frame itself unless provided.
+        """
+
+        if 'videoID' not in frame.columns:
+            frame = frame.reset_index()
+
+        vocabularies = {'videos': videos, 'names': names, 'sources': sources}
+
+        columns = {}
+        for column, attribute, vocabulary, dtype in cls.FIELDS:
+            if column not in frame.columns:
+                continue
+            values = frame[column].values
+            if vocabulary is not None:
+                if vocabularies[vocabulary] is None:
+                    vocabularies[vocabulary] = Vocabulary(values)
+                values = vocabularies[vocabulary].encode(values)
+            columns[attribute] = np.asarray(values, dtype=dtype)
+
+        return cls(**dict(vocabularies, **columns))
+
+    def toFrame(self):
+        columns = [column for column, attribute, _, _ in self.FIELDS
+                   if attribute in self.columns]
+        return pd.DataFrame(
+            dict((column, self[column]) for column in columns),
+            columns=columns)
+
+    def _new(self, columns):
+        return self.__class__(videos=self.videos, names=self.names,
+                              sources=self.sources, **columns)
+
+    def __len__(self):
+        return len(getattr(self, self.columns[0]))
+
+    def __getitem__(self, item):
+
+        if isinstance(item, basestring):
+            for column, attribute, vocabulary, _ in self.FIELDS:
+                if column == item:
+                    values = getattr(self, attribute)
+                    if vocabulary is None:
+                        return values
+                    return getattr(self, vocabulary).decode(values)
+            raise KeyError(item)
+
+        return self._new(dict((attribute, getattr(self, attribute)[item])
+                              for attribute in self.columns))
+
+    @property
+    def key(self):
+        """Packed shot key of each row"""
+        if self._key is None:
+            self._key = packShot(self.video, self.shotNumber)
+        return self._key
+
+    def groups(self, attribute):
+        """Index rows by `attribute` (e.g. 'name', 'video' or 'key')
+
+        Returns
+        -------
+        index : GroupIndex
+        table : Table
+            Same table, sorted by `attribute`, so that each group is a
+            contiguous (zero-copy) slice.
+        """
+        if attribute not in self._groups:
+            index = GroupIndex(getattr(self, attribute))
+            self._groups[attribute] = index, self[index.order]
+        return self._groups[attribute]
+
+    def group(self, attribute, value):
+        """View of rows whose `attribute` is `value`"""
+        index, table = self.groups(attribute)
+        return table[index.slice(value)]
+
+    def named(self, name):
+        """View of rows for person `name` (string or code)"""
+        if isinstance(name, basestring):
+            name = self.names.index(name)
+        return self.group('name', name)
+
+    def uniqueNames(self):
+        """Person names, in order of first appearance"""
+        _, first = np.unique(self.name, return_index=True)
+        return self.names.decode(self.name[np.sort(first)])
+
+
+class ShotTable(Table):
+    """Shots (videoID, shotNumber, startTime, endTime, startFrame, endFrame)
+    """
+
+    FIELDS = [('videoID', 'video', 'videos', np.int32),
+              ('shotNumber', 'shotNumber', None, np.int32),
+              ('startTime', 'startTime', None, np.float64),
+              ('endTime', 'endTime', None, np.float64),
+              ('startFrame', 'startFrame', None, np.int64),
+              ('endFrame', 'endFrame', None, np.int64)]
+
+    def find(self, key):
+        """Row of each shot `key` (-1 for unknown shots)"""
+        index, _ = self.groups('key')
+        key = np.asarray(key, dtype=np.int64)
+        if len(index) == 0:
+            return -np.ones(key.shape, dtype=int)
+        i = np.minimum(np.searchsorted(index.keys, key), len(index) - 1)
+        found = index.keys[i] == key
+        return np.where(found, index.order[index.starts[i]], -1)
+
+    def contains(self, key):
+        return self.find(key) >= 0
+
+
+class LabelTable(Table):
+    """Hypothesis labels (videoID, shotNumber, personName, confidence)"""
+
+    FIELDS = [('videoID', 'video', 'videos', np.int32),
+              ('shotNumber', 'shotNumber', None, np.int32),
+              ('personName', 'name', 'names', np.int32),
+              ('confidence', 'confidence', None, np.float64)]
+
+    def maxConfidence(self):
+        """Shots sorted by key, with their maximum confidence
+
+        Returns
+        -------
+        key, confidence : array
+        """
+        key = self.key
+        order = np.lexsort((self.confidence, key))
+        key = key[order]
+        confidence = self.confidence[order]
+        last = np.r_[key[1:] != key[:-1], True]
+        return key[last], confidence[last]
+
+
+class EvidenceTable(Table):
+    """Hypothesis evidences (personName, videoID, shotNumber, source)"""
+
+    FIELDS = [('personName', 'name', 'names', np.int32),
+              ('videoID', 'video', 'videos', np.int32),
+              ('shotNumber', 'shotNumber', None, np.int32),
+              ('source', 'source', 'sources', np.int32)]
+
+
+class LabelReferenceTable(Table):
+    """Reference labels (videoID, shotNumber, personName)"""
+
+    FIELDS = [('videoID', 'video', 'videos', np.int32),
+              ('shotNumber', 'shotNumber', None, np.int32),
+              ('personName', 'name', 'names', np.int32)]
+
+
+class EvidenceReferenceTable(Table):
+    """Reference evidences (videoID, shotNumber, personName, source)"""
+
+    FIELDS = [('videoID', 'video', 'videos', np.int32),
+              ('shotNumber', 'shotNumber', None, np.int32),
+              ('personName', 'name', 'names', np.int32),
+              ('source', 'source', 'sources', np.int32)]
+
+
+# indices sorting `confidence` in decreasing order, ordering tied values
+# exactly like pandas' (quicksort-based) sort does, so that average
+# precision does not depend on which one of them is used
+def rankByConfidence(confidence):
+    n = len(confidence)
+    return (n - 1 - np.argsort(confidence[::-1], kind='quicksort'))[::-1]
+
+
+# indices of the `depth` highest values of `confidence`, in decreasing
+# order (tied values in order of position), selected with a linear-time
+# partition so that only them get sorted
+def rankTopConfidence(confidence, depth):
+    n = len(confidence)
+    if n > depth:
+        cutoff = np.partition(confidence, n - depth)[n - depth]
+        candidates = np.flatnonzero(confidence >= cutoff)
+    else:
+        candidates = np.arange(n)
+    order = np.argsort(-confidence[candidates], kind='mergesort')
+    return candidates[order[:depth]]
+
+
+Tables = namedtuple('Tables',
+                    ['shot', 'reference', 'evireference', 'label', 'evidence'])
+
+LOADERS = [('shot', loadShot, ShotTable),
+           ('reference', loadLabelReference, LabelReferenceTable),
+           ('evireference', loadEvidenceReference, EvidenceReferenceTable),
+           ('label', loadLabel, LabelTable),
+           ('evidence', loadEvidence, EvidenceTable)]
+
+
+def buildVocabularies(frames, videos=None):
+    """Video, name and source vocabularies shared by all `frames`
+
+    Returns
+    -------
+    videos, names, sources : Vocabulary
+    """
+
+    def union(column, *values):
+        return Vocabulary(*(list(values) + [
+            frame[column].values for frame in frames
+            if column in frame.columns]))
+
+    if videos is None:
+        videos = union('videoID')
+    names = union('personName')
+    # 'both' reference source stands for 'audio' and 'image'
+    sources = union('source', ['audio', 'image', 'both'])
+
+    return videos, names, sources
+
+
+def loadTables(shot=None, reference=None, evireference=None,
+               label=None, evidence=None, videos=None):
+    """Load files (or DataFrames) as tables sharing the same vocabularies
+
+    Parameters
+    ----------
+    shot, reference, evireference, label, evidence : str or DataFrame
+        Path to file (or already loaded DataFrame). Missing ones are None.
+    videos : Vocabulary, optional
+        Encode video IDs with this vocabulary (e.g. the one of an existing
+        shot table). Default is to build it from all files.
+
+    Returns
+    -------
+    tables : Tables
+        Named tuple (shot, reference, evireference, label, evidence).
+    """
+
+    sources = dict(shot=shot, reference=reference, evireference=evireference,
+                   label=label, evidence=evidence)
+
+    frames = {}
+    for name, load, _ in LOADERS:
+        frame = sources[name]
+        if frame is None:
+            continue
+        if isinstance(frame, basestring):
+            frame = load(frame)
+        if 'videoID' not in frame.columns:
+            frame = frame.reset_index()
+        frames[name] = frame
+
+    videos, names, sources = buildVocabularies(frames.values(),
+                                               videos=videos)
+
+    tables = dict((name, None) for name, _, _ in LOADERS)
+    for name, _, cls in LOADERS:
+        if name in frames:
+            tables[name] = cls.fromFrame(frames[name], videos=videos,
+                                         names=names, sources=sources)
+
+    return Tables(**tables)
+
+
+# =============================================================================
+# TIME-BASED LABELS
+# =============================================================================
+
+def segmentsToLabel(shot, segments):
+    """Map time-based segments to shot labels
+
+    Each segment is labeled to every shot it overlaps (shots of a video
+    are expected not to overlap each other). A shot overlapped by several
+    segments with the same name gets their maximum confidence. Segments
+    outside of the provided shots are ignored.
+
+    Parameters
+    ----------
+    shot : ShotTable
+        Shots, with their startTime and endTime.
+    segments : DataFrame
+        As returned by loadSegments.
+
+    Returns
+    -------
+    label : DataFrame
+        As returned by loadLabel.
+    """
+
+    video = shot.videos.encode(segments['videoID'].values)
+    start = segments['startTime'].values
+    end = segments['endTime'].values
+
+    # per-video interval index: shots of each video sorted by time
+    index = GroupIndex(shot.video)
+    order = index.order[
+        np.lexsort((shot.startTime[index.order], shot.video[index.order]))]
+    startTime = shot.startTime[order]
+    endTime = shot.endTime[order]
+
+    # segment overlaps shots first[i] to last[i] - 1 (in `order`)
+    first = np.zeros(len(segments), dtype=int)
+    last = np.zeros(len(segments), dtype=int)
+    for v, rows in GroupIndex(video):
+        i = np.searchsorted(index.keys, v)
+        if v < 0 or i == len(index) or index.keys[i] != v:
+            continue
+        lo, hi = index.starts[i], index.stops[i]
+        first[rows] = lo + np.searchsorted(endTime[lo:hi], start[rows],
+                                           side='right')
+        last[rows] = lo + np.searchsorted(startTime[lo:hi], end[rows],
+                                          side='left')
+
+    # one label per (segment, overlapped shot)
+    counts = np.maximum(0, last - first)
+    segment = np.repeat(np.arange(len(segments)), counts)
+    offset = np.arange(len(segment)) - np.repeat(np.cumsum(counts) - counts,
+                                                 counts)
+    rows = order[first[segment] + offset]
+
+    label = pd.DataFrame({
+        'videoID': shot.videos.decode(shot.video[rows]),
+        'shotNumber': shot.shotNumber[rows],
+        'personName': segments['personName'].values[segment],
+        'confidence': segments['confidence'].values[segment]},
+        columns=['videoID', 'shotNumber', 'personName', 'confidence'])
+
+    return (label.groupby(['videoID', 'shotNumber', 'personName'],
+                          sort=False)['confidence']
+                 .max().reset_index())
+
+
+# =============================================================================
+# CHECKS
+# =============================================================================
+
+def checkEvidence(shot, evidence):
+
+    # check that there is no more than one evidence per label
+    if len(np.unique(evidence.name)) != len(evidence):
+        msg = ('There must be exactly one evidence '
+               'per unique name in label submission.')
+        raise ValueError(msg)
+
+    # check that evidences are chosen among selected shots
+    if not np.all(shot.contains(evidence.key)):
+        msg = ('Evidences should only be chosen among provided shots.')
+        raise ValueError(msg)
+
+
+def checkSubmission(shot, label, evidence=None):
+    """Check that submission is consistent with the list of shots
+
+    Raises ValueError. Tables are expected to share their vocabularies.
+    """
+
+    # check that labels are only provided for selected shots
+    if not np.all(shot.contains(label.key)):
+        msg = ('Labels should only be computed for provided shots.')
+        raise ValueError(msg)
+
+    if evidence is None:
+        return
+
+    # check that evidence is provided for every unique label
+    if not np.array_equal(np.unique(label.name), np.unique(evidence.name)):
+        msg = ('There must be exactly one evidence '
+               'per unique name in label submission.')
+        raise ValueError(msg)
+
+    checkEvidence(shot, evidence)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2015 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+"""
+MediaEval Person Discovery Task file conversion.
+
+Convert .shot, .ref, .eviref, .label and .evidence files to columnar
+(.parquet or .arrow) or compressed text (.gz, .bz2, .zst) files
+with the same columns, which evaluation.py and submission.py load directly.
+Output format is chosen from <output> extension (e.g. run.label.parquet).
+
+Usage:
+  convert [options] <input> <output>
+
+Options:
+  -h --help                Show this screen.
+  --version                Show version.
+  --type=<type>            One of shot, ref, eviref, label, evidence or
+                           segments. Default is to infer it from <input>.
+  --compression=<codec>    Parquet compression codec [default: zstd]
+"""
+
+from docopt import docopt
+import sys
+
+
+if __name__ == '__main__':
+
+    arguments = docopt(__doc__, version='0.3')
+
+    from common import fileType, loadTable, saveTable, SCHEMA
+    from common import extension, COLUMNAR, TextFile, createTextFile
+
+    pathToInput = arguments['<input>']
+    pathToOutput = arguments['<output>']
+
+    # text to text: (de|re)compress lines as they are, without parsing them
+    if (extension(pathToInput) not in COLUMNAR and
+            extension(pathToOutput) not in COLUMNAR):
+        with TextFile(pathToInput) as f, createTextFile(pathToOutput) as g:
+            for line in f:
+                g.write(line)
+        sys.exit(0)
+
+    type_ = arguments['--type'] or fileType(pathToInput)
+    if type_ not in SCHEMA:
+        sys.exit('Unable to infer type of %s (use --type).' % pathToInput)
+
+    frame = loadTable(pathToInput, SCHEMA[type_])
+    saveTable(frame, pathToOutput, compression=arguments['--compression'])
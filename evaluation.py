@@ -32,6 +32,7 @@ MediaEval Person Discovery Task evaluation.
 
 Usage:
   evaluation [options] <reference.shot> <reference.ref> <reference.eviref> <hypothesis.label> <hypothesis.evidence>
+  evaluation [options] --references=<references.lst> <hypothesis.label> <hypothesis.evidence>
 
 Options:
   -h --help                     Show this screen.
@@ -39,68 +40,244 @@ Options:
   --queries=<queries.lst>       Query list.
   --levenshtein=<threshold>     Levenshtein ratio threshold [default: 0.95]
   --consensus=<consensus.shot>  Label-annotated subset of <reference.shot>
+  --segments                    <hypothesis.label> contains time-based labels
+                                (videoID startTime endTime personName
+                                confidence) mapped to overlapping shots.
+  --shard=<i/n>                 Only evaluate queries of shard i out of n
+                                (0 <= i < n), dispatched by hash of query.
+  --partial=<partial.jsonl>     Save per-query results, to be merged with
+                                those of other shards using merge.py.
+  --export=<results>            Export per-query results (matched name,
+                                similarity, AP, correctness, number of
+                                relevant and returned shots, evidence) as
+                                JSON lines (.jsonl), CSV (.csv) or Parquet
+                                (.parquet) file, with oracle bounds (see
+                                --oracle).
+  --ties                        Average precision is the expected one over
+                                all orderings of shots with equal confidence
+                                (instead of depending on their sort order).
+  --depth=<n>                   Only evaluate the n top-ranked shots of each
+                                query: average precision at depth n (AP@n),
+                                normalized by min(n, number of relevant
+                                shots). Shots with equal confidence are
+                                ranked by (videoID, shotNumber).
+  --errors=<errors>             Save per-query error analysis tables, as
+                                JSON lines (.jsonl), CSV (.csv) or Parquet
+                                (.parquet) files named after <errors>
+                                (e.g. errors.csv leads to errors.miss.csv):
+                                falsePositive (returned but not relevant
+                                shots), miss (relevant but not returned
+                                shots), evidence (wrong evidences), and
+                                their number per video and per channel.
+  --oracle                      Also print upper bounds of EwMAP, obtained
+                                with perfect ranking of returned shots, with
+                                perfect choice of evidence among them, and
+                                with both.
+  --follow                      Follow <hypothesis.label> while it is being
+                                written and print running scores over the
+                                videos labeled so far, until interrupted.
+  --follow-evidence             Follow <hypothesis.evidence> as well.
+  --interval=<seconds>          Delay between running scores [default: 10]
+  --references=<references.lst>
+                                Evaluate against several references, listed
+                                one per line with format "<name>
+                                <reference.shot> <reference.ref>
+                                <reference.eviref> [<consensus.shot>]"
+                                (relative paths are relative to the list
+                                location), and print one line of scores per
+                                reference.
 """
 
+# heavy dependencies (pandas, numpy, Levenshtein) are imported where
+# they are needed so that --help and usage errors return immediately
 from docopt import docopt
-from Levenshtein import ratio
-import numpy as np
+from collections import OrderedDict
+import sys
 
-from common import loadShot, loadLabel, loadEvidence
-from common import loadLabelReference, loadEvidenceReference
 
+def loadFiles(shot, reference, evireference, label, evidence, consensus=None,
+              segments=False):
 
-def loadFiles(shot, reference, evireference, label, evidence, consensus=None):
+    from common import loadTables, loadShot, checkSubmission, ShotTable
+    from common import loadSegments, segmentsToLabel
 
-    shot = loadShot(shot)
-    label = loadLabel(label)
-    evidence = loadEvidence(evidence)
+    if segments:
+        shot = loadShot(shot)
+        label = segmentsToLabel(ShotTable.fromFrame(shot),
+                                loadSegments(label))
+
+    tables = loadTables(shot=shot, reference=reference,
+                        evireference=evireference,
+                        label=label, evidence=evidence)
 
-    # check that labels are only provided for selected shots
-    labelShots = set(
-        tuple(s) for _, s in label[['videoID', 'shotNumber']].iterrows())
-    if not labelShots.issubset(set(shot.index)):
-        msg = ('Labels should only be computed for provided shots.')
-        raise ValueError(msg)
-
-    # check that evidence is provided for every unique label
-    labelNames = set(label['personName'].unique())
-    evidenceNames = set(evidence['personName'].unique())
-    if labelNames != evidenceNames:
-        msg = ('There must be exactly one evidence '
-               'per unique name in label submission.')
-        raise ValueError(msg)
-
-    # check that there is no more than one evidence per label
-    if len(evidenceNames) != len(evidence):
-        msg = ('There must be exactly one evidence '
-               'per unique name in label submission.')
-        raise ValueError(msg)
-
-    # check that evidences are chosen among selected shots
-    evidenceShots = set(tuple(s) for _, s in evidence[['videoID', 'shotNumber']].iterrows())
-    if not evidenceShots.issubset(set(shot.index)):
-        msg = ('Evidences should only be chosen among provided shots.')
-        raise ValueError(msg)
+    checkSubmission(tables.shot, tables.label, tables.evidence)
+
+    label = tables.label
 
     # only keep labels for shot with consensus
     if consensus:
-        consensus = loadShot(consensus)
-        mask = label.apply(
-            lambda x: (x['videoID'], x['shotNumber']) in set(consensus.index),
-            axis=1)
-        label = label[mask]
+        consensus = ShotTable.fromFrame(loadShot(consensus),
+                                        videos=tables.shot.videos)
+        label = label[consensus.contains(label.key)]
+
+    return tables.reference, tables.evireference, label, tables.evidence
+
+
+# parse list of references into list of (name, shot, reference,
+# evireference, consensus) tuples of paths (consensus may be None)
+def loadReferenceList(path):
+
+    import os
+
+    root = os.path.dirname(os.path.abspath(path))
+
+    references = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = line.split()
+            if len(fields) not in (4, 5):
+                raise ValueError('Malformed reference line: %s' % line)
+            paths = [os.path.join(root, p) for p in fields[1:]]
+            references.append(tuple([fields[0]] + paths + [None] * (
+                5 - len(fields))))
+
+    return references
+
+
+# load hypothesis once, and every reference with the same vocabularies
+# returns label, evidence and list of (name, shot, reference, evireference,
+# consensus) tuples of tables
+def loadReferences(references, label, evidence):
+
+    from common import loadShot, loadLabelReference, loadEvidenceReference
+    from common import loadLabel, loadEvidence, buildVocabularies
+    from common import ShotTable, LabelReferenceTable
+    from common import EvidenceReferenceTable, LabelTable, EvidenceTable
+    from common import checkSubmission
+
+    label = loadLabel(label)
+    evidence = loadEvidence(evidence)
+
+    loaded = []
+    for name, shot, reference, evireference, consensus in references:
+        loaded.append((
+            name, loadShot(shot).reset_index(),
+            loadLabelReference(reference),
+            loadEvidenceReference(evireference),
+            None if consensus is None else loadShot(consensus).reset_index()))
+
+    frames = [label, evidence] + [frame for r in loaded for frame in r[1:]
+                                  if frame is not None]
+    videos, names, sources = buildVocabularies(frames)
+
+    def table(cls, frame):
+        return cls.fromFrame(frame, videos=videos, names=names,
+                             sources=sources)
+
+    label = table(LabelTable, label)
+    evidence = table(EvidenceTable, evidence)
+
+    references = []
+    for name, shot, reference, evireference, consensus in loaded:
+
+        shot = table(ShotTable, shot)
+        try:
+            checkSubmission(shot, label, evidence)
+        except ValueError, e:
+            raise ValueError('%s: %s' % (name, e.message))
+
+        references.append((
+            name, shot, table(LabelReferenceTable, reference),
+            table(EvidenceReferenceTable, evireference),
+            None if consensus is None else table(ShotTable, consensus)))
+
+    return label, evidence, references
+
+
+# queries are dispatched to shards by a hash that does not depend on the
+# process (or the machine) evaluating them
+def inShard(query, shard, shards):
+    import zlib
+    return (zlib.crc32(query) & 0xffffffff) % shards == shard
+
+
+def parseShard(shard):
+    try:
+        i, n = [int(x) for x in shard.split('/')]
+        assert 0 <= i < n
+    except Exception:
+        raise ValueError('Shard must be given as i/n with 0 <= i < n.')
+    return i, n
+
+
+# partial results are JSON lines: a header describing the shard, then
+# one line per evaluated query with its position in the full query list
+def savePartial(path, shard, shards, queries, indices,
+                averagePrecision, correctness):
+    import json
+    with open(path, 'w') as f:
+        f.write(json.dumps({'shard': shard, 'shards': shards,
+                            'queries': len(queries)}) + '\n')
+        for index in indices:
+            query = queries[index]
+            f.write(json.dumps({'index': index, 'query': query,
+                                'averagePrecision': averagePrecision[query],
+                                'correctness': correctness[query]}) + '\n')
+
+
+# EwMAP, MAP and C over the list of queries
+def computeScores(queries, averagePrecision, correctness):
+
+    import numpy as np
+
+    MAP = np.mean([averagePrecision[query] for query in queries])
+    mCorrectness = np.mean([correctness[query] for query in queries])
+    EwMAP = np.mean([correctness[query] * averagePrecision[query]
+                     for query in queries])
+
+    return EwMAP, MAP, mCorrectness
+
+
+def printScores(EwMAP, MAP, mCorrectness):
+    print 'EwMAP = %.2f %%' % (100 * EwMAP)
+    print 'MAP = %.2f %%' % (100 * MAP)
+    print 'C = %.2f %%' % (100 * mCorrectness)
+
 
-    reference = loadLabelReference(reference)
-    evireference = loadEvidenceReference(evireference)
+# EwMAP with perfect ranking, with perfect evidence and with both
+def printOracleScores(queries, averagePrecision, correctness,
+                      oracleAveragePrecision, oracleCorrectness):
 
-    return reference, evireference, label, evidence
+    EwMAP, MAP, _ = computeScores(queries, oracleAveragePrecision,
+                                  correctness)
+    print 'Oracle ranking: EwMAP = %.2f %% MAP = %.2f %%' % (
+        100 * EwMAP, 100 * MAP)
+
+    EwMAP, _, mCorrectness = computeScores(queries, averagePrecision,
+                                           oracleCorrectness)
+    print 'Oracle evidence: EwMAP = %.2f %% C = %.2f %%' % (
+        100 * EwMAP, 100 * mCorrectness)
+
+    EwMAP, _, _ = computeScores(queries, oracleAveragePrecision,
+                                oracleCorrectness)
+    print 'Oracle ranking and evidence: EwMAP = %.2f %%' % (100 * EwMAP)
 
 
 def closeEnough(personName, query, threshold):
+    from Levenshtein import ratio
     return ratio(query, personName) >= threshold
 
 
-def computeAveragePrecision(vReturned, vRelevant):
+# vReturned: returned shot keys, in decreasing confidence order
+# vRelevant: (unique) relevant shot keys
+# depth: average precision at this depth (vReturned is truncated)
+def computeAveragePrecision(vReturned, vRelevant, depth=None):
+
+    if depth is not None:
+        vReturned = vReturned[:depth]
 
     nReturned = len(vReturned)
     nRelevant = len(vRelevant)
@@ -111,10 +288,1075 @@ def computeAveragePrecision(vReturned, vRelevant):
     if nReturned == 0:
         return 0.
 
-    returnedIsRelevant = np.array([item in vRelevant for item in vReturned])
-    precision = np.cumsum(returnedIsRelevant) / (1. + np.arange(nReturned))
+    if depth is not None:
+        nRelevant = min(nRelevant, depth)
+
+    return sumPrecision(vReturned, vRelevant) / nRelevant
+
+
+# sum of precisions at ranks of relevant shots (i.e. average precision
+# times number of relevant shots) of non-empty vReturned
+def sumPrecision(vReturned, vRelevant):
+
+    import numpy as np
+
+    returnedIsRelevant = np.in1d(vReturned, vRelevant)
+    precision = np.cumsum(returnedIsRelevant) / (1. + np.arange(
+        len(vReturned)))
+
+    return np.sum(precision * returnedIsRelevant)
+
+
+# mask of returned shot keys `vReturned` (in any order, possibly repeated)
+# that are in `vRelevant` (unique) shot keys. unlike np.in1d, it does not
+# sort `vReturned` (hash lookup)
+def isRelevant(vReturned, vRelevant):
+    import pandas as pd
+    return pd.Index(vRelevant).get_indexer(vReturned) >= 0
+
+
+# top `depth` shots of `qReturned` (labels of one personName) in decreasing
+# order of their maximum confidence (ties ranked by key). only labels that
+# can still reach the top are deduplicated: as soon as labels with
+# confidence above the k-th highest one cover at least `depth` shots, no
+# label below it can.
+def topShots(qReturned, depth):
+
+    from common import rankTopConfidence
+    import numpy as np
+
+    confidence = qReturned.confidence
+    n = len(confidence)
+
+    k = depth
+    while k < n:
+        cutoff = np.partition(confidence, n - k)[n - k]
+        candidates = qReturned[confidence >= cutoff]
+        if len(np.unique(candidates.key)) >= depth:
+            qReturned = candidates
+            break
+        k *= 2
+
+    key, confidence = qReturned.maxConfidence()
+    return key[rankTopConfidence(confidence, depth)]
+
+
+# whether evidence (shot `key` and `source` code) is one of the reference
+# evidences `qRelevant`
+def evidenceMatches(qRelevant, key, source):
+
+    import numpy as np
+
+    # 'both' reference source stands for 'audio' or 'image'
+    sources = qRelevant.sources
+    both = sources.index('both')
+
+    sameSource = (qRelevant.source == source) & (qRelevant.source != both)
+    if source in [sources.index('audio'), sources.index('image')]:
+        sameSource |= qRelevant.source == both
+
+    return np.any(sameSource & (qRelevant.key == key))
+
+
+# expected average precision over all orderings of tied shots
+# vReturned: returned shot keys, and their confidence (in any order)
+# vRelevant: (unique) relevant shot keys
+#
+# a relevant shot at position j of a group of n tied shots (r of them
+# relevant), preceded by N shots (H of them relevant), is preceded on
+# average by H + (j - 1) (r - 1) / (n - 1) relevant shots. each of the n
+# positions holds a relevant shot with probability r / n.
+def computeExpectedAveragePrecision(vReturned, confidence, vRelevant):
+
+    nReturned = len(vReturned)
+    nRelevant = len(vRelevant)
+
+    if nRelevant == 0:
+        return 1.
+
+    if nReturned == 0:
+        return 0.
+
+    return sumExpectedPrecision(vReturned, confidence, vRelevant) / nRelevant
+
+
+# expected sum of precisions at ranks of relevant shots of non-empty
+# vReturned (see computeExpectedAveragePrecision)
+def sumExpectedPrecision(vReturned, confidence, vRelevant):
+
+    import numpy as np
+
+    nReturned = len(vReturned)
+
+    order = np.argsort(-confidence, kind='mergesort')
+    confidence = confidence[order]
+    returnedIsRelevant = np.in1d(vReturned[order], vRelevant)
+
+    # groups of tied shots
+    starts = np.flatnonzero(np.r_[True, confidence[1:] != confidence[:-1]])
+    n = np.diff(np.r_[starts, nReturned])
+    r = np.add.reduceat(returnedIsRelevant.astype(int), starts)
+    H = np.cumsum(r) - r
+
+    group = np.repeat(np.arange(len(starts)), n)
+    n, r, H = 1. * n[group], 1. * r[group], 1. * H[group]
+    rank = 1. + np.arange(nReturned)
+    j = rank - starts[group]
+
+    before = H + (j - 1) * (r - 1) / np.maximum(1, n - 1)
+    return np.sum(r / n * (before + 1) / rank)
+
+
+# average precision of vReturned shots (possibly repeated), would they be
+# sorted perfectly (i.e. relevant ones first). this is their recall (at
+# `depth`, when given).
+def computeOracleAveragePrecision(vReturned, vRelevant, depth=None):
+
+    import numpy as np
+
+    nRelevant = len(vRelevant)
+    if nRelevant == 0:
+        return 1.
+
+    nFound = len(np.unique(vReturned[isRelevant(vReturned, vRelevant)]))
+
+    if depth is not None:
+        nFound, nRelevant = min(nFound, depth), min(nRelevant, depth)
+
+    return 1. * nFound / nRelevant
+
+
+# per-query results (see evaluateQuery and --export)
+RESULT_FIELDS = [('query', str),
+                 ('personName', str),
+                 ('similarity', float),
+                 ('averagePrecision', float),
+                 ('correctness', float),
+                 ('nRelevant', int),
+                 ('nReturned', int),
+                 ('evidenceVideoID', str),
+                 ('evidenceShotNumber', int),
+                 ('evidenceSource', str),
+                 ('oracleAveragePrecision', float),
+                 ('oracleCorrectness', float)]
+
+
+# most similar personName (and its similarity) among `names`, the first
+# one in case of equal similarity
+def closestName(query, names):
+    from Levenshtein import ratio
+    ratios = [(personName, ratio(query, personName))
+              for personName in names]
+    return sorted(ratios, key=lambda x: x[1], reverse=True)[0]
+
+
+# `names` are hypothesis person names (in order of first appearance)
+# `best` is closestName(query, names), when already known
+# `ties` computes expected average precision over orderings of tied shots
+# `depth` computes average precision of the `depth` top-ranked shots
+def evaluateQuery(query, names, reference, evireference, label, evidence,
+                  threshold, best=None, ties=False, depth=None):
+
+    from common import rankByConfidence
+    import numpy as np
+
+    result = dict((field, None) for field, _ in RESULT_FIELDS)
+    result['query'] = query
+
+    # find most similar personName
+    if best is None:
+        best = closestName(query, names)
+
+    personName = best[0] if best[1] > threshold else None
+
+    result['personName'] = personName
+    result['similarity'] = best[1]
+
+    # =========================================================================
+    # Evaluation of LABELS
+    # =========================================================================
+
+    # get relevant shots for this query, according to reference
+    qRelevant = np.unique(reference.named(query).key)
+
+    # get returned shots for this query
+    # (i.e. shots containing closest personName)
+    if personName is None:
+        qReturned = label[:0]
+    else:
+        qReturned = label.named(personName)
+
+    # this can only happen with --consensus option
+    # when hypothesis contains shot in the out of consensus part
+    # hack to solve this corner case
+    if len(qReturned) == 0:
+        averagePrecision = 0. if len(qRelevant) > 0. else 1.
+        qReturned = qReturned.key
+        returned = qReturned
+
+    elif depth is not None:
+        # all returned shots (possibly repeated) are candidates for oracles
+        returned = qReturned.key
+
+        # only rank (and deduplicate) shots that can reach the top
+        qReturned = topShots(qReturned, depth)
+        averagePrecision = computeAveragePrecision(qReturned, qRelevant,
+                                                   depth=depth)
+
+    else:
+        # in case of shots returned twice for this query, keep maximum
+        qReturned, confidence = qReturned.maxConfidence()
+        returned = qReturned
+
+        if ties:
+            averagePrecision = computeExpectedAveragePrecision(
+                qReturned, confidence, qRelevant)
+
+        else:
+            # sort shots by decreasing confidence
+            qReturned = qReturned[rankByConfidence(confidence)]
+
+            # compute average precision for this query
+            averagePrecision = computeAveragePrecision(qReturned, qRelevant)
+
+    result['averagePrecision'] = averagePrecision
+    result['nRelevant'] = len(qRelevant)
+    result['nReturned'] = len(qReturned)
+
+    # same returned shots, with relevant ones first
+    result['oracleAveragePrecision'] = computeOracleAveragePrecision(
+        returned, qRelevant, depth=depth)
+
+    # =========================================================================
+    # Evaluation of EVIDENCES
+    # =========================================================================
+
+    if personName is None:
+        result['correctness'] = 0. if len(qRelevant) > 0. else 1.
+        result['oracleCorrectness'] = result['correctness']
+        return result
+
+    # get evidence shots for this query, according to reference
+    qRelevant = evireference.named(query)
+
+    # first evidence for this personName
+    qReturned = evidence.named(personName)[:1]
+
+    result['evidenceVideoID'] = qReturned['videoID'][0]
+    result['evidenceShotNumber'] = int(qReturned.shotNumber[0])
+    result['evidenceSource'] = qReturned['source'][0]
+
+    if evidenceMatches(qRelevant, qReturned.key[0], qReturned.source[0]):
+        result['correctness'] = 1. if best[1] > threshold else 0.
+    else:
+        result['correctness'] = 0.
+
+    # perfect evidence would be one of the returned shots (with the right
+    # source) if any of them is a reference evidence
+    result['oracleCorrectness'] = 1. if (
+        result['correctness'] or
+        np.any(isRelevant(returned, np.unique(qRelevant.key)))) else 0.
+
+    return result
+
+
+# error analysis tables (see --errors). shots are ranked like with
+# --depth (ties by shot) and evidence errors are either "name" (no name
+# close enough to the query), "shot" (not a reference evidence shot) or
+# "source" (right shot, wrong source)
+SUMMARY_FIELDS = [('returned', int),
+                  ('falsePositives', int),
+                  ('relevant', int),
+                  ('misses', int),
+                  ('evidenceErrors', int)]
+
+ERROR_TABLES = OrderedDict([
+    ('falsePositive', [('query', str), ('personName', str), ('rank', int),
+                       ('videoID', str), ('shotNumber', int),
+                       ('confidence', float)]),
+    ('miss', [('query', str), ('personName', str), ('videoID', str),
+              ('shotNumber', int)]),
+    ('evidence', [('query', str), ('personName', str), ('videoID', str),
+                  ('shotNumber', int), ('source', str), ('error', str)]),
+    ('video', [('videoID', str), ('channel', str)] + SUMMARY_FIELDS),
+    ('channel', [('channel', str)] + SUMMARY_FIELDS)])
+
+
+# indices of unique (query, key) pairs, sorted by query then key
+def uniquePairs(query, key):
+
+    import numpy as np
+
+    order = np.lexsort((key, query))
+    query, key = query[order], key[order]
+    first = np.r_[True, (query[1:] != query[:-1]) | (key[1:] != key[:-1])]
+    return order[first]
+
+
+# join (query, shot key) pairs of `a` and `b`, each pair appearing at most
+# once on each side, with a single sort. returns masks of pairs of `a`
+# found in `b` and of pairs of `b` found in `a`.
+def joinPairs(aQuery, aKey, bQuery, bKey):
+
+    import numpy as np
+
+    query = np.r_[aQuery, bQuery]
+    key = np.r_[aKey, bKey]
+
+    order = np.lexsort((key, query))
+    query, key = query[order], key[order]
+    same = (query[1:] == query[:-1]) & (key[1:] == key[:-1])
+
+    found = np.zeros(len(order), dtype=bool)
+    found[order[1:][same]] = True
+    found[order[:-1][same]] = True
+
+    return found[:len(aQuery)], found[len(aQuery):]
+
+
+# write a table given as columns (in order of `writer` fields), one chunk
+# of records at a time
+def writeColumns(writer, columns, chunkSize=100000):
+
+    import numpy as np
+
+    n = len(columns[0])
+    for start in range(0, n, chunkSize):
+        chunk = [np.asarray(column[start:start + chunkSize]).tolist()
+                 for column in columns]
+        for record in zip(*chunk):
+            writer.write(dict(zip(writer.names, record)))
+
+
+# channel of a video (e.g. BFMTV for BFMTV_BFMStory_2012-07-24_175800)
+def channelOf(videoID):
+    return videoID.split('_', 1)[0]
+
+
+# save false positives, misses and evidence errors of (unique) `queries`,
+# given their `results` (of evaluateQuery), to `writers` (RecordWriter of
+# each table of ERROR_TABLES, closed when done). counts are also summarized
+# per video and per channel. only the `depth` top-ranked shots of each
+# query are considered, when given.
+def analyzeErrors(writers, queries, results, reference, evireference,
+                  label, evidence, depth=None):
+
+    from common import unpackShot
+    import numpy as np
+
+    nQueries = len(queries)
+    queries = np.array(queries, dtype=object)
+    matched = np.array([results[query]['personName'] for query in queries],
+                       dtype=object)
+
+    # name code of the personName matched by each query (or -1)
+    hasName = np.array([name is not None for name in matched], dtype=bool)
+    nameOf = -np.ones(nQueries, dtype=np.int64)
+    nameOf[hasName] = label.names.encode(matched[hasName])
+
+    # =========================================================================
+    # returned shots, as (query, shot key) pairs
+    # =========================================================================
+
+    # labels of matched names, keeping maximum confidence of shots
+    # returned twice
+    rows = np.flatnonzero(np.in1d(label.name, nameOf[hasName]))
+    name, key = label.name[rows], label.key[rows]
+    confidence = label.confidence[rows]
+    order = np.lexsort((confidence, key, name))
+    name, key, confidence = name[order], key[order], confidence[order]
+    last = np.r_[(name[1:] != name[:-1]) | (key[1:] != key[:-1]), True]
+    name, key, confidence = name[last], key[last], confidence[last]
+
+    # names matched by several queries are returned for each of them
+    byName = np.argsort(nameOf, kind='mergesort')
+    start = np.searchsorted(nameOf[byName], name, side='left')
+    count = np.searchsorted(nameOf[byName], name, side='right') - start
+    row = np.repeat(np.arange(len(name)), count)
+    offset = np.arange(len(row)) - np.repeat(np.cumsum(count) - count, count)
+    rQuery = byName[np.repeat(start, count) + offset]
+    rKey, rConfidence = key[row], confidence[row]
+
+    # rank of each shot among those returned for the same query
+    order = np.lexsort((rKey, -rConfidence, rQuery))
+    rQuery, rKey, rConfidence = rQuery[order], rKey[order], rConfidence[order]
+    rank = np.arange(len(rQuery)) - np.searchsorted(rQuery, rQuery)
+    if depth is not None:
+        top = rank < depth
+        rQuery, rKey, rConfidence = rQuery[top], rKey[top], rConfidence[top]
+        rank = rank[top]
+
+    # =========================================================================
+    # relevant shots, as (query, shot key) pairs
+    # =========================================================================
+
+    # query of each reference name code (or -1)
+    codes = reference.names.encode(queries)
+    queryOf = -np.ones(len(reference.names), dtype=np.int64)
+    queryOf[codes[codes >= 0]] = np.flatnonzero(codes >= 0)
+
+    fQuery = queryOf[reference.name]
+    keep = np.flatnonzero(fQuery >= 0)
+    fQuery, fKey = fQuery[keep], reference.key[keep]
+    unique = uniquePairs(fQuery, fKey)
+    fQuery, fKey = fQuery[unique], fKey[unique]
+
+    # =========================================================================
+    # single join of returned and relevant shots
+    # =========================================================================
+
+    rRelevant, fReturned = joinPairs(rQuery, rKey, fQuery, fKey)
+
+    rVideo, rShotNumber = unpackShot(rKey)
+    fVideo, fShotNumber = unpackShot(fKey)
+    videos = label.videos
+
+    fp = ~rRelevant
+    writeColumns(writers['falsePositive'], [
+        queries[rQuery[fp]], matched[rQuery[fp]], 1 + rank[fp],
+        videos.decode(rVideo[fp]), rShotNumber[fp], rConfidence[fp]])
+
+    miss = ~fReturned
+    writeColumns(writers['miss'], [
+        queries[fQuery[miss]], matched[fQuery[miss]],
+        videos.decode(fVideo[miss]), fShotNumber[miss]])
+
+    # =========================================================================
+    # evidence errors
+    # =========================================================================
+
+    wrong = np.array([results[query]['correctness'] == 0.
+                      for query in queries], dtype=bool)
+    eQuery = np.flatnonzero(wrong & hasName)
+
+    # first evidence of each name
+    names, first = np.unique(evidence.name, return_index=True)
+    eKey = evidence.key[first[np.searchsorted(names, nameOf[eQuery])]]
+
+    codes = evireference.names.encode(queries)
+    queryOf = -np.ones(len(evireference.names), dtype=np.int64)
+    queryOf[codes[codes >= 0]] = np.flatnonzero(codes >= 0)
+    vQuery = queryOf[evireference.name]
+    keep = np.flatnonzero(vQuery >= 0)
+    vQuery, vKey = vQuery[keep], evireference.key[keep]
+    unique = uniquePairs(vQuery, vKey)
+
+    rightShot, _ = joinPairs(eQuery, eKey, vQuery[unique], vKey[unique])
+
+    error = dict(zip(eQuery.tolist(),
+                     ['source' if right else 'shot' for right in rightShot]))
+    writer = writers['evidence']
+    for q in np.flatnonzero(wrong).tolist():
+        result = results[queries[q]]
+        writer.write({'query': queries[q],
+                      'personName': result['personName'],
+                      'videoID': result['evidenceVideoID'],
+                      'shotNumber': result['evidenceShotNumber'],
+                      'source': result['evidenceSource'],
+                      'error': error.get(q, 'name')})
 
-    return np.sum(precision * returnedIsRelevant) / nRelevant
+    # =========================================================================
+    # summaries per video and per channel
+    # =========================================================================
+
+    eVideo, _ = unpackShot(eKey)
+
+    def perVideo(video):
+        return np.bincount(video, minlength=len(videos))
+
+    counts = np.vstack([perVideo(rVideo), perVideo(rVideo[fp]),
+                        perVideo(fVideo), perVideo(fVideo[miss]),
+                        perVideo(eVideo)]).T
+
+    channels = OrderedDict()
+    for videoID, count in zip(videos, counts):
+        if not np.any(count):
+            continue
+        channel = channelOf(videoID)
+        writers['video'].write(dict(
+            [('videoID', videoID), ('channel', channel)] +
+            zip([field for field, _ in SUMMARY_FIELDS], count.tolist())))
+        channels[channel] = channels.get(channel, 0) + count
+
+    for channel in sorted(channels):
+        writers['channel'].write(dict(
+            [('channel', channel)] +
+            zip([field for field, _ in SUMMARY_FIELDS],
+                channels[channel].tolist())))
+
+    for writer in writers.values():
+        writer.close()
+
+
+# positions where shots (`newNegative` opposite confidences and `newKey`
+# keys) would be inserted among shots ranked by increasing `negative`
+# (opposite confidence), then increasing `key`
+def rankPosition(negative, key, newNegative, newKey):
+
+    import numpy as np
+
+    position = np.searchsorted(negative, newNegative, side='left')
+    stop = np.searchsorted(negative, newNegative, side='right')
+
+    # tied confidences are ranked by key
+    for i in np.flatnonzero(stop > position):
+        position[i] += np.searchsorted(key[position[i]:stop[i]], newKey[i])
+
+    return position
+
+
+class RankedShots(object):
+    """Shots returned for one personName, as they arrive
+
+    Shots are kept ranked by decreasing (maximum) confidence, then by key,
+    along with the sum of precisions they get for each query tracked by
+    `track`. Adding shots only rewrites ranks from the highest one they
+    change: the ranked list is never sorted nor copied as a whole, and sums
+    of precisions are only updated from that rank onward (up to `depth`).
+
+    Parameters
+    ----------
+    ties : boolean, optional
+        Sum expected precisions over orderings of tied shots.
+    depth : int, optional
+        Only sum precisions of the `depth` top-ranked shots.
+    """
+
+    def __init__(self, ties=False, depth=None):
+        super(RankedShots, self).__init__()
+
+        import numpy as np
+
+        self.ties = ties
+        self.depth = depth
+
+        # ranked shots (buffers, of which the `size` first are used)
+        self.size = 0
+        self.key = np.empty(0, dtype=np.int64)
+        self.negative = np.empty(0, dtype=np.float64)
+
+        # shot key --> maximum confidence
+        self.confidence = {}
+
+        # query --> index of relevant shot keys, whether each ranked shot is
+        # relevant (buffer), number of relevant ranked shots and sum of
+        # their precisions
+        self.relevant = {}
+        self.isRelevant = {}
+        self.hits = {}
+        self.sums = {}
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, size):
+
+        import numpy as np
+
+        capacity = len(self.key)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity)
+
+        def grow(buffer):
+            grown = np.empty(capacity, dtype=buffer.dtype)
+            grown[:self.size] = buffer[:self.size]
+            return grown
+
+        self.key = grow(self.key)
+        self.negative = grow(self.negative)
+        for query in self.isRelevant:
+            self.isRelevant[query] = grow(self.isRelevant[query])
+
+    def _sum(self, negative, isRelevant, offset, hits):
+        """Sum of precisions of ranked shots following `offset` others"""
+
+        import numpy as np
+
+        if self.depth is not None:
+            n = max(0, self.depth - offset)
+            negative, isRelevant = negative[:n], isRelevant[:n]
+
+        if len(isRelevant) == 0:
+            return 0.
+
+        if self.ties:
+            return self._sumTied(negative, isRelevant, offset, hits)
+
+        # precisions at (0-based) ranks of relevant shots only
+        rank = offset + np.flatnonzero(isRelevant)
+        return np.sum((hits + 1. + np.arange(len(rank))) / (1. + rank))
+
+    def _sumTied(self, negative, isRelevant, offset, hits):
+        """Sum of expected precisions (as sumExpectedPrecision) of ranked
+        shots following `offset` others, `hits` of them relevant. Groups of
+        tied shots without any relevant one do not contribute: skip them"""
+
+        import numpy as np
+
+        starts = np.flatnonzero(np.r_[True, negative[1:] != negative[:-1]])
+        n = np.diff(np.r_[starts, len(negative)])
+        r = np.add.reduceat(isRelevant.astype(int), starts)
+        H = hits + np.cumsum(r) - r
+
+        relevant = r > 0
+        starts, n, r, H = starts[relevant], n[relevant], r[relevant], \
+            H[relevant]
+
+        group = np.repeat(np.arange(len(starts)), n)
+        j = 1. + np.arange(len(group)) - (np.cumsum(n) - n)[group]
+        n, r, H = 1. * n[group], 1. * r[group], 1. * H[group]
+        rank = offset + starts[group] + j
+
+        before = H + (j - 1) * (r - 1) / np.maximum(1, n - 1)
+        return np.sum(r / n * (before + 1) / rank)
+
+    def track(self, query, relevant):
+        """Start summing precisions of `query`
+
+        Parameters
+        ----------
+        query : str
+        relevant : pd.Index
+            Relevant shot keys of `query`.
+        """
+
+        import numpy as np
+
+        flags = np.zeros(len(self.key), dtype=bool)
+        flags[:self.size] = relevant.get_indexer(self.key[:self.size]) >= 0
+
+        self.relevant[query] = relevant
+        self.isRelevant[query] = flags
+        self.hits[query] = int(np.count_nonzero(flags))
+        self.sums[query] = self._sum(self.negative[:self.size],
+                                     flags[:self.size], 0, 0)
+
+    def untrack(self, query):
+        for attribute in [self.relevant, self.isRelevant,
+                          self.hits, self.sums]:
+            del attribute[query]
+
+    def sumPrecision(self, query):
+        """Sum of precisions of `query` (None if no shot is returned)"""
+        return self.sums[query] if self.size > 0 else None
+
+    def add(self, key, confidence):
+        """Add (unique) shots `key` with their `confidence`
+
+        Shots already returned are moved up when their confidence
+        increases, and left where they are otherwise.
+        """
+
+        import numpy as np
+
+        previous = np.array([self.confidence.get(k, -np.inf) for k in key])
+        new = confidence > previous
+        if not np.any(new):
+            return
+
+        key, confidence, previous = key[new], confidence[new], previous[new]
+        for k, c in zip(key, confidence):
+            self.confidence[k] = c
+
+        order = np.lexsort((key, -confidence))
+        key, negative = key[order], -confidence[order]
+        moved = key[np.isfinite(previous[order])]
+
+        # highest rank changed: shots moved up are only ranked lower than
+        # where they move to. with ties, it is the first of its tied shots.
+        size = self.size
+        position = rankPosition(self.negative[:size], self.key[:size],
+                                negative, key)
+        start = position[0]
+        if self.ties and start > 0:
+            start = np.searchsorted(self.negative[:size],
+                                    self.negative[start - 1], side='left')
+
+        oldKey = self.key[start:size]
+        oldNegative = self.negative[start:size]
+
+        # new ranks from `start`, where moved up shots no longer are
+        if len(moved) > 0:
+            keep = ~isRelevant(oldKey, moved)
+            keptKey, keptNegative = oldKey[keep], oldNegative[keep]
+            position = rankPosition(keptNegative, keptKey, negative, key)
+        else:
+            keep = slice(None)
+            keptKey, keptNegative = oldKey, oldNegative
+            position = position - start
+
+        newKey = np.insert(keptKey, position, key)
+        newNegative = np.insert(keptNegative, position, negative)
+
+        # update sums of precisions from `start` onward
+        flags = {}
+        for query, relevant in self.relevant.items():
+            oldFlags = self.isRelevant[query][start:size]
+            newFlags = np.insert(oldFlags[keep], position,
+                                 relevant.get_indexer(key) >= 0)
+            hits = self.hits[query] - int(np.count_nonzero(oldFlags))
+            self.sums[query] += \
+                self._sum(newNegative, newFlags, start, hits) - \
+                self._sum(oldNegative, oldFlags, start, hits)
+            self.hits[query] = hits + int(np.count_nonzero(newFlags))
+            flags[query] = newFlags
+
+        self._reserve(start + len(newKey))
+        self.size = start + len(newKey)
+        self.key[start:self.size] = newKey
+        self.negative[start:self.size] = newNegative
+        for query, newFlags in flags.items():
+            self.isRelevant[query][start:self.size] = newFlags
+
+    def shots(self):
+        """Returned shot keys (sorted) and their maximum confidence"""
+        import numpy as np
+        key = self.key[:self.size]
+        order = np.argsort(key)
+        return key[order], -self.negative[:self.size][order]
+
+
+class RunningEvaluation(object):
+    """Evaluation of a hypothesis while it is still being written
+
+    Labels (and evidences) are added as they arrive, and only update what
+    they change: each personName keeps its returned shots ranked (see
+    RankedShots) along with the sums of precisions of queries it is the
+    closest personName of, and `update` only scores queries again whose
+    sums of precisions, number of relevant shots (newly labeled videos) or
+    evidence changed.
+
+    Running scores are those of the hypothesis so far, restricted to the
+    videos it covers so far (i.e. as if the reference only contained these
+    videos), tied shots being ranked by key. Final scores (`finalize`) are
+    computed from scratch against the whole reference, exactly like
+    `evaluateQuery` does.
+
+    Parameters
+    ----------
+    queries : list
+    shot : ShotTable
+    reference : LabelReferenceTable
+    evireference : EvidenceReferenceTable
+    threshold : float
+        Levenshtein ratio threshold.
+    ties : boolean, optional
+        Compute expected average precision over orderings of tied shots.
+    depth : int, optional
+        Compute average precision of the `depth` top-ranked shots.
+    """
+
+    def __init__(self, queries, shot, reference, evireference, threshold,
+                 ties=False, depth=None):
+        super(RunningEvaluation, self).__init__()
+
+        import numpy as np
+        import pandas as pd
+
+        self.queries = list(OrderedDict.fromkeys(queries))
+        self.shot = shot
+        self.reference = reference
+        self.evireference = evireference
+        self.threshold = threshold
+        self.ties = ties
+        self.depth = depth
+
+        # videos covered by labels so far
+        self.seen = np.zeros(len(shot.videos), dtype=bool)
+        self.nLabels = 0
+
+        # personName --> RankedShots
+        self.returned = {}
+        # personName --> (shot key, source code) of its evidence
+        self.evidence = {}
+
+        # query --> (closest personName, similarity)
+        self.best = dict((query, (None, 0.)) for query in self.queries)
+
+        # query --> index of (unique) relevant shot keys
+        self.relevant = {}
+        # video code --> {query: number of its relevant shots in video}
+        self.relevantIn = {}
+        # video code --> queries with reference labels or evidences in it
+        self.queriesIn = {}
+        for query in self.queries:
+            relevant = np.unique(reference.named(query).key)
+            self.relevant[query] = pd.Index(relevant)
+            video, count = np.unique(relevant >> 32, return_counts=True)
+            for v, n in zip(video, count):
+                self.relevantIn.setdefault(v, {})[query] = n
+            videos = np.union1d(video, evireference.named(query).video)
+            for v in videos:
+                self.queriesIn.setdefault(v, set()).add(query)
+
+        # query --> number of relevant shots in videos labeled so far
+        self.nRelevant = dict((query, 0) for query in self.queries)
+
+        self.averagePrecision = {}
+        self.correctness = {}
+
+        # queries to score again on next update
+        self.dirty = set(self.queries)
+
+    @property
+    def nVideos(self):
+        return int(self.seen.sum())
+
+    def _see(self, videos):
+        """Mark `videos` (codes) as labeled"""
+        for v in videos[~self.seen[videos]]:
+            for query, n in self.relevantIn.get(v, {}).items():
+                self.nRelevant[query] += n
+            self.dirty.update(self.queriesIn.get(v, ()))
+        self.seen[videos] = True
+
+    def _shots(self, personName):
+        if personName not in self.returned:
+            self.returned[personName] = RankedShots(ties=self.ties,
+                                                    depth=self.depth)
+        return self.returned[personName]
+
+    def addLabels(self, label):
+        """Add labels (DataFrame, as returned by loadLabel)
+
+        Raises ValueError for labels of shots not in the reference.
+        """
+
+        from common import LabelTable, checkSubmission
+        import numpy as np
+
+        label = LabelTable.fromFrame(label, videos=self.shot.videos)
+        checkSubmission(self.shot, label)
+
+        self._see(np.unique(label.video))
+
+        # new shots of each name, with their maximum confidence
+        name, key, confidence = label.name, label.key, label.confidence
+        order = np.lexsort((confidence, key, name))
+        name, key, confidence = name[order], key[order], confidence[order]
+        last = np.r_[(name[1:] != name[:-1]) | (key[1:] != key[:-1]), True]
+        name, key, confidence = name[last], key[last], confidence[last]
+
+        starts = np.flatnonzero(np.r_[True, name[1:] != name[:-1]])
+        stops = np.r_[starts[1:], len(name)]
+
+        for start, stop in zip(starts, stops):
+            shots = self._shots(label.names.decode(name[start]))
+            shots.add(key[start:stop], confidence[start:stop])
+            self.dirty.update(shots.relevant)
+
+        self.nLabels += len(label)
+
+    def addEvidence(self, evidence):
+        """Add evidences (DataFrame, as returned by loadEvidence)
+
+        Raises ValueError for more than one evidence per name or evidences
+        of shots not in the reference.
+        """
+
+        from common import EvidenceTable, checkEvidence
+        from Levenshtein import ratio
+
+        evidence = EvidenceTable.fromFrame(
+            evidence, videos=self.shot.videos,
+            sources=self.evireference.sources)
+        checkEvidence(self.shot, evidence)
+
+        names = evidence['personName']
+        if any(personName in self.evidence for personName in names):
+            msg = ('There must be exactly one evidence '
+                   'per unique name in label submission.')
+            raise ValueError(msg)
+
+        for personName, key, source in zip(
+                names, evidence.key, evidence.source):
+            self.evidence[personName] = (key, source)
+
+        # new names may be closer to some queries. like `evaluateQuery`,
+        # keep the first one in case of equal similarity.
+        for query in self.queries:
+            personName, similarity = self.best[query]
+            for name in names:
+                r = ratio(query, name)
+                if r > similarity:
+                    personName, similarity = name, r
+            if personName == self.best[query][0]:
+                continue
+            previous = self.personName(query)
+            if previous is not None:
+                self.returned[previous].untrack(query)
+            self.best[query] = (personName, similarity)
+            if similarity > self.threshold:
+                self._shots(personName).track(query, self.relevant[query])
+            self.dirty.add(query)
+
+    def personName(self, query):
+        """Closest personName of `query` (None if not close enough)"""
+        personName, similarity = self.best[query]
+        return personName if similarity > self.threshold else None
+
+    def evidenceCorrectness(self, query):
+        """Evidence correctness of `query` so far"""
+
+        personName = self.personName(query)
+        if personName is None:
+            return 0. if self.nRelevant[query] > 0 else 1.
+
+        key, source = self.evidence[personName]
+        qRelevant = self.evireference.named(query)
+        qRelevant = qRelevant[self.seen[qRelevant.video]]
+        return 1. if evidenceMatches(qRelevant, key, source) else 0.
+
+    def score(self, query):
+        """Average precision and correctness of `query` so far"""
+
+        nRelevant = self.nRelevant[query]
+        if self.depth is not None:
+            nRelevant = min(nRelevant, self.depth)
+
+        personName = self.personName(query)
+        sumPrecision = None if personName is None else \
+            self.returned[personName].sumPrecision(query)
+
+        if nRelevant == 0:
+            averagePrecision = 1.
+        elif sumPrecision is None:
+            averagePrecision = 0.
+        else:
+            averagePrecision = sumPrecision / nRelevant
+
+        return averagePrecision, self.evidenceCorrectness(query)
+
+    def update(self):
+        """Score affected queries and return running EwMAP, MAP and C"""
+
+        for query in self.dirty:
+            self.averagePrecision[query], self.correctness[query] = \
+                self.score(query)
+        self.dirty = set()
+
+        return computeScores(self.queries,
+                             self.averagePrecision, self.correctness)
+
+    def finalize(self):
+        """Return final EwMAP, MAP and C, against the whole reference
+
+        Raises ValueError when names of labels and evidences differ (see
+        checkSubmission).
+        """
+
+        from common import rankByConfidence, rankTopConfidence
+        import numpy as np
+
+        labelNames = set(personName for personName, shots
+                         in self.returned.items() if len(shots) > 0)
+        if labelNames != set(self.evidence):
+            msg = ('There must be exactly one evidence '
+                   'per unique name in label submission.')
+            raise ValueError(msg)
+
+        self._see(np.arange(len(self.shot.videos)))
+
+        # from scratch, ranked like evaluateQuery
+        for query in self.queries:
+
+            qRelevant = self.relevant[query].values
+            personName = self.personName(query)
+            if personName is None:
+                qReturned = confidence = np.array([], dtype=np.int64)
+            else:
+                qReturned, confidence = self.returned[personName].shots()
+
+            if self.ties:
+                averagePrecision = computeExpectedAveragePrecision(
+                    qReturned, confidence, qRelevant)
+            elif self.depth is not None:
+                averagePrecision = computeAveragePrecision(
+                    qReturned[rankTopConfidence(confidence, self.depth)],
+                    qRelevant, depth=self.depth)
+            else:
+                averagePrecision = computeAveragePrecision(
+                    qReturned[rankByConfidence(confidence)], qRelevant)
+
+            self.averagePrecision[query] = averagePrecision
+            self.correctness[query] = self.evidenceCorrectness(query)
+
+        self.dirty = set()
+
+        return computeScores(self.queries,
+                             self.averagePrecision, self.correctness)
+
+
+class Tail(object):
+    """Lines appended to a text file since last call to `read`"""
+
+    def __init__(self, path):
+        super(Tail, self).__init__()
+        self.path = path
+        self._file = None
+        self._remainder = ''
+
+    def read(self, final=False):
+        """Return new complete lines (or all new data, if `final`)"""
+
+        import os
+
+        # file may not have been created yet
+        if self._file is None:
+            if not os.path.exists(self.path):
+                return ''
+            self._file = open(self.path, 'rb')
+
+        data = self._remainder + self._file.read()
+        if final:
+            self._remainder = ''
+            return data
+
+        lines, newline, self._remainder = data.rpartition('\n')
+        return lines + newline
+
+
+# evaluate `label` (and `evidence`) files as they grow and print running
+# scores every `interval` seconds, until interrupted (Ctrl-C) while waiting
+# for new lines. returns final scores, against the whole reference.
+def follow(running, label, evidence=None, interval=10.):
+
+    from common import loadLabel, loadEvidence
+    import time
+    import io
+
+    # evidences first, so that names of new labels are already known
+    tails = [(Tail(label), loadLabel, running.addLabels)]
+    if evidence is not None:
+        tails.insert(0, (Tail(evidence), loadEvidence, running.addEvidence))
+
+    def poll(final=False):
+        for tail, load, add in tails:
+            data = tail.read(final=final)
+            if data.strip():
+                add(load(io.BytesIO(data)))
+
+    while True:
+        poll()
+        if running.dirty:
+            EwMAP, MAP, mCorrectness = running.update()
+            print '%d videos, %d labels: EwMAP = %.2f %% ' \
+                  'MAP = %.2f %% C = %.2f %%' % (
+                      running.nVideos, running.nLabels, 100 * EwMAP,
+                      100 * MAP, 100 * mCorrectness)
+            sys.stdout.flush()
+
+        # only stop between polls: lines read by an interrupted poll
+        # would be lost
+        try:
+            time.sleep(interval)
+        except KeyboardInterrupt:
+            break
+
+    poll(final=True)
+
+    return running.finalize()
 
 
 if __name__ == '__main__':
@@ -128,105 +1370,199 @@ if __name__ == '__main__':
     evidence = arguments['<hypothesis.evidence>']
     threshold = float(arguments['--levenshtein'])
     consensus = arguments['--consensus']
+    segments = arguments['--segments']
+    ties = arguments['--ties']
+
+    depth = arguments['--depth']
+    if depth is not None:
+        if not depth.isdigit() or int(depth) < 1:
+            sys.exit('--depth must be a positive integer.')
+        if ties:
+            sys.exit('--depth cannot be combined with --ties.')
+        depth = int(depth)
 
-    reference, evireference, label, evidence = loadFiles(
-        shot, reference, evireference, label, evidence, consensus=consensus)
+    # check result files extension before spending time evaluating
+    from common import extension, RECORD_FORMATS
+    for option in ['--export', '--errors']:
+        path = arguments[option]
+        if path is not None and extension(path) not in RECORD_FORMATS:
+            sys.exit('%s must be a .jsonl, .csv or .parquet file.' % option)
 
+    queries = None
     if arguments['--queries']:
         with open(arguments['--queries'], 'r') as f:
             queries = [line.strip() for line in f]
 
+    shard, shards = 0, 1
+    if arguments['--shard']:
+        try:
+            shard, shards = parseShard(arguments['--shard'])
+        except ValueError, e:
+            sys.exit(e.message)
+
+    if arguments['--references']:
+
+        for option in ['--consensus', '--segments', '--export', '--partial',
+                       '--follow', '--follow-evidence', '--oracle',
+                       '--errors']:
+            if arguments[option]:
+                sys.exit('--references cannot be combined with %s.' % option)
+
+        try:
+            label, evidence, references = loadReferences(
+                loadReferenceList(arguments['--references']),
+                label, evidence)
+        except ValueError, e:
+            sys.exit(e.message)
+
+        names = evidence.uniqueNames()
+
+        # closest personName of each query, shared by all references
+        best = {}
+
+        print '%-20s %9s %9s %9s' % ('reference', 'EwMAP', 'MAP', 'C')
+
+        for name, shot, reference, evireference, consensus in references:
+
+            qLabel = label
+            if consensus is not None:
+                qLabel = label[consensus.contains(label.key)]
+
+            qQueries = queries
+            if qQueries is None:
+                qQueries = sorted(set(evireference.uniqueNames()))
+            qQueries = [query for query in qQueries
+                        if shards == 1 or inShard(query, shard, shards)]
+
+            averagePrecision = {}
+            correctness = {}
+            for query in OrderedDict.fromkeys(qQueries):
+                if query not in best:
+                    best[query] = closestName(query, names)
+                result = evaluateQuery(query, names, reference, evireference,
+                                       qLabel, evidence, threshold,
+                                       best=best[query], ties=ties,
+                                       depth=depth)
+                averagePrecision[query] = result['averagePrecision']
+                correctness[query] = result['correctness']
+
+            print '%-20s %7.2f %% %7.2f %% %7.2f %%' % tuple(
+                [name] + [100 * score for score in computeScores(
+                    qQueries, averagePrecision, correctness)])
+
+        sys.exit()
+
+    if arguments['--follow'] or arguments['--follow-evidence']:
+
+        for option in ['--consensus', '--segments', '--export', '--partial',
+                       '--oracle', '--errors']:
+            if arguments[option]:
+                sys.exit('--follow cannot be combined with %s.' % option)
+
+        # only follow plain text files
+        from common import extension, COMPRESSION, COLUMNAR, loadTables
+        for path in [label, evidence]:
+            if extension(path) in COMPRESSION or extension(path) in COLUMNAR:
+                sys.exit('--follow only supports plain text files.')
+
+        tables = loadTables(shot=shot, reference=reference,
+                            evireference=evireference)
+        reference, evireference = tables.reference, tables.evireference
+
     else:
+        reference, evireference, label, evidence = loadFiles(
+            shot, reference, evireference, label, evidence,
+            consensus=consensus, segments=segments)
+
+    if queries is None:
         # build list of queries from evireference
-        queries = sorted(set(evireference['personName'].unique()))
+        queries = sorted(set(evireference.uniqueNames()))
 
-    # query --> averagePrecision dictionary
-    averagePrecision = {}
-    correctness = {}
+    # positions (in list of queries) of queries evaluated by this shard
+    indices = [i for i, query in enumerate(queries)
+               if shards == 1 or inShard(query, shard, shards)]
 
-    for query in queries:
+    if arguments['--follow'] or arguments['--follow-evidence']:
 
-        # find most similar personName
-        ratios = [(personName, ratio(query, personName))
-                  for personName in evidence.personName.unique()]
-        best = sorted(ratios, key=lambda x: x[1], reverse=True)[0]
+        running = RunningEvaluation([queries[i] for i in indices],
+                                    tables.shot, reference, evireference,
+                                    threshold, ties=ties, depth=depth)
 
-        personName = best[0] if best[1] > threshold else None
+        try:
+            if not arguments['--follow-evidence']:
+                from common import loadEvidence
+                running.addEvidence(loadEvidence(evidence))
+                evidence = None
 
-        # =====================================================================
-        # Evaluation of LABELS
-        # =====================================================================
+            printScores(*follow(running, label, evidence=evidence,
+                                interval=float(arguments['--interval'])))
 
-        # get relevant shots for this query, according to reference
-        qRelevant = reference[reference.personName == query]
-        qRelevant = qRelevant[['videoID', 'shotNumber']]
-        qRelevant = set((videoID, shotNumber)
-                        for _, videoID, shotNumber in qRelevant.itertuples())
+        except ValueError, e:
+            sys.exit(e.message)
 
-        # get returned shots for this query
-        # (i.e. shots containing closest personName)
-        qReturned = label[label.personName == personName]
+        # interrupted while reading or adding new lines
+        except KeyboardInterrupt:
+            sys.exit('Interrupted while adding new lines: no final scores.')
 
-        # this can only happen with --consensus option
-        # when hypothesis contains shot in the out of consensus part
-        # hack to solve this corner case
-        if len(qReturned) == 0:
-            averagePrecision[query] = 0. if len(qRelevant) > 0. else 1.
+        sys.exit()
 
-        else:
-            # sort shots by decreasing confidence
-            # (in case of shots returned twice for this query, keep maximum)
-            qReturned = (qReturned.groupby(['videoID', 'shotNumber'])
-                                  .aggregate(np.max)
-                                  .sort(['confidence'], ascending=False))
+    names = evidence.uniqueNames()
 
-            # get list of returned shots in decreasing confidence
-            qReturned = list(qReturned.index)
+    # query --> averagePrecision dictionary
+    averagePrecision = {}
+    correctness = {}
+    oracleAveragePrecision = {}
+    oracleCorrectness = {}
 
-            # compute average precision for this query
-            averagePrecision[query] = computeAveragePrecision(qReturned,
-                                                              qRelevant)
+    export = None
+    if arguments['--export']:
+        from common import RecordWriter
+        export = RecordWriter(arguments['--export'], RESULT_FIELDS)
 
-        # =====================================================================
-        # Evaluation of EVIDENCES
-        # =====================================================================
+    errors = None
+    if arguments['--errors']:
+        from common import RecordWriter
+        import os
+        root, ext = os.path.splitext(arguments['--errors'])
+        errors = OrderedDict(
+            (table, RecordWriter('%s.%s%s' % (root, table, ext), fields))
+            for table, fields in ERROR_TABLES.items())
 
+    # query --> result of evaluateQuery
+    results = OrderedDict()
 
+    # evaluate each query once, in order of appearance
+    for query in OrderedDict.fromkeys(queries[i] for i in indices):
 
-        if personName is None:
-            correctness[query] = 0. if len(qRelevant) > 0. else 1.
-            continue
+        result = evaluateQuery(query, names, reference, evireference,
+                               label, evidence, threshold, ties=ties,
+                               depth=depth)
 
-        # get evidence shots for this query, according to reference
-        qRelevant = evireference[evireference.personName == query]
-        qRelevant = qRelevant[['videoID', 'shotNumber', 'source']]
+        averagePrecision[query] = result['averagePrecision']
+        correctness[query] = result['correctness']
+        oracleAveragePrecision[query] = result['oracleAveragePrecision']
+        oracleCorrectness[query] = result['oracleCorrectness']
 
-        _qRelevant = set([])
-        for _, videoID, shotNumber, source in qRelevant.itertuples():
+        results[query] = result
 
-            if source == 'both':
-                _qRelevant.add((videoID, shotNumber, 'audio'))
-                _qRelevant.add((videoID, shotNumber, 'image'))
-            else:
-                _qRelevant.add((videoID, shotNumber, source))
+        if export is not None:
+            export.write(result)
 
-        qRelevant = _qRelevant
+    if export is not None:
+        export.close()
 
-        qReturned = evidence[evidence.personName == personName][[
-            'videoID', 'shotNumber', 'source']]
-        for _, videoID, shotNumber, source in qReturned.itertuples():
-            break
+    if errors is not None:
+        analyzeErrors(errors, list(results), results, reference,
+                      evireference, label, evidence, depth=depth)
 
-        if (videoID, shotNumber, source) in qRelevant:
-            correctness[query] = 1. if best[1] > threshold else 0.
-        else:
-            correctness[query] = 0.
+    if arguments['--partial']:
+        savePartial(arguments['--partial'], shard, shards, queries, indices,
+                    averagePrecision, correctness)
 
-    MAP = np.mean([averagePrecision[query] for query in queries])
-    mCorrectness = np.mean([correctness[query] for query in queries])
-    EwMAP = np.mean([correctness[query] * averagePrecision[query]
-                     for query in queries])
+    printScores(*computeScores([queries[i] for i in indices],
+                               averagePrecision, correctness))
 
-    print 'EwMAP = %.2f %%' % (100 * EwMAP)
-    print 'MAP = %.2f %%' % (100 * MAP)
-    print 'C = %.2f %%' % (100 * mCorrectness)
+    if arguments['--oracle']:
+        printOracleScores([queries[i] for i in indices],
+                          averagePrecision, correctness,
+                          oracleAveragePrecision, oracleCorrectness)
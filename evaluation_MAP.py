@@ -41,31 +41,30 @@ Options:
 """
 
 from docopt import docopt
-from Levenshtein import ratio
-import numpy as np
-
-from common import loadShot, loadLabel, checkSubmission
-from common import loadLabelReference
 
 
 def loadFiles(shot, reference, label):
 
-    shot = loadShot(shot)
-    label = loadLabel(label)
+    from common import loadTables, checkSubmission
 
-    checkSubmission(shot, label)
+    tables = loadTables(shot=shot, reference=reference, label=label)
 
-    reference = loadLabelReference(reference)
+    checkSubmission(tables.shot, tables.label)
 
-    return shot, reference, label
+    return tables.shot, tables.reference, tables.label
 
 
 def closeEnough(personName, query, threshold):
+    from Levenshtein import ratio
     return ratio(query, personName) >= threshold
 
 
+# vReturned: returned shot keys, in decreasing confidence order
+# vRelevant: (unique) relevant shot keys
 def computeAveragePrecision(vReturned, vRelevant):
 
+    import numpy as np
+
     nReturned = len(vReturned)
     nRelevant = len(vRelevant)
 
@@ -78,7 +77,7 @@ def computeAveragePrecision(vReturned, vRelevant):
     if nReturned == 0 and nRelevant > 0:
         return 0.
 
-    returnedIsRelevant = np.array([item in vRelevant for item in vReturned])
+    returnedIsRelevant = np.in1d(vReturned, vRelevant)
     precision = np.cumsum(returnedIsRelevant) / (1. + np.arange(nReturned))
     return np.sum(precision * returnedIsRelevant) / min(nReturned, nRelevant)
 
@@ -87,6 +86,10 @@ if __name__ == '__main__':
 
     arguments = docopt(__doc__, version='0.1')
 
+    from Levenshtein import ratio
+    from common import rankByConfidence
+    import numpy as np
+
     shot = arguments['<reference.shot>']
     reference = arguments['<reference.ref>']
     label = arguments['<hypothesis.label>']
@@ -100,7 +103,7 @@ if __name__ == '__main__':
 
     else:
         # build list of queries from reference
-        queries = sorted(set(reference['personName'].unique()))
+        queries = sorted(set(reference.uniqueNames()))
 
     # query --> averagePrecision dictionary
     averagePrecision = {}
@@ -108,7 +111,7 @@ if __name__ == '__main__':
 
     labels = set([])
 
-    for p in label['personName']:
+    for p in label.uniqueNames():
         labels.add(p)
 
     for query in queries:
@@ -129,23 +132,16 @@ if __name__ == '__main__':
         # =====================================================================
 
         # get relevant shots for this query, according to reference
-        qRelevant = reference[reference.personName == query]
-        qRelevant = qRelevant[['videoID', 'shotNumber']]
-        qRelevant = set((videoID, shotNumber)
-                        for _, videoID, shotNumber in qRelevant.itertuples())
+        qRelevant = np.unique(reference.named(query).key)
 
         # get returned shots for this query
         # (i.e. shots containing closest personName)
-        qReturned = label[label.personName == personName]
+        qReturned = label.named(personName)
 
         # sort shots by decreasing confidence
         # (in case of shots returned twice for this query, keep maximum)
-        qReturned = (qReturned.groupby(['videoID', 'shotNumber'])
-                              .aggregate(np.max)
-                              .sort(['confidence'], ascending=False))
-
-        # get list of returned shots in decreasing confidence
-        qReturned = list(qReturned.index)
+        qReturned, confidence = qReturned.maxConfidence()
+        qReturned = qReturned[rankByConfidence(confidence)]
 
         # compute average precision for this query
         averagePrecision[query] = computeAveragePrecision(qReturned,
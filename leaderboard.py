@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2015 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+"""
+MediaEval Person Discovery Task leaderboard.
+
+Consume the submission queue (to which submission.py sends every new,
+updated or deleted run), score submitted runs against the reference and
+publish the leaderboard.
+
+Usage:
+  leaderboard [options] <reference.shot> <reference.ref> <reference.eviref>
+
+Options:
+  -h --help                    Show this screen.
+  --version                    Show version.
+  --dev                        Development set.
+  --debug                      Show debug information.
+  --url=URL                    Submission server URL
+                               [default: http://api.mediaeval.niderb.fr]
+  --login=LOGIN                Username [default: robot_leaderboard]
+  --password=P45sw0Rd          Password.
+  --queries=<queries.lst>      Query list.
+  --levenshtein=<threshold>    Levenshtein ratio threshold [default: 0.95]
+  --output=<leaderboard.json>  Publish leaderboard to this JSON file (and
+                               resume from it when restarted).
+  --workers=<n>                Maximum number of concurrent downloads
+                               [default: 8]
+  --batch=<n>                  Maximum number of queued messages processed
+                               at once [default: 100]
+  --poll=<seconds>             Delay between checks of an empty queue
+                               [default: 10]
+  --once                       Exit as soon as the queue is empty.
+"""
+
+# heavy dependencies are imported where they are needed
+from docopt import docopt
+from collections import OrderedDict
+import json
+import time
+import sys
+import os
+
+# submission (queue message) fields kept in leaderboard
+SUBMISSION_FIELDS = ['team', 'user', 'date', 'type', 'name',
+                     'id_label', 'id_evidence']
+
+
+class Leaderboard(object):
+    """Scores of submitted runs against a reference loaded once
+
+    Parameters
+    ----------
+    shot, reference, evireference : str
+        Paths to reference files.
+    queries : list, optional
+        Defaults to all persons of the evidence reference.
+    threshold : float, optional
+        Levenshtein ratio threshold.
+    """
+
+    def __init__(self, shot, reference, evireference, queries=None,
+                 threshold=0.95):
+        super(Leaderboard, self).__init__()
+
+        from common import loadTables
+
+        tables = loadTables(shot=shot, reference=reference,
+                            evireference=evireference)
+        self.shot = tables.shot
+        self.reference = tables.reference
+        self.evireference = tables.evireference
+
+        if queries is None:
+            queries = sorted(set(self.evireference.uniqueNames()))
+        self.queries = queries
+        self.threshold = threshold
+
+        # label layer --> leaderboard entry
+        self.entries = OrderedDict()
+
+    def score(self, label, evidence):
+        """EwMAP, MAP and C of one run
+
+        Parameters
+        ----------
+        label, evidence : DataFrame
+            As returned by loadLabel and loadEvidence.
+
+        Raises ValueError for invalid runs.
+        """
+
+        from common import Vocabulary, LabelTable, EvidenceTable
+        from common import checkSubmission
+        from evaluation import evaluateQuery, computeScores
+
+        # hypothesis names are coded with their own vocabulary
+        names = Vocabulary(label['personName'].values,
+                           evidence['personName'].values)
+        label = LabelTable.fromFrame(
+            label, videos=self.shot.videos, names=names,
+            sources=self.evireference.sources)
+        evidence = EvidenceTable.fromFrame(
+            evidence, videos=self.shot.videos, names=names,
+            sources=self.evireference.sources)
+
+        checkSubmission(self.shot, label, evidence)
+
+        names = evidence.uniqueNames()
+
+        averagePrecision = {}
+        correctness = {}
+        for query in OrderedDict.fromkeys(self.queries):
+            result = evaluateQuery(query, names, self.reference,
+                                   self.evireference, label, evidence,
+                                   self.threshold)
+            averagePrecision[query] = result['averagePrecision']
+            correctness[query] = result['correctness']
+
+        return computeScores(self.queries, averagePrecision, correctness)
+
+    def update(self, message, label, evidence):
+        """Score submission described by queue `message`
+
+        `label` and `evidence` are None when they could not be downloaded.
+        """
+
+        entry = dict((key, message.get(key, None))
+                     for key in SUBMISSION_FIELDS)
+        entry.update(EwMAP=None, MAP=None, C=None, error=None)
+
+        if label is None:
+            entry['error'] = 'Unable to download submission.'
+
+        else:
+            try:
+                EwMAP, MAP, mCorrectness = self.score(label, evidence)
+                entry.update(EwMAP=EwMAP, MAP=MAP, C=mCorrectness)
+            except ValueError, e:
+                entry['error'] = e.message
+
+        # most recent submissions last
+        self.entries.pop(message['id_label'], None)
+        self.entries[message['id_label']] = entry
+
+    def remove(self, labelLayer):
+        self.entries.pop(labelLayer, None)
+
+    def ranking(self):
+        """Entries by decreasing EwMAP (invalid submissions last)"""
+        return sorted(self.entries.values(),
+                      key=lambda entry: (entry['EwMAP'] is None,
+                                         -(entry['EwMAP'] or 0.)))
+
+    def load(self, path):
+        with open(path, 'r') as f:
+            for entry in json.load(f)['submissions']:
+                self.entries[entry['id_label']] = entry
+
+    def save(self, path):
+        # write then rename, so that readers never see a partial file
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'submissions': self.ranking()}, f, indent=2)
+        os.rename(temporary, path)
+
+    def printTable(self):
+
+        print '%4s %-16s %-12s %-20s %8s %8s %8s' % (
+            'rank', 'team', 'type', 'name', 'EwMAP', 'MAP', 'C')
+
+        for rank, entry in enumerate(self.ranking()):
+            if entry['EwMAP'] is None:
+                print '%4s %-16s %-12s %-20s %s' % (
+                    '-', entry['team'], entry['type'], entry['name'],
+                    entry['error'])
+                continue
+            print '%4d %-16s %-12s %-20s %6.2f %% %6.2f %% %6.2f %%' % (
+                rank + 1, entry['team'], entry['type'], entry['name'],
+                100 * entry['EwMAP'], 100 * entry['MAP'], 100 * entry['C'])
+
+        sys.stdout.flush()
+
+
+# dequeue up to `batch` messages (less when queue gets empty)
+def dequeueMessages(queue, batch):
+
+    import submission
+
+    messages = []
+    while len(messages) < batch:
+        try:
+            messages.append(submission.GLOBAL_CLIENT.dequeue(queue))
+        except Exception:
+            break
+
+    return messages
+
+
+# process a burst of messages at once: a submission updated several times
+# is scored once (in its latest version) and a submission deleted in the
+# meantime is not scored at all. all layers are downloaded concurrently.
+def processMessages(leaderboard, messages, workers=8):
+
+    import submission
+
+    pending = OrderedDict()
+    for message in messages:
+        labelLayer = message['id_label']
+        pending.pop(labelLayer, None)
+        if 'deletedBy' in message:
+            leaderboard.remove(labelLayer)
+        else:
+            pending[labelLayer] = message
+
+    if submission.GLOBAL_DEBUG:
+        submission.debug('%d messages: %d submissions to score.' % (
+            len(messages), len(pending)))
+
+    downloaded = submission.downloadSubmissions(
+        [(message['id_label'], message['id_evidence'])
+         for message in pending.values()], workers=workers)
+
+    for labelLayer, message in pending.items():
+        label, evidence = downloaded[labelLayer] or (None, None)
+        leaderboard.update(message, label, evidence)
+
+
+if __name__ == '__main__':
+
+    arguments = docopt(__doc__, version='0.1')
+
+    import submission
+    import atexit
+
+    submission.GLOBAL_DEV_OR_TEST = 'dev' if arguments['--dev'] else 'test'
+    submission.GLOBAL_DEBUG = arguments['--debug']
+    atexit.register(submission.reportStatistics)
+
+    queries = None
+    if arguments['--queries']:
+        with open(arguments['--queries'], 'r') as f:
+            queries = [line.strip() for line in f]
+
+    leaderboard = Leaderboard(arguments['<reference.shot>'],
+                              arguments['<reference.ref>'],
+                              arguments['<reference.eviref>'],
+                              queries=queries,
+                              threshold=float(arguments['--levenshtein']))
+
+    output = arguments['--output']
+    if output and os.path.exists(output):
+        leaderboard.load(output)
+
+    submission.initialize(arguments['--url'],
+                          username=arguments['--login'],
+                          password=arguments['--password'])
+    submission.initializeForSubmission()
+    queue = submission.getSubmissionQueue()
+
+    workers = int(arguments['--workers'])
+    batch = int(arguments['--batch'])
+    poll = float(arguments['--poll'])
+
+    while True:
+
+        messages = dequeueMessages(queue, batch)
+
+        if not messages:
+            if arguments['--once']:
+                break
+            time.sleep(poll)
+            continue
+
+        processMessages(leaderboard, messages, workers=workers)
+
+        leaderboard.printTable()
+        if output:
+            leaderboard.save(output)
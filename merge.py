@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2015 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+"""
+MediaEval Person Discovery Task evaluation (merge sharded results).
+
+Combine per-query results of all shards of a sharded evaluation
+(evaluation.py --shard=i/n --partial=<partial.jsonl>) into the scores
+a single evaluation.py run would have given.
+
+Usage:
+  merge [options] <partial.jsonl>...
+
+Options:
+  -h --help                     Show this screen.
+  --version                     Show version.
+"""
+
+from docopt import docopt
+import sys
+
+
+def loadPartials(paths):
+    """Load and check completeness of partial results
+
+    Returns
+    -------
+    queries : list
+        Full list of queries (in evaluation order).
+    averagePrecision, correctness : dict
+        Per-query results.
+    """
+
+    import json
+
+    shards = None
+    nQueries = None
+    seen = set([])
+    queries = {}
+    averagePrecision = {}
+    correctness = {}
+
+    for path in paths:
+
+        with open(path, 'r') as f:
+
+            header = json.loads(f.readline())
+
+            if shards is None:
+                shards, nQueries = header['shards'], header['queries']
+            if (header['shards'], header['queries']) != (shards, nQueries):
+                msg = '%s does not belong to the same evaluation.' % path
+                raise ValueError(msg)
+
+            if header['shard'] in seen:
+                msg = 'Shard %d was provided twice.' % header['shard']
+                raise ValueError(msg)
+            seen.add(header['shard'])
+
+            for line in f:
+                result = json.loads(line)
+                query = result['query']
+                queries[result['index']] = query
+                averagePrecision[query] = result['averagePrecision']
+                correctness[query] = result['correctness']
+
+    missing = sorted(set(range(shards)) - seen)
+    if missing:
+        msg = 'Missing shards: %s.' % ', '.join(str(i) for i in missing)
+        raise ValueError(msg)
+
+    if sorted(queries) != range(nQueries):
+        msg = 'Partial results do not cover all %d queries.' % nQueries
+        raise ValueError(msg)
+
+    queries = [queries[i] for i in range(nQueries)]
+
+    return queries, averagePrecision, correctness
+
+
+if __name__ == '__main__':
+
+    arguments = docopt(__doc__, version='0.3')
+
+    from evaluation import computeScores, printScores
+
+    try:
+        queries, averagePrecision, correctness = loadPartials(
+            arguments['<partial.jsonl>'])
+    except ValueError, e:
+        sys.exit(e.message)
+
+    printScores(*computeScores(queries, averagePrecision, correctness))
@@ -0,0 +1,588 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2015 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+"""
+Local stand-in for the Camomile server used by the submission manager.
+
+Only the routes needed by submission.py are implemented (corpora, layers,
+media, annotations, groups, users, queues and date), with an in-memory
+database populated with a synthetic corpus.
+
+Usage:
+  mockserver [options]
+
+Options:
+  -h --help               Show this screen.
+  --port=<port>           Port to listen on [default: 12345]
+  --videos=<videos>       Number of videos in synthetic corpus [default: 10]
+  --shots=<shots>         Number of shots per video [default: 100]
+  --latency=<seconds>     Delay added to every request [default: 0]
+  --failure=<rate>        Ratio of requests failing with error 500
+                          [default: 0]
+  --bandwidth=<bytes/s>   Simulated upload bandwidth [default: 0]
+  --no-gzip               Refuse gzip-compressed request bodies.
+"""
+
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from urlparse import urlparse, parse_qs
+from datetime import datetime
+import threading
+import random
+import json
+import time
+import zlib
+import re
+
+# name conventions (see submission.py)
+CORPUS_NAME_DEV = 'mediaeval.development'
+CORPUS_NAME_TEST = 'mediaeval.test'
+GROUP_ORGANIZER = 'organizer'
+USER_ROBOT_SUBMISSION = 'robot_submission'
+USER_ROBOT_LEADERBOARD = 'robot_leaderboard'
+LAYER_SUBMISSION_SHOT = 'mediaeval.submission_shot'
+QUEUE_SUBMISSION = 'mediaeval.submission.in'
+
+# default credentials of the team member used by benchmarks
+USERNAME = 'participant'
+PASSWORD = 'password'
+TEAM = 'team_mock'
+
+ID = r'([0-9a-f]{24})'
+
+
+class MockError(Exception):
+
+    def __init__(self, status, message):
+        super(MockError, self).__init__(message)
+        self.status = status
+
+
+class MockCamomile(object):
+    """In-memory Camomile database
+
+    Parameters
+    ----------
+    latency : float, optional
+        Delay (in seconds) added to every request.
+    failure : float, optional
+        Ratio of requests randomly failing with error 500.
+    seed : int, optional
+        Random seed for failure injection.
+    bandwidth : float, optional
+        Simulated upload bandwidth (in bytes per second). Defaults to
+        unlimited bandwidth.
+    gzip : boolean, optional
+        Whether gzip-compressed request bodies are accepted. Defaults to True.
+    """
+
+    def __init__(self, latency=0., failure=0., seed=None,
+                 bandwidth=0., gzip=True):
+        super(MockCamomile, self).__init__()
+
+        self.latency = latency
+        self.failure = failure
+        self.bandwidth = bandwidth
+        self.gzip = gzip
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counter = 0
+
+        self.users = {}
+        self.groups = {}
+        self.corpora = {}
+        self.media = {}
+        self.layers = {}
+        self.annotations = {}
+        self.queues = {}
+
+        # id_layer --> id_medium --> list of annotation IDs
+        self._annotationIndex = {}
+
+        # session cookie --> id_user
+        self._sessions = {}
+
+        self.routes = [
+            ('POST', r'/login', self.login),
+            ('POST', r'/logout', self.logout),
+            ('GET', r'/me', self.me),
+            ('GET', r'/me/group', self.myGroups),
+            ('GET', r'/date', self.date),
+            ('GET', r'/user', self.getUsers),
+            ('GET', r'/group', self.getGroups),
+            ('GET', r'/corpus', self.getCorpora),
+            ('GET', r'/corpus/%s/medium' % ID, self.getMedia),
+            ('GET', r'/corpus/%s/layer' % ID, self.getLayers),
+            ('POST', r'/corpus/%s/layer' % ID, self.createLayer),
+            ('GET', r'/layer/%s' % ID, self.getLayer),
+            ('PUT', r'/layer/%s' % ID, self.updateLayer),
+            ('DELETE', r'/layer/%s' % ID, self.deleteLayer),
+            ('PUT', r'/layer/%s/(user|group)/%s' % (ID, ID),
+             self.setLayerPermissions),
+            ('GET', r'/layer/%s/permissions' % ID, self.getLayerPermissions),
+            ('GET', r'/layer/%s/annotation' % ID, self.getAnnotations),
+            ('POST', r'/layer/%s/annotation' % ID, self.createAnnotations),
+            ('PUT', r'/annotation/%s' % ID, self.updateAnnotation),
+            ('DELETE', r'/annotation/%s' % ID, self.deleteAnnotation),
+            ('GET', r'/queue', self.getQueues),
+            ('PUT', r'/queue/%s/next' % ID, self.enqueue),
+            ('GET', r'/queue/%s/next' % ID, self.dequeue),
+        ]
+        self.routes = [(method, re.compile('^%s$' % pattern), handler)
+                       for method, pattern, handler in self.routes]
+
+    # -------------------------------------------------------------------------
+    # DATABASE
+    # -------------------------------------------------------------------------
+
+    def _newID(self):
+        self._counter += 1
+        return '%024x' % self._counter
+
+    def _now(self):
+        return datetime.utcnow().isoformat() + 'Z'
+
+    def addUser(self, username, password=PASSWORD, groups=()):
+        _id = self._newID()
+        self.users[_id] = {'_id': _id, 'username': username,
+                           'password': password, 'role': 'user',
+                           'description': {}}
+        for group in groups:
+            self.groups[group]['users'].append(_id)
+        return _id
+
+    def addGroup(self, name):
+        _id = self._newID()
+        self.groups[_id] = {'_id': _id, 'name': name,
+                            'description': {}, 'users': []}
+        return _id
+
+    def addCorpus(self, name):
+        _id = self._newID()
+        self.corpora[_id] = {'_id': _id, 'name': name, 'description': {}}
+        return _id
+
+    def addMedium(self, corpus, name):
+        _id = self._newID()
+        self.media[_id] = {'_id': _id, 'id_corpus': corpus, 'name': name,
+                           'url': '', 'description': {}}
+        return _id
+
+    def addLayer(self, corpus, name, id_user=None, description=None,
+                 data_type=None, fragment_type=None):
+        _id = self._newID()
+        self.layers[_id] = {
+            '_id': _id, 'id_corpus': corpus, 'name': name,
+            'description': description if description else {},
+            'data_type': data_type if data_type else {},
+            'fragment_type': fragment_type if fragment_type else {},
+            'history': [{'date': self._now(), 'id_user': id_user,
+                         'changes': {'name': name}}],
+            'permissions': {'users': {}, 'groups': {}}}
+        self._annotationIndex[_id] = {}
+        return _id
+
+    def addAnnotation(self, layer, medium, fragment, data):
+        _id = self._newID()
+        self.annotations[_id] = {'_id': _id, 'id_layer': layer,
+                                 'id_medium': medium,
+                                 'fragment': fragment, 'data': data}
+        self._annotationIndex[layer].setdefault(medium, []).append(_id)
+        return _id
+
+    def addQueue(self, name):
+        _id = self._newID()
+        self.queues[_id] = {'_id': _id, 'name': name,
+                            'description': {}, 'list': []}
+        return _id
+
+    def populate(self, videos=10, shots=100):
+        """Create a synthetic corpus with `videos` x `shots` submission shots
+
+        Returns
+        -------
+        shot : list
+            List of (videoID, shotNumber) tuples
+        """
+
+        organizer = self.addGroup(GROUP_ORGANIZER)
+        team = self.addGroup(TEAM)
+        root = self.addUser('root', groups=[organizer])
+        self.addUser(USER_ROBOT_SUBMISSION, groups=[organizer])
+        self.addUser(USER_ROBOT_LEADERBOARD, groups=[organizer])
+        self.addUser(USERNAME, groups=[team])
+        self.addQueue(QUEUE_SUBMISSION)
+
+        shot = []
+        for name in [CORPUS_NAME_DEV, CORPUS_NAME_TEST]:
+            corpus = self.addCorpus(name)
+            layer = self.addLayer(corpus, LAYER_SUBMISSION_SHOT, id_user=root)
+            for v in range(videos):
+                videoID = 'VIDEO_%06d' % v
+                medium = self.addMedium(corpus, videoID)
+                for shotNumber in range(1, shots + 1):
+                    self.addAnnotation(layer, medium,
+                                       {'shot_number': shotNumber}, {})
+                    if name == CORPUS_NAME_TEST:
+                        shot.append((videoID, shotNumber))
+
+        return shot
+
+    # -------------------------------------------------------------------------
+    # ROUTES
+    # -------------------------------------------------------------------------
+
+    def _get(self, collection, _id):
+        try:
+            return collection[_id]
+        except KeyError:
+            raise MockError(404, 'Not found.')
+
+    def _filter(self, items, params, keys):
+        for key in keys:
+            if key in params:
+                items = [item for item in items if item[key] == params[key]]
+        return items
+
+    def _layer(self, layer, history=False):
+        layer = dict(layer)
+        del layer['permissions']
+        if not history:
+            del layer['history']
+        return layer
+
+    def login(self, session, params, data):
+        for user in self.users.values():
+            if (user['username'] == data.get('username') and
+                    user['password'] == data.get('password')):
+                self._sessions[session] = user['_id']
+                return {'success': 'Authentication succeeded.'}
+        raise MockError(401, 'Authentication failed.')
+
+    def logout(self, session, params, data):
+        self._sessions.pop(session, None)
+        return {'success': 'Logged out.'}
+
+    def _me(self, session):
+        try:
+            return self._sessions[session]
+        except KeyError:
+            raise MockError(401, 'Access denied.')
+
+    def me(self, session, params, data):
+        user = dict(self.users[self._me(session)])
+        del user['password']
+        return user
+
+    def myGroups(self, session, params, data):
+        me = self._me(session)
+        return [_id for _id, group in self.groups.items()
+                if me in group['users']]
+
+    def date(self, session, params, data):
+        return {'date': self._now()}
+
+    def getUsers(self, session, params, data):
+        users = self._filter(self.users.values(), params, ['username'])
+        return [dict((k, v) for k, v in user.items() if k != 'password')
+                for user in users]
+
+    def getGroups(self, session, params, data):
+        return self._filter(self.groups.values(), params, ['name'])
+
+    def getCorpora(self, session, params, data):
+        return self._filter(self.corpora.values(), params, ['name'])
+
+    def getMedia(self, session, params, data, corpus):
+        media = [medium for medium in self.media.values()
+                 if medium['id_corpus'] == corpus]
+        return self._filter(media, params, ['name'])
+
+    def getLayers(self, session, params, data, corpus):
+        layers = [layer for layer in self.layers.values()
+                  if layer['id_corpus'] == corpus]
+        layers = self._filter(layers, params,
+                              ['name', 'data_type', 'fragment_type'])
+        history = params.get('history') == 'on'
+        return [self._layer(layer, history=history) for layer in layers]
+
+    def createLayer(self, session, params, data, corpus):
+        self._get(self.corpora, corpus)
+        _id = self.addLayer(corpus, data['name'], id_user=self._me(session),
+                            description=data.get('description'),
+                            data_type=data.get('data_type'),
+                            fragment_type=data.get('fragment_type'))
+        for annotation in data.get('annotations', []):
+            self.addAnnotation(_id, annotation.get('id_medium'),
+                               annotation.get('fragment', {}),
+                               annotation.get('data', {}))
+        return self._layer(self.layers[_id])
+
+    def getLayer(self, session, params, data, layer):
+        layer = self._get(self.layers, layer)
+        return self._layer(layer, history=params.get('history') == 'on')
+
+    def updateLayer(self, session, params, data, layer):
+        layer = self._get(self.layers, layer)
+        for key in ['name', 'description', 'data_type', 'fragment_type']:
+            if key in data:
+                layer[key] = data[key]
+        layer['history'].append({'date': self._now(),
+                                 'id_user': self._me(session),
+                                 'changes': data})
+        return self._layer(layer)
+
+    def deleteLayer(self, session, params, data, layer):
+        self._get(self.layers, layer)
+        del self.layers[layer]
+        for annotations in self._annotationIndex.pop(layer).values():
+            for annotation in annotations:
+                del self.annotations[annotation]
+        return 'OK'
+
+    def setLayerPermissions(self, session, params, data,
+                            layer, userOrGroup, _id):
+        layer = self._get(self.layers, layer)
+        layer['permissions'][userOrGroup + 's'][_id] = data['right']
+        return layer['permissions']
+
+    def getLayerPermissions(self, session, params, data, layer):
+        return self._get(self.layers, layer)['permissions']
+
+    def getAnnotations(self, session, params, data, layer):
+        self._get(self.layers, layer)
+        index = self._annotationIndex[layer]
+        if 'id_medium' in params:
+            annotations = index.get(params['id_medium'], [])
+        else:
+            annotations = [a for medium in index.values() for a in medium]
+        return [self.annotations[a] for a in annotations]
+
+    def createAnnotations(self, session, params, data, layer):
+        self._get(self.layers, layer)
+        if not isinstance(data, list):
+            data = [data]
+        created = []
+        for annotation in data:
+            _id = self.addAnnotation(layer, annotation.get('id_medium'),
+                                     annotation.get('fragment', {}),
+                                     annotation.get('data', {}))
+            created.append(self.annotations[_id])
+        return created
+
+    def updateAnnotation(self, session, params, data, annotation):
+        annotation = self._get(self.annotations, annotation)
+        for key in ['fragment', 'data']:
+            if key in data:
+                annotation[key] = data[key]
+        return annotation
+
+    def deleteAnnotation(self, session, params, data, annotation):
+        annotation = self._get(self.annotations, annotation)
+        del self.annotations[annotation['_id']]
+        self._annotationIndex[annotation['id_layer']][
+            annotation['id_medium']].remove(annotation['_id'])
+        return 'OK'
+
+    def getQueues(self, session, params, data):
+        return self._filter(self.queues.values(), params, ['name'])
+
+    def enqueue(self, session, params, data, queue):
+        queue = self._get(self.queues, queue)
+        queue['list'].extend(data if isinstance(data, list) else [data])
+        return queue
+
+    def dequeue(self, session, params, data, queue):
+        queue = self._get(self.queues, queue)
+        if not queue['list']:
+            raise MockError(400, 'Empty queue.')
+        return queue['list'].pop(0)
+
+    def handle(self, method, path, session, params, data):
+        """Process one request
+
+        Returns
+        -------
+        status : int
+            HTTP status code
+        result :
+            JSON-serializable response body
+        """
+
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        with self._lock:
+
+            if self.failure > 0 and self._random.random() < self.failure:
+                return 500, {'error': 'Injected failure.'}
+
+            for _method, pattern, handler in self.routes:
+                if _method != method:
+                    continue
+                match = pattern.match(path)
+                if match is None:
+                    continue
+                try:
+                    return 200, handler(session, params, data,
+                                        *match.groups())
+                except MockError as e:
+                    return e.status, {'error': str(e)}
+
+        return 404, {'error': 'Unknown route %s %s.' % (method, path)}
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+
+    # keep-alive connections
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def _handle(self, method):
+
+        url = urlparse(self.path)
+        params = dict((k, v[-1]) for k, v in parse_qs(url.query).items())
+
+        camomile = self.server.camomile
+
+        length = int(self.headers.getheader('Content-Length', 0))
+        body = self.rfile.read(length) if length else ''
+
+        # simulate slow upload link
+        if camomile.bandwidth > 0:
+            time.sleep(len(body) / camomile.bandwidth)
+
+        if self.headers.getheader('Content-Encoding', 'identity') == 'gzip':
+            if not camomile.gzip:
+                self._respond(415, {'error': 'Unsupported content encoding.'})
+                return
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+
+        data = json.loads(body) if body else {}
+
+        session = None
+        for cookie in self.headers.getheaders('Cookie'):
+            for item in cookie.split(';'):
+                key, _, value = item.strip().partition('=')
+                if key == 'camomile.sid':
+                    session = value
+
+        newSession = session is None
+        if newSession:
+            session = '%032x' % random.getrandbits(128)
+
+        status, result = camomile.handle(
+            method, url.path, session, params, data)
+
+        self._respond(status, result,
+                      cookie=session if newSession else None)
+
+    def _respond(self, status, result, cookie=None):
+        content = json.dumps(result)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        if cookie is not None:
+            self.send_header('Set-Cookie', 'camomile.sid=%s; Path=/' % cookie)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockServer(ThreadingMixIn, HTTPServer):
+    """In-process Camomile stand-in, served from a background thread
+
+    Parameters
+    ----------
+    camomile : MockCamomile
+    port : int, optional
+        Defaults to any available port.
+
+    Example
+    -------
+    >>> camomile = MockCamomile(latency=0.01)
+    >>> shot = camomile.populate(videos=10, shots=100)
+    >>> server = MockServer(camomile).start()
+    >>> client = Camomile(server.url)
+    >>> server.stop()
+    """
+
+    daemon_threads = True
+
+    def __init__(self, camomile, port=0):
+        HTTPServer.__init__(self, ('127.0.0.1', port), MockRequestHandler)
+        self.camomile = camomile
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://%s:%d' % self.server_address
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+
+if __name__ == '__main__':
+
+    from docopt import docopt
+
+    arguments = docopt(__doc__)
+
+    camomile = MockCamomile(latency=float(arguments['--latency']),
+                            failure=float(arguments['--failure']),
+                            bandwidth=float(arguments['--bandwidth']),
+                            gzip=not arguments['--no-gzip'])
+    camomile.populate(videos=int(arguments['--videos']),
+                      shots=int(arguments['--shots']))
+
+    server = MockServer(camomile, port=int(arguments['--port']))
+    print 'Serving on %s (login: %s, password: %s)' % (
+        server.url, USERNAME, PASSWORD)
+    server.serve_forever()
@@ -44,6 +44,9 @@ MediaEval Person Discovery Task submission manager.
   - check        Validate submission files content.
   - primary      Submit primary run.
   - contrastive  Submit contrastive run.
+  - batch        Submit several runs at once (see <manifest> below).
+  - update       Update existing run (only uploads what changed).
+  - export       Download (all or some) runs to <directory>.
 
 Usage:
   submission [options] date
@@ -52,36 +55,66 @@ Usage:
   submission [options] check <run.label> <run.evidence>
   submission [options] primary <run.label> <run.evidence>
   submission [options] contrastive <run> <run.label> <run.evidence>
+  submission [options] batch <manifest>
+  submission [options] update <run> <run.label> <run.evidence>
+  submission [options] export <directory> [<name>...]
 
 Options:
   -h --help                Show this screen.
   --version                Show version.
   --dev                    Development set.
-  --debug                  Show debug information.
+  --debug                  Show debug information (including a summary
+                           of HTTP requests sent to the server).
+  --stats=<stats.json>     Save HTTP request statistics to JSON file.
   --url=URL                Submission server URL
                            [default: http://api.mediaeval.niderb.fr]
   --login=LOGIN            Username.
   --password=P45sw0Rd      Password.
+  --stream                 Validate and upload <run.label> while reading it
+                           (bounded memory, for very large runs). Invalid
+                           runs are removed from the server.
+  --gzip                   Send annotations gzip-compressed (falls back to
+                           uncompressed upload if the server refuses it).
+  --segments=<file.shot>   <run.label> contains time-based labels (videoID
+                           startTime endTime personName confidence), mapped
+                           to overlapping shots of <file.shot>.
+  --workers=<n>            Maximum number of concurrent downloads (export)
+                           [default: 4]
+  --format=<format>        Format of exported files: text, compressed text
+                           (.gz, .bz2, .zst) or columnar (.parquet,
+                           .arrow) [default: text]
 
 
 Arguments:
   <run.label>              Path to label submission file.
   <run.evidence>           Path to evidence submission file.
-  <run>                    Set name for contrastive run.
+                           Both can be compressed (.gz, .bz2, .zst) or
+                           columnar (.parquet, .arrow) files.
+  <run>                    Set name for contrastive run
+                           (or name of run to update).
+  <manifest>               Path to list of runs, one per line, with format
+                           "<type> <run> <run.label> <run.evidence>" where
+                           <type> is "primary" or "contrastive" (<run> must
+                           be "primary" for primary run). Relative paths are
+                           relative to the manifest location.
+  <directory>              Path to export directory. Runs are exported
+                           to "<user>.<run>.label" (and .evidence) files.
+                           Interrupted exports are resumed where they
+                           stopped.
+  <name>                   Names (or label layer IDs) of runs to export.
+                           Defaults to all (readable and complete) runs.
 """
 
 from docopt import docopt
 from getpass import getpass
-from camomile import Camomile
-from common import loadLabel, loadEvidence
-import pandas as pd
 import sys
-from progressbar import ProgressBar, Percentage
+import os
+import atexit
+import threading
+from collections import OrderedDict
 
-# pretty pandas display
-pd.set_option('display.max_rows', 500)
-pd.set_option('display.max_columns', 500)
-pd.set_option('display.width', 1000)
+# pandas, camomile (and requests) or progressbar are only imported by
+# the subcommands that actually need them: 'date' or '--help' do not
 
 # name conventions
 CORPUS_NAME_DEV = 'mediaeval.development'
@@ -93,13 +126,25 @@ USER_ROBOT_SUBMISSION = 'robot_submission'
 USER_ROBOT_LEADERBOARD = 'robot_leaderboard'
 LAYER_SUBMISSION_SHOT = 'mediaeval.submission_shot'
 QUEUE_SUBMISSION = 'mediaeval.submission.in'
+MAX_PRIMARY = 1
+MAX_CONTRASTIVE = 4
+
+# streaming upload (--stream): maximum number of annotations per request
+# and maximum number of annotations waiting in memory to be uploaded
+STREAM_BATCH_SIZE = 10000
+STREAM_BUFFER_SIZE = 100000
 
 DATATYPE_EVIDENCE = "mediaeval.persondiscovery.evidence"
 DATATYPE_LABEL = "mediaeval.persondiscovery.label"
 FRAGMENTTYPE_SUBMISSION = "mediaeval.persondiscovery._id_shot"
 
+# (Camomile data key, submission column) of evidence and label annotations
+EVIDENCE_DATA = [('person_name', 'personName'), ('source', 'source')]
+LABEL_DATA = [('person_name', 'personName'), ('confidence', 'confidence')]
+
 # Camomile client
 GLOBAL_CLIENT = None
+GLOBAL_SESSION = None
 
 # submission shots
 GLOBAL_DEV_OR_TEST = None
@@ -107,13 +152,23 @@ GLOBAL_CORPUS = None
 GLOBAL_VIDEO_MAPPING = None
 GLOBAL_SHOT_MAPPING = None
 
-# users
+# submission shots as a common.ShotTable, and their annotation IDs
+# (indexed, to map downloaded annotations back to shots)
+GLOBAL_SHOTS = None
+GLOBAL_FRAGMENTS = None
+GLOBAL_FRAGMENT_INDEX = None
+
+# shots (with their boundaries) of time-based label submissions (--segments)
+GLOBAL_SEGMENTS = None
+
+# users (indexed by ID and by name)
 GLOBAL_USERS = None
+GLOBAL_USERNAMES = None
 GLOBAL_ME = None
 GLOBAL_ROBOT_SUBMISSION = None
 GLOBAL_ROBOT_LEADERBOARD = None
 
-# groups
+# groups (indexed by ID)
 GLOBAL_GROUPS = None
 GLOBAL_TEAM = None
 GLOBAL_ORGANIZER = None
@@ -121,6 +176,11 @@ GLOBAL_ORGANIZER = None
 # queues
 GLOBAL_SUBMISSION_QUEUE = None
 
+# submissions (label layer ID ==> submission), possibly updated
+# concurrently (batch submission)
+GLOBAL_SUBMISSIONS = None
+GLOBAL_SUBMISSIONS_LOCK = threading.Lock()
+
 GLOBAL_DEBUG = False
 
 # -----------------------------------------------------------------------------
@@ -142,15 +202,48 @@ def debug(message):
 
 # find user name by its user id
 def findUsername(id_user):
-    for user in GLOBAL_USERS:
-        if user._id == id_user:
-            return user.username
-    return '?'
+    user = getUsers().get(id_user, None)
+    return '?' if user is None else user.username
+
+
+# stand-in for progress bar (e.g. when uploading runs concurrently)
+class SilentProgress(object):
+
+    def update(self, value):
+        pass
+
+    def finish(self):
+        pass
+
+
+def startProgress(message, maxval, show=True):
+    if not show:
+        return SilentProgress()
+    from progressbar import ProgressBar, Percentage
+    return ProgressBar(widgets=[message, Percentage()], maxval=maxval).start()
+
+
+# print (--debug) and/or save (--stats) HTTP request statistics
+def reportStatistics(pathToStats=None):
+    if GLOBAL_SESSION is None:
+        return
+    if GLOBAL_DEBUG:
+        debug('HTTP requests\n' + GLOBAL_SESSION.summary())
+    if pathToStats:
+        GLOBAL_SESSION.dump(pathToStats)
 
 
 def printSubmissions(submissions):
     if submissions.empty:
         return
+
+    import pandas as pd
+
+    # pretty pandas display
+    pd.set_option('display.max_rows', 500)
+    pd.set_option('display.max_columns', 500)
+    pd.set_option('display.width', 1000)
+
     columns = ['type', 'name', 'user', 'date', 'status']
     print submissions[columns]
 
@@ -159,153 +252,215 @@ def printSubmissions(submissions):
 # INITIALIZATION
 # -----------------------------------------------------------------------------
 
-def initialize(url, username=None, password=None):
+def initialize(url, username=None, password=None, compress=False):
 
     if GLOBAL_DEBUG:
         debug('initialize')
 
     global GLOBAL_CLIENT
+    global GLOBAL_SESSION
 
-    global GLOBAL_CORPUS
-
-    global GLOBAL_USERS
-    global GLOBAL_GROUPS
-
-    global GLOBAL_ME
-    global GLOBAL_TEAM
-
-    global GLOBAL_SUBMISSION_QUEUE
+    from camomile import Camomile
+    from transport import instrument
 
     # -------------------------------------------------------------------------
     # connect to Camomile server
     # -------------------------------------------------------------------------
 
+    # all other resources (corpus, users, groups, team, queue...) are
+    # only fetched when (and if) a subcommand needs them -- see below
+
     GLOBAL_CLIENT = Camomile(url)
+    GLOBAL_SESSION = instrument(GLOBAL_CLIENT, compress=compress)
     if username is None:
         username = raw_input('Login: ')
     if password is None:
         password = getpass()
     try:
         GLOBAL_CLIENT.login(username, password)
-        GLOBAL_ME = GLOBAL_CLIENT.me()
     except Exception:
         reportErrorAndExit(
             'Unable to connect to %s with login %s' % (url, username))
 
-    # -------------------------------------------------------------------------
-    # find corpus identifier (development or test set)
-    # -------------------------------------------------------------------------
 
-    try:
-        name = (CORPUS_NAME_DEV
-                if GLOBAL_DEV_OR_TEST == "dev"
-                else CORPUS_NAME_TEST)
-        corpora = GLOBAL_CLIENT.getCorpora(name=name)
-        GLOBAL_CORPUS = corpora[0]._id
-    except Exception:
-        reportErrorAndExit(
-            'Unable to identify %s corpus.' % GLOBAL_DEV_OR_TEST)
+# -----------------------------------------------------------------------------
+# LAZILY RESOLVED RESOURCES
+# -----------------------------------------------------------------------------
 
-    # -------------------------------------------------------------------------
-    # get list of users and groups
-    # -------------------------------------------------------------------------
+# current user
+def getMe():
 
-    try:
-        GLOBAL_GROUPS = GLOBAL_CLIENT.getGroups()
-        GLOBAL_USERS = GLOBAL_CLIENT.getUsers()
-    except Exception:
-        reportErrorAndExit('Unable to obtain list of users and groups.')
+    global GLOBAL_ME
 
-    # -------------------------------------------------------------------------
-    # get (supposedly unique) team of current user
-    # -------------------------------------------------------------------------
+    if GLOBAL_ME is None:
+        try:
+            GLOBAL_ME = GLOBAL_CLIENT.me()
+        except Exception:
+            reportErrorAndExit('Unable to identify current user.')
 
-    try:
-        GLOBAL_TEAM = None
-        userGroups = GLOBAL_CLIENT.getMyGroups()
-        for group in GLOBAL_GROUPS:
-            if group._id in userGroups and group.name.startswith('team_'):
-                GLOBAL_TEAM = group
-                break
-    except Exception:
-        pass
+    return GLOBAL_ME
 
-    if GLOBAL_TEAM is None:
-        reportErrorAndExit('Unable to identify your team.')
 
-    # -------------------------------------------------------------------------
-    # identify submission queue
-    # -------------------------------------------------------------------------
+# corpus identifier (development or test set)
+def getCorpus():
 
-    if GLOBAL_DEBUG:
-        debug('locate submission queue.')
+    global GLOBAL_CORPUS
 
-    try:
-        queues = [queue._id
-                  for queue in GLOBAL_CLIENT.getQueues()
-                  if queue.name == QUEUE_SUBMISSION]
-        GLOBAL_SUBMISSION_QUEUE = queues[0]
+    if GLOBAL_CORPUS is None:
+        try:
+            name = (CORPUS_NAME_DEV
+                    if GLOBAL_DEV_OR_TEST == "dev"
+                    else CORPUS_NAME_TEST)
+            corpora = GLOBAL_CLIENT.getCorpora(name=name)
+            GLOBAL_CORPUS = corpora[0]._id
+        except Exception:
+            reportErrorAndExit(
+                'Unable to identify %s corpus.' % GLOBAL_DEV_OR_TEST)
 
-    except Exception:
-        reportErrorAndExit('Unable to locate submission queue.')
+    return GLOBAL_CORPUS
 
 
-def initializeForSubmission():
+# id_user ==> user dictionary (fetched once)
+def getUsers():
+
+    global GLOBAL_USERS
+    global GLOBAL_USERNAMES
+
+    if GLOBAL_USERS is None:
+        try:
+            users = GLOBAL_CLIENT.getUsers()
+        except Exception:
+            reportErrorAndExit('Unable to obtain list of users.')
+        GLOBAL_USERS = {user._id: user for user in users}
+        GLOBAL_USERNAMES = {user.username: user for user in users}
+
+    return GLOBAL_USERS
+
+
+# id_group ==> group dictionary (fetched once)
+def getGroups():
+
+    global GLOBAL_GROUPS
+
+    if GLOBAL_GROUPS is None:
+        try:
+            GLOBAL_GROUPS = {group._id: group
+                             for group in GLOBAL_CLIENT.getGroups()}
+        except Exception:
+            reportErrorAndExit('Unable to obtain list of groups.')
+
+    return GLOBAL_GROUPS
+
+
+# find user by its name
+def getUser(username):
 
     if GLOBAL_DEBUG:
-        debug('initializeForSubmission')
+        debug('find %s user.' % username)
+
+    getUsers()
+    user = GLOBAL_USERNAMES.get(username, None)
+    if user is None:
+        reportErrorAndExit('Unable to find %s user.' % username)
+
+    return user
+
+
+# (supposedly unique) team of current user
+def getTeam():
+
+    global GLOBAL_TEAM
+
+    if GLOBAL_TEAM is None:
+        try:
+            groups = getGroups()
+            for id_group in GLOBAL_CLIENT.getMyGroups():
+                group = groups.get(id_group, None)
+                if group is not None and group.name.startswith('team_'):
+                    GLOBAL_TEAM = group
+                    break
+        except Exception:
+            pass
+
+    if GLOBAL_TEAM is None:
+        reportErrorAndExit('Unable to identify your team.')
+
+    return GLOBAL_TEAM
+
+
+# 'organizer' group
+def getOrganizer():
 
     global GLOBAL_ORGANIZER
-    global GLOBAL_ROBOT_LEADERBOARD
-    global GLOBAL_ROBOT_SUBMISSION
-    global GLOBAL_SHOT_MAPPING
-    global GLOBAL_VIDEO_MAPPING
-    global GLOBAL_SUBMISSION_QUEUE
 
-    # -------------------------------------------------------------------------
-    # find 'organizer' group
-    # -------------------------------------------------------------------------
+    if GLOBAL_ORGANIZER is None:
 
-    if GLOBAL_DEBUG:
-        debug('find %s group.' % GROUP_ORGANIZER)
+        if GLOBAL_DEBUG:
+            debug('find %s group.' % GROUP_ORGANIZER)
+
+        for group in getGroups().itervalues():
+            if group.name == GROUP_ORGANIZER:
+                GLOBAL_ORGANIZER = group
+                break
 
-    GLOBAL_ORGANIZER = None
-    for group in GLOBAL_GROUPS:
-        if group.name == GROUP_ORGANIZER:
-            GLOBAL_ORGANIZER = group
-            break
     if GLOBAL_ORGANIZER is None:
         reportErrorAndExit('Unable to find %s group.' % GROUP_ORGANIZER)
 
-    # -------------------------------------------------------------------------
-    # find 'robot_submission' user
-    # -------------------------------------------------------------------------
+    return GLOBAL_ORGANIZER
 
-    if GLOBAL_DEBUG:
-        debug('find %s user.' % USER_ROBOT_SUBMISSION)
 
-    GLOBAL_ROBOT_SUBMISSION = None
-    for user in GLOBAL_USERS:
-        if user.username == USER_ROBOT_SUBMISSION:
-            GLOBAL_ROBOT_SUBMISSION = user
-            break
+# 'robot_submission' and 'robot_leaderboard' users
+def getRobots():
+
+    global GLOBAL_ROBOT_SUBMISSION
+    global GLOBAL_ROBOT_LEADERBOARD
+
     if GLOBAL_ROBOT_SUBMISSION is None:
-        reportErrorAndExit('Unable to find %s user.' % USER_ROBOT_SUBMISSION)
+        GLOBAL_ROBOT_SUBMISSION = getUser(USER_ROBOT_SUBMISSION)
 
-    # -------------------------------------------------------------------------
-    # find 'robot_leaderboard' user
-    # -------------------------------------------------------------------------
+    if GLOBAL_ROBOT_LEADERBOARD is None:
+        GLOBAL_ROBOT_LEADERBOARD = getUser(USER_ROBOT_LEADERBOARD)
+
+    return GLOBAL_ROBOT_SUBMISSION, GLOBAL_ROBOT_LEADERBOARD
+
+
+# submission queue identifier
+def getSubmissionQueue():
+
+    global GLOBAL_SUBMISSION_QUEUE
+
+    if GLOBAL_SUBMISSION_QUEUE is None:
+
+        if GLOBAL_DEBUG:
+            debug('locate submission queue.')
+
+        try:
+            queues = GLOBAL_CLIENT.getQueues(name=QUEUE_SUBMISSION)
+            queues = [queue._id for queue in queues
+                      if queue.name == QUEUE_SUBMISSION]
+            GLOBAL_SUBMISSION_QUEUE = queues[0]
+        except Exception:
+            reportErrorAndExit('Unable to locate submission queue.')
+
+    return GLOBAL_SUBMISSION_QUEUE
+
+
+def initializeForSubmission():
 
     if GLOBAL_DEBUG:
-        debug('find %s user.' % USER_ROBOT_LEADERBOARD)
+        debug('initializeForSubmission')
 
-    GLOBAL_ROBOT_LEADERBOARD = None
-    for user in GLOBAL_USERS:
-        if user.username == USER_ROBOT_LEADERBOARD:
-            GLOBAL_ROBOT_LEADERBOARD = user
-            break
-    if GLOBAL_ROBOT_LEADERBOARD is None:
-        reportErrorAndExit('Unable to find %s user.' % USER_ROBOT_LEADERBOARD)
+    global GLOBAL_SHOT_MAPPING
+    global GLOBAL_VIDEO_MAPPING
+    global GLOBAL_SHOTS
+    global GLOBAL_FRAGMENTS
+
+    if GLOBAL_SHOT_MAPPING is not None:
+        return
+
+    from common import ShotTable
+    import pandas as pd
+    import numpy as np
 
     # -------------------------------------------------------------------------
     # get mapping for list of media
@@ -315,7 +470,7 @@ def initializeForSubmission():
         debug('build mediumID ==> videoID mapping')
 
     try:
-        media = GLOBAL_CLIENT.getMedia(corpus=GLOBAL_CORPUS)
+        media = GLOBAL_CLIENT.getMedia(corpus=getCorpus())
         GLOBAL_VIDEO_MAPPING = {medium.name: medium._id for medium in media}
     except Exception:
         reportErrorAndExit('Unable to build mediumID ==> videoID mapping')
@@ -329,12 +484,11 @@ def initializeForSubmission():
 
     try:
         layers = GLOBAL_CLIENT.getLayers(
-            GLOBAL_CORPUS, name=LAYER_SUBMISSION_SHOT)
+            getCorpus(), name=LAYER_SUBMISSION_SHOT)
         shotLayer = layers[0]._id
 
-        widgets = ['Downloading shots: ', Percentage()]
-        progress = ProgressBar(widgets=widgets,
-                               maxval=len(GLOBAL_VIDEO_MAPPING)).start()
+        progress = startProgress('Downloading shots: ',
+                                 len(GLOBAL_VIDEO_MAPPING))
 
         GLOBAL_SHOT_MAPPING = {}
         for i, (name, medium) in enumerate(GLOBAL_VIDEO_MAPPING.iteritems()):
@@ -353,15 +507,133 @@ def initializeForSubmission():
         reportErrorAndExit(
             'Unable to build (videoID, shotNumber) ==> annotationID mapping.')
 
+    shots, fragments = zip(*GLOBAL_SHOT_MAPPING.items()) \
+        if GLOBAL_SHOT_MAPPING else ([], [])
+    GLOBAL_SHOTS = ShotTable.fromFrame(
+        pd.DataFrame(list(shots), columns=['videoID', 'shotNumber']))
+    GLOBAL_FRAGMENTS = np.array(fragments, dtype=object)
 
-def createNewSubmission(submissionType, submissionName, label, evidence):
 
-    global GLOBAL_CLIENT
-    global GLOBAL_TEAM
-    global GLOBAL_CORPUS
-    global GLOBAL_ORGANIZER
-    global GLOBAL_ROBOT_SUBMISSION
-    global GLOBAL_ROBOT_LEADERBOARD
+# map submission table shots to shot annotation IDs column-wise
+def mapFragments(submission):
+    return GLOBAL_FRAGMENTS[GLOBAL_SHOTS.find(submission.key)]
+
+
+# lazily build Camomile annotations, one video at a time
+# `data` is a list of (Camomile data key, submission column) pairs
+def iterAnnotations(layer, submission, data):
+
+    fragments = mapFragments(submission)
+
+    keys = [key for key, _ in data]
+    columns = [submission[column] for _, column in data]
+
+    # group rows by video in one pass
+    groups, _ = submission.groups('video')
+
+    for video, rows in groups:
+        videoID = submission.videos.decode(video)
+        medium = GLOBAL_VIDEO_MAPPING[videoID]
+        values = zip(*[column[rows].tolist() for column in columns])
+        annotations = [{"id_layer": layer,
+                        "id_medium": medium,
+                        "fragment": fragment,
+                        "data": dict(zip(keys, value))}
+                       for fragment, value in zip(fragments[rows].tolist(),
+                                                  values)]
+        yield videoID, annotations
+
+
+# stream label file as batches of Camomile annotations, validating each line
+# as it is read (and decompressed if needed). labels are grouped by video
+# and a batch is yielded as soon as it is full (or when too many annotations
+# are waiting in memory).
+# yields (number of bytes of file read so far, batch) tuples
+def streamLabels(layer, pathToLabel, personNames,
+                 batchSize=STREAM_BATCH_SIZE, bufferSize=STREAM_BUFFER_SIZE):
+
+    from common import TextFile
+
+    personNames = set(personNames)
+    labelNames = set([])
+
+    batches = {}
+    nBuffered = 0
+
+    with TextFile(pathToLabel) as f:
+
+        for line in f:
+
+            fields = line.split()
+            if not fields:
+                continue
+
+            try:
+                videoID, shotNumber, personName, confidence = fields
+                shotNumber = int(shotNumber)
+                confidence = float(confidence)
+            except ValueError:
+                msg = 'Malformed label line: %s' % line.strip()
+                raise ValueError(msg)
+
+            # check that labels are only provided for selected shots
+            fragment = GLOBAL_SHOT_MAPPING.get((videoID, shotNumber), None)
+            if fragment is None:
+                msg = ('Labels should only be computed for provided shots.')
+                raise ValueError(msg)
+
+            # check that evidence is provided for every unique label
+            if personName not in personNames:
+                msg = ('There must be exactly one evidence '
+                       'per unique name in label submission.')
+                raise ValueError(msg)
+            labelNames.add(personName)
+
+            batch = batches.setdefault(videoID, [])
+            batch.append({"id_layer": layer,
+                          "id_medium": GLOBAL_VIDEO_MAPPING[videoID],
+                          "fragment": fragment,
+                          "data": {"person_name": personName,
+                                   "confidence": confidence}})
+            nBuffered += 1
+
+            if len(batch) >= batchSize:
+                del batches[videoID]
+
+            elif nBuffered >= bufferSize:
+                videoID = max(batches, key=lambda v: len(batches[v]))
+                batch = batches.pop(videoID)
+
+            else:
+                continue
+
+            nBuffered -= len(batch)
+            yield f.tell(), batch
+
+        nBytes = f.tell()
+
+    for batch in batches.itervalues():
+        yield nBytes, batch
+
+    # check that there is no evidence without label
+    if labelNames != personNames:
+        msg = ('There must be exactly one evidence '
+               'per unique name in label submission.')
+        raise ValueError(msg)
+
+
+# `label` is either a label DataFrame or, for streaming upload,
+# the path to the label file (which is then validated while uploaded)
+def createNewSubmission(submissionType, submissionName, label, evidence,
+                        showProgress=True):
+
+    # resolve everything needed before creating anything
+    me = getMe()
+    team = getTeam()
+    corpus = getCorpus()
+    organizer = getOrganizer()
+    robotSubmission, robotLeaderboard = getRobots()
+    queue = getSubmissionQueue()
 
     # -------------------------------------------------------------------------
     # create empty (evidence and label) submission layers
@@ -373,14 +645,14 @@ def createNewSubmission(submissionType, submissionName, label, evidence):
     try:
         # create empty evidence layer
         evidenceLayer = GLOBAL_CLIENT.createLayer(
-            GLOBAL_CORPUS, submissionName,
+            corpus, submissionName,
             data_type=DATATYPE_EVIDENCE,
             fragment_type=FRAGMENTTYPE_SUBMISSION,
             description={
                 "submission": submissionType,
                 "status": SUBMISSION_STATUS_WIP,
-                "id_user": GLOBAL_ME._id,
-                "id_team": GLOBAL_TEAM._id
+                "id_user": me._id,
+                "id_team": team._id
             },
             returns_id=True
         )
@@ -391,31 +663,31 @@ def createNewSubmission(submissionType, submissionName, label, evidence):
         #   * robot: READ
         GLOBAL_CLIENT.setLayerPermissions(
             evidenceLayer, GLOBAL_CLIENT.ADMIN,
-            group=GLOBAL_TEAM._id)
+            group=team._id)
 
         GLOBAL_CLIENT.setLayerPermissions(
             evidenceLayer, GLOBAL_CLIENT.READ,
-            group=GLOBAL_ORGANIZER._id)
+            group=organizer._id)
 
         GLOBAL_CLIENT.setLayerPermissions(
             evidenceLayer, GLOBAL_CLIENT.READ,
-            user=GLOBAL_ROBOT_SUBMISSION._id)
+            user=robotSubmission._id)
 
         GLOBAL_CLIENT.setLayerPermissions(
             evidenceLayer, GLOBAL_CLIENT.READ,
-            user=GLOBAL_ROBOT_LEADERBOARD._id)
+            user=robotLeaderboard._id)
 
         # create empty label layer
         labelLayer = GLOBAL_CLIENT.createLayer(
-            GLOBAL_CORPUS, submissionName,
+            corpus, submissionName,
             data_type=DATATYPE_LABEL,
             fragment_type=FRAGMENTTYPE_SUBMISSION,
             description={
                 "submission": submissionType,
                 "status": SUBMISSION_STATUS_WIP,
                 "id_evidence": evidenceLayer,
-                "id_user": GLOBAL_ME._id,
-                "id_team": GLOBAL_TEAM._id
+                "id_user": me._id,
+                "id_team": team._id
             },
             returns_id=True
         )
@@ -426,19 +698,19 @@ def createNewSubmission(submissionType, submissionName, label, evidence):
         #   * robot: READ
         GLOBAL_CLIENT.setLayerPermissions(
             labelLayer, GLOBAL_CLIENT.ADMIN,
-            group=GLOBAL_TEAM._id)
+            group=team._id)
 
         GLOBAL_CLIENT.setLayerPermissions(
             labelLayer, GLOBAL_CLIENT.READ,
-            group=GLOBAL_ORGANIZER._id)
+            group=organizer._id)
 
         GLOBAL_CLIENT.setLayerPermissions(
             labelLayer, GLOBAL_CLIENT.READ,
-            user=GLOBAL_ROBOT_SUBMISSION._id)
+            user=robotSubmission._id)
 
         GLOBAL_CLIENT.setLayerPermissions(
             labelLayer, GLOBAL_CLIENT.READ,
-            user=GLOBAL_ROBOT_LEADERBOARD._id)
+            user=robotLeaderboard._id)
 
         # cross-reference evidence and label layers
         GLOBAL_CLIENT.updateLayer(
@@ -447,8 +719,8 @@ def createNewSubmission(submissionType, submissionName, label, evidence):
                 "submission": submissionType,
                 "status": SUBMISSION_STATUS_WIP,
                 "id_label": labelLayer,
-                "id_user": GLOBAL_ME._id,
-                "id_team": GLOBAL_TEAM._id
+                "id_user": me._id,
+                "id_team": team._id
             }
         )
 
@@ -464,57 +736,53 @@ def createNewSubmission(submissionType, submissionName, label, evidence):
 
     try:
 
-        # prepare list of evidences in Camomile format
-        evidences = {}
-        for _, row in evidence.iterrows():
-            (personName, videoID, shotNumber, source) = tuple(row)
-            annotation = {
-                "id_layer": evidenceLayer,
-                "id_medium": GLOBAL_VIDEO_MAPPING[videoID],
-                "fragment": GLOBAL_SHOT_MAPPING[videoID, shotNumber],
-                "data": {
-                    "person_name": personName,
-                    "source": source
-                }
-            }
-            evidences.setdefault(videoID, []).append(annotation)
-
         # submit evidences video by video
 
-        widgets = ['Uploading evidences: ', Percentage()]
-        progress = ProgressBar(widgets=widgets, maxval=len(evidences)).start()
+        evidences = iterAnnotations(evidenceLayer, evidence, EVIDENCE_DATA)
+
+        progress = startProgress('Uploading evidences: ',
+                                 len(evidence.groups('video')[0]),
+                                 show=showProgress)
 
-        for v, videoID in enumerate(evidences):
-            GLOBAL_CLIENT.createAnnotations(evidenceLayer, evidences[videoID])
+        for v, (videoID, annotations) in enumerate(evidences):
+            GLOBAL_CLIENT.createAnnotations(evidenceLayer, annotations)
             progress.update(v)
 
         progress.finish()
 
-        # prepare one list of label per video in Camomile format
-        labels = {}
-        for _, row in label.iterrows():
-            (videoID, shotNumber, personName, confidence) = tuple(row)
-            annotation = {
-                "id_layer": labelLayer,
-                "id_medium": GLOBAL_VIDEO_MAPPING[videoID],
-                "fragment": GLOBAL_SHOT_MAPPING[videoID, shotNumber],
-                "data": {
-                    "person_name": personName,
-                    "confidence": confidence
-                }
-            }
-            labels.setdefault(videoID, []).append(annotation)
+        # submit labels video by video
 
-        widgets = ['Uploading labels: ', Percentage()]
-        progress = ProgressBar(widgets=widgets, maxval=len(labels)).start()
+        if isinstance(label, basestring):
+            labels = streamLabels(
+                labelLayer, label, evidence.uniqueNames())
+            maxval = os.path.getsize(label)
 
-        # submit labels video by video
-        for v, videoID in enumerate(labels):
-            GLOBAL_CLIENT.createAnnotations(labelLayer, labels[videoID])
-            progress.update(v)
+        else:
+            labels = iterAnnotations(labelLayer, label, LABEL_DATA)
+            labels = ((v, annotations)
+                      for v, (_, annotations) in enumerate(labels))
+            maxval = len(label.groups('video')[0])
+
+        progress = startProgress('Uploading labels: ', maxval,
+                                 show=showProgress)
+
+        for p, annotations in labels:
+            GLOBAL_CLIENT.createAnnotations(labelLayer, annotations)
+            progress.update(p)
 
         progress.finish()
 
+    except ValueError, e:
+        if not isinstance(label, basestring):
+            reportErrorAndExit('Unable to upload submissions.')
+        # invalid streamed labels: remove partial submission
+        try:
+            GLOBAL_CLIENT.deleteLayer(labelLayer)
+            GLOBAL_CLIENT.deleteLayer(evidenceLayer)
+        except Exception:
+            pass
+        reportErrorAndExit(e.message)
+
     except Exception:
         reportErrorAndExit('Unable to upload submissions.')
 
@@ -532,8 +800,8 @@ def createNewSubmission(submissionType, submissionName, label, evidence):
                 "submission": submissionType,
                 "status": SUBMISSION_STATUS_OK,
                 "id_label": labelLayer,
-                "id_user": GLOBAL_ME._id,
-                "id_team": GLOBAL_TEAM._id
+                "id_user": me._id,
+                "id_team": team._id
             }
         )
 
@@ -543,19 +811,21 @@ def createNewSubmission(submissionType, submissionName, label, evidence):
                 "submission": submissionType,
                 "status": SUBMISSION_STATUS_OK,
                 "id_evidence": evidenceLayer,
-                "id_user": GLOBAL_ME._id,
-                "id_team": GLOBAL_TEAM._id
+                "id_user": me._id,
+                "id_team": team._id
             }
         )
 
+        date = GLOBAL_CLIENT.getDate().date
+
         GLOBAL_CLIENT.enqueue(
-            GLOBAL_SUBMISSION_QUEUE,
+            queue,
             {
-                "submittedBy": GLOBAL_ME._id,
-                "id_team": GLOBAL_TEAM._id,
-                "team": GLOBAL_TEAM.name,
-                "user": GLOBAL_ME.username,
-                "date": GLOBAL_CLIENT.getDate().date,
+                "submittedBy": me._id,
+                "id_team": team._id,
+                "team": team.name,
+                "user": me.username,
+                "date": date,
                 "type": submissionType,
                 "name": submissionName,
                 "id_evidence": evidenceLayer,
@@ -565,64 +835,357 @@ def createNewSubmission(submissionType, submissionName, label, evidence):
     except Exception:
         reportErrorAndExit('Unable to finalize submissions.')
 
+    addSubmission(date, me.username, submissionType, submissionName,
+                  labelLayer, evidenceLayer, SUBMISSION_STATUS_OK)
 
-def getSubmissions():
 
-    # get all readable layers
-    allLayers = GLOBAL_CLIENT.getLayers(GLOBAL_CORPUS, history=True)
+# text downloaded from the server is unicode: encode it in utf-8, as when
+# loaded from files (so that non-ASCII person names compare equal)
+def encodeText(value):
+    return value.encode('utf-8') if isinstance(value, unicode) else value
 
-    submissionLayers = []
-    for layer in allLayers:
 
-        data_type = layer.get('data_type', None)
-        if data_type != DATATYPE_LABEL:
-            continue
+# download layer content as a DataFrame with one row per annotation
+# (_id, id_medium, fragment and one column per data key)
+def downloadAnnotations(layer, data):
 
-        submissionLayers.append({
-            'date': layer.history[-1].date,
-            'user': findUsername(layer.history[-1].id_user),
-            'type': layer.description.get('submission', None),
-            'name': layer.name,
-            'label': layer._id,
-            'evidence': layer.description.id_evidence,
-            'status': layer.description.status,
-        })
-
-    df = pd.DataFrame(submissionLayers)
-    return df
+    import pandas as pd
 
+    annotations = GLOBAL_CLIENT.getAnnotations(layer=layer)
 
-def checkSubmission(label, evidence):
+    columns = ['_id', 'id_medium', 'fragment'] + [c for _, c in data]
+    rows = [(a._id, a.id_medium, a.fragment) +
+            tuple(encodeText(a.data.get(key, None)) for key, _ in data)
+            for a in annotations]
+    return pd.DataFrame(rows, columns=columns)
 
-    shots = set(GLOBAL_SHOT_MAPPING)
 
-    # check that labels are only provided for selected shots
-    labelShots = set(tuple(s)
-                     for _, s in label[['videoID', 'shotNumber']].iterrows())
-    if not labelShots.issubset(shots):
-        msg = ('Labels should only be computed for provided shots.')
-        raise ValueError(msg)
+# (videoID, shotNumber) DataFrame of submission shot annotation IDs
+def unmapFragments(fragments):
 
-    # check that evidence is provided for every unique label
-    labelNames = set(label['personName'].unique())
-    evidenceNames = set(evidence['personName'].unique())
-    if labelNames != evidenceNames:
-        msg = ('There must be exactly one evidence '
-               'per unique name in label submission.')
-        raise ValueError(msg)
+    global GLOBAL_FRAGMENT_INDEX
 
-    # check that there is no more than one evidence per label
-    if len(evidenceNames) != len(evidence):
-        msg = ('There must be exactly one evidence '
-               'per unique name in label submission.')
-        raise ValueError(msg)
+    import pandas as pd
+    import numpy as np
 
-    # check that evidences are chosen among selected shots
-    evidenceShots = set(
-        tuple(s) for _, s in evidence[['videoID', 'shotNumber']].iterrows())
-    if not evidenceShots.issubset(shots):
-        msg = ('Evidences should only be chosen among provided shots.')
-        raise ValueError(msg)
+    if GLOBAL_FRAGMENT_INDEX is None:
+        GLOBAL_FRAGMENT_INDEX = pd.Index(GLOBAL_FRAGMENTS)
+
+    rows = GLOBAL_FRAGMENT_INDEX.get_indexer(
+        np.array(list(fragments), dtype=object))
+    if np.any(rows < 0):
+        raise ValueError('Annotations of unknown shots.')
+
+    return pd.DataFrame({
+        'videoID': GLOBAL_SHOTS.videos.decode(GLOBAL_SHOTS.video[rows]),
+        'shotNumber': GLOBAL_SHOTS.shotNumber[rows]},
+        columns=['videoID', 'shotNumber'])
+
+
+# download annotations of `layers` one video at a time, with at most
+# `workers` concurrent requests, except (layer, videoID) pairs in `skip`.
+# yields (layer, videoID, annotations) in order of completion (annotations
+# is None when download failed).
+def iterLayerAnnotations(layers, workers=4, skip=()):
+
+    from multiprocessing.pool import ThreadPool
+
+    tasks = [(layer, videoID, medium) for layer in layers
+             for videoID, medium in sorted(GLOBAL_VIDEO_MAPPING.items())
+             if (layer, videoID) not in skip]
+
+    def download(task):
+        layer, videoID, medium = task
+        try:
+            annotations = GLOBAL_CLIENT.getAnnotations(
+                layer=layer, medium=medium)
+        except Exception:
+            annotations = None
+        return layer, videoID, annotations
+
+    pool = ThreadPool(workers)
+    try:
+        for downloaded in pool.imap_unordered(download, tasks):
+            yield downloaded
+    finally:
+        pool.terminate()
+
+
+# convert label (or evidence) annotations to a DataFrame with the columns
+# of .label (or .evidence) files. `data` is LABEL_DATA (or EVIDENCE_DATA).
+def annotationsToFrame(annotations, data, fileType):
+
+    from common import SCHEMA
+
+    frame = unmapFragments(a.fragment for a in annotations)
+    for key, column in data:
+        frame[column] = [encodeText(a.data.get(key, None))
+                         for a in annotations]
+
+    return frame[SCHEMA[fileType]]
+
+
+# download label and evidence layers of several submissions at once
+# `submissions` is a list of (label layer, evidence layer) tuples
+# returns {label layer: (label, evidence)} DataFrames, with annotations in
+# upload order (i.e. by video), or None for submissions that could not be
+# downloaded (e.g. deleted in the meantime)
+def downloadSubmissions(submissions, workers=4):
+
+    layers = [layer for submission in submissions for layer in submission]
+
+    downloaded = dict((layer, {}) for layer in layers)
+    for layer, videoID, annotations in iterLayerAnnotations(
+            layers, workers=workers):
+        downloaded[layer][videoID] = annotations
+
+    def toFrame(layer, data, fileType):
+        videos = downloaded[layer]
+        if any(annotations is None for annotations in videos.values()):
+            raise ValueError('Unable to download layer %s.' % layer)
+        annotations = [a for videoID in sorted(videos)
+                       for a in videos[videoID]]
+        return annotationsToFrame(annotations, data, fileType)
+
+    frames = {}
+    for labelLayer, evidenceLayer in submissions:
+        try:
+            frames[labelLayer] = (
+                toFrame(labelLayer, LABEL_DATA, 'label'),
+                toFrame(evidenceLayer, EVIDENCE_DATA, 'evidence'))
+        except ValueError:
+            frames[labelLayer] = None
+
+    return frames
+
+
+# compare existing annotations (as returned by downloadAnnotations) with
+# new `submission` table. `keys` are the columns identifying a given
+# annotation (repeated keys are matched in order of appearance) and `values`
+# the columns whose change is handled by updating the annotation in place.
+# returns (rows of `submission` to create, rows of `existing` to update with
+# their new values, IDs of annotations to delete)
+def diffAnnotations(existing, table, keys, values):
+
+    import pandas as pd
+
+    submission = table.toFrame()
+    submission['fragment'] = mapFragments(table)
+    submission['id_medium'] = submission['videoID'].map(GLOBAL_VIDEO_MAPPING)
+
+    existing = existing.copy()
+    for df in [existing, submission]:
+        df['_occurrence'] = df.groupby(keys).cumcount()
+        df['_row'] = range(len(df))
+
+    on = keys + ['_occurrence']
+    merged = pd.merge(existing[on + ['_row']], submission[on + ['_row']],
+                      on=on, how='outer', suffixes=('_old', '_new'))
+
+    isOld = merged['_row_old'].notnull().values
+    isNew = merged['_row_new'].notnull().values
+
+    old = existing.iloc[merged['_row_old'][isOld & isNew].astype(int).values]
+    new = submission.iloc[merged['_row_new'][isOld & isNew].astype(int).values]
+
+    # matching annotations with changed values
+    changed = False
+    for column in values:
+        changed = changed | (old[column].values != new[column].values)
+
+    toUpdate = new[changed].copy()
+    toUpdate['_id'] = old['_id'].values[changed]
+
+    toCreate = table[merged['_row_new'][isNew & ~isOld].astype(int).values]
+    toDelete = list(existing['_id'].values[
+        merged['_row_old'][isOld & ~isNew].astype(int).values])
+
+    return toCreate, toUpdate, toDelete
+
+
+# apply differences computed by diffAnnotations to `layer`
+def applyDiff(layer, diff, data):
+
+    toCreate, toUpdate, toDelete = diff
+
+    for annotation in toDelete:
+        GLOBAL_CLIENT.deleteAnnotation(annotation)
+
+    keys = [key for key, _ in data]
+    columns = [column for _, column in data]
+    for _, row in toUpdate.iterrows():
+        GLOBAL_CLIENT.updateAnnotation(
+            row['_id'], fragment=row['fragment'],
+            data=dict(zip(keys, [row[column] for column in columns])))
+
+    for _, annotations in iterAnnotations(layer, toCreate, data):
+        GLOBAL_CLIENT.createAnnotations(layer, annotations)
+
+
+def updateSubmission(submission, label, evidence):
+
+    me = getMe()
+    team = getTeam()
+    queue = getSubmissionQueue()
+
+    submissionType = submission['type']
+    submissionName = submission['name']
+    labelLayer = submission['label']
+    evidenceLayer = submission['evidence']
+
+    # -------------------------------------------------------------------------
+    # compare existing submission with new one
+    # -------------------------------------------------------------------------
+
+    if GLOBAL_DEBUG:
+        debug('download existing submission.')
+
+    try:
+        evidences = downloadAnnotations(evidenceLayer, EVIDENCE_DATA)
+        labels = downloadAnnotations(labelLayer, LABEL_DATA)
+    except Exception:
+        reportErrorAndExit('Unable to download existing submission.')
+
+    # an evidence moved to another video cannot be updated in place:
+    # identifying it by (person name, video) makes it deleted then created
+    evidenceDiff = diffAnnotations(
+        evidences, evidence, ['personName', 'id_medium'],
+        ['fragment', 'source'])
+    labelDiff = diffAnnotations(
+        labels, label, ['personName', 'fragment'], ['confidence'])
+
+    for name, df, (toCreate, toUpdate, toDelete) in [
+            ('evidences', evidences, evidenceDiff),
+            ('labels', labels, labelDiff)]:
+        print '%s: %d created, %d updated, %d deleted, %d unchanged' % (
+            name, len(toCreate), len(toUpdate), len(toDelete),
+            len(df) - len(toUpdate) - len(toDelete))
+
+    # -------------------------------------------------------------------------
+    # upload differences
+    # -------------------------------------------------------------------------
+
+    if GLOBAL_DEBUG:
+        debug('upload differences.')
+
+    def describe(status):
+        return {"submission": submissionType,
+                "status": status,
+                "id_user": me._id,
+                "id_team": team._id}
+
+    try:
+        GLOBAL_CLIENT.updateLayer(
+            labelLayer, description=dict(describe(SUBMISSION_STATUS_WIP),
+                                         id_evidence=evidenceLayer))
+        GLOBAL_CLIENT.updateLayer(
+            evidenceLayer, description=dict(describe(SUBMISSION_STATUS_WIP),
+                                            id_label=labelLayer))
+
+        applyDiff(evidenceLayer, evidenceDiff, EVIDENCE_DATA)
+        applyDiff(labelLayer, labelDiff, LABEL_DATA)
+
+    except Exception:
+        reportErrorAndExit('Unable to upload differences.')
+
+    # -------------------------------------------------------------------------
+    # update (evidence and label) status and push to submission queue
+    # -------------------------------------------------------------------------
+
+    if GLOBAL_DEBUG:
+        debug('finalize submissions.')
+
+    try:
+        GLOBAL_CLIENT.updateLayer(
+            evidenceLayer, description=dict(describe(SUBMISSION_STATUS_OK),
+                                            id_label=labelLayer))
+        GLOBAL_CLIENT.updateLayer(
+            labelLayer, description=dict(describe(SUBMISSION_STATUS_OK),
+                                         id_evidence=evidenceLayer))
+
+        date = GLOBAL_CLIENT.getDate().date
+
+        GLOBAL_CLIENT.enqueue(
+            queue,
+            {
+                "submittedBy": me._id,
+                "id_team": team._id,
+                "team": team.name,
+                "user": me.username,
+                "date": date,
+                "type": submissionType,
+                "name": submissionName,
+                "id_evidence": evidenceLayer,
+                "id_label": labelLayer
+            })
+
+    except Exception:
+        reportErrorAndExit('Unable to finalize submissions.')
+
+    addSubmission(date, me.username, submissionType, submissionName,
+                  labelLayer, evidenceLayer, SUBMISSION_STATUS_OK)
+
+
+# list of submissions, fetched once then kept up to date locally
+def getSubmissions():
+
+    global GLOBAL_SUBMISSIONS
+
+    if GLOBAL_SUBMISSIONS is None:
+
+        # only ask for label layers (evidence layers are described
+        # by their label layer), unless client does not support it
+        try:
+            allLayers = GLOBAL_CLIENT.getLayers(
+                getCorpus(), data_type=DATATYPE_LABEL, history=True)
+        except TypeError:
+            allLayers = GLOBAL_CLIENT.getLayers(getCorpus(), history=True)
+
+        GLOBAL_SUBMISSIONS = OrderedDict()
+        for layer in allLayers:
+
+            # in case server ignored data_type filter
+            data_type = layer.get('data_type', None)
+            if data_type != DATATYPE_LABEL:
+                continue
+
+            addSubmission(
+                date=layer.history[-1].date,
+                user=findUsername(layer.history[-1].id_user),
+                submissionType=layer.description.get('submission', None),
+                name=layer.name,
+                label=layer._id,
+                evidence=layer.description.id_evidence,
+                status=layer.description.status)
+
+    import pandas as pd
+    with GLOBAL_SUBMISSIONS_LOCK:
+        df = pd.DataFrame(GLOBAL_SUBMISSIONS.values())
+    return df
+
+
+# add (newly created) submission to the list of submissions
+def addSubmission(date, user, submissionType, name, label, evidence, status):
+    if GLOBAL_SUBMISSIONS is None:
+        return
+    with GLOBAL_SUBMISSIONS_LOCK:
+        GLOBAL_SUBMISSIONS[label] = {
+            'date': date,
+            'user': user,
+            'type': submissionType,
+            'name': name,
+            'label': label,
+            'evidence': evidence,
+            'status': status,
+        }
+
+
+# remove (deleted) submission from the list of submissions
+def removeSubmission(label):
+    if GLOBAL_SUBMISSIONS is None:
+        return
+    with GLOBAL_SUBMISSIONS_LOCK:
+        GLOBAL_SUBMISSIONS.pop(label, None)
 
 
 def modeDate():
@@ -664,17 +1227,21 @@ def modeDelete():
         labelLayer = submission['label']
         evidenceLayer = submission['evidence']
 
+        me = getMe()
+        team = getTeam()
+        queue = getSubmissionQueue()
+
         try:
             GLOBAL_CLIENT.deleteLayer(labelLayer)
             GLOBAL_CLIENT.deleteLayer(evidenceLayer)
 
             GLOBAL_CLIENT.enqueue(
-                GLOBAL_SUBMISSION_QUEUE,
+                queue,
                 {
-                    "deletedBy": GLOBAL_ME._id,
-                    "id_team": GLOBAL_TEAM._id,
-                    "team": GLOBAL_TEAM.name,
-                    "user": GLOBAL_ME.username,
+                    "deletedBy": me._id,
+                    "id_team": team._id,
+                    "team": team.name,
+                    "user": me.username,
                     "date": GLOBAL_CLIENT.getDate().date,
                     "id_evidence": evidenceLayer,
                     "id_label": labelLayer
@@ -683,27 +1250,56 @@ def modeDelete():
         except Exception:
             reportErrorAndExit('Unable to delete submission.')
 
+        removeSubmission(labelLayer)
 
-def modeCheck(pathToLabel, pathToEvidence):
 
+def modeCheck(pathToLabel, pathToEvidence):
     initializeForSubmission()
+    loadSubmission(pathToLabel, pathToEvidence)
+
+
+# load (as common.LabelTable and common.EvidenceTable) and check submission.
+# `label` and `evidence` are paths to files or DataFrames.
+# in streaming mode, labels are not loaded (their path is returned instead)
+# as they are only checked while being uploaded
+def loadSubmission(label, evidence, stream=False):
+
+    from common import loadTables, checkSubmission, checkEvidence
+    from common import loadShot, loadSegments, segmentsToLabel, ShotTable
+    from common import extension, COLUMNAR
+
+    if stream and extension(label) in COLUMNAR:
+        reportErrorAndExit('--stream requires a text <run.label> file.')
+
+    if GLOBAL_SEGMENTS is not None and not stream:
+        label = segmentsToLabel(
+            ShotTable.fromFrame(loadShot(GLOBAL_SEGMENTS)),
+            loadSegments(label))
 
-    label = loadLabel(pathToLabel)
-    evidence = loadEvidence(pathToEvidence)
     try:
-        checkSubmission(label, evidence)
+        if stream:
+            evidence = loadTables(
+                evidence=evidence, videos=GLOBAL_SHOTS.videos).evidence
+            checkEvidence(GLOBAL_SHOTS, evidence)
+        else:
+            tables = loadTables(label=label, evidence=evidence,
+                                videos=GLOBAL_SHOTS.videos)
+            label, evidence = tables.label, tables.evidence
+            checkSubmission(GLOBAL_SHOTS, label, evidence)
     except ValueError, e:
         reportErrorAndExit(e.message)
 
+    return label, evidence
 
-def modePrimary(pathToLabel, pathToEvidence):
+
+def modePrimary(pathToLabel, pathToEvidence, stream=False):
 
     # get list of submission
     submissions = getSubmissions()
 
     if not submissions.empty:
         nPrimary = len(submissions[submissions.type == 'primary'])
-        if nPrimary > 0:
+        if nPrimary >= MAX_PRIMARY:
             reportErrorAndExit(
                 'Please delete your existing '
                 'primary submission first.')
@@ -711,12 +1307,8 @@ def modePrimary(pathToLabel, pathToEvidence):
     initializeForSubmission()
 
     # load evidence/label files and check their validity
-    label = loadLabel(pathToLabel)
-    evidence = loadEvidence(pathToEvidence)
-    try:
-        checkSubmission(label, evidence)
-    except ValueError, e:
-        reportErrorAndExit(e.message)
+    label, evidence = loadSubmission(pathToLabel, pathToEvidence,
+                                     stream=stream)
 
     createNewSubmission('primary', 'primary', label, evidence)
 
@@ -724,7 +1316,8 @@ def modePrimary(pathToLabel, pathToEvidence):
     printSubmissions(submissions)
 
 
-def modeContrastive(pathToLabel, pathToEvidence, submissionName):
+def modeContrastive(pathToLabel, pathToEvidence, submissionName,
+                    stream=False):
 
     # get list of submission
     submissions = getSubmissions()
@@ -735,7 +1328,7 @@ def modeContrastive(pathToLabel, pathToEvidence, submissionName):
 
     if not submissions.empty:
         nContrastive = len(submissions[submissions.type == 'contrastive'])
-        if nContrastive > 3:
+        if nContrastive >= MAX_CONTRASTIVE:
             reportErrorAndExit(
                 'Please delete one of your existing '
                 'contrastive submissions first.')
@@ -749,12 +1342,8 @@ def modeContrastive(pathToLabel, pathToEvidence, submissionName):
     initializeForSubmission()
 
     # load evidence/label files and check their validity
-    label = loadLabel(pathToLabel)
-    evidence = loadEvidence(pathToEvidence)
-    try:
-        checkSubmission(label, evidence)
-    except ValueError, e:
-        reportErrorAndExit(e.message)
+    label, evidence = loadSubmission(pathToLabel, pathToEvidence,
+                                     stream=stream)
 
     createNewSubmission('contrastive', submissionName, label, evidence)
 
@@ -762,6 +1351,332 @@ def modeContrastive(pathToLabel, pathToEvidence, submissionName):
     printSubmissions(submissions)
 
 
+def modeUpdate(pathToLabel, pathToEvidence, submissionName):
+
+    submissions = getSubmissions()
+
+    if not submissions.empty:
+        submissions = submissions[submissions.name == submissionName]
+    if submissions.empty:
+        reportErrorAndExit(
+            'There is no submission named "%s".' % submissionName)
+
+    initializeForSubmission()
+
+    label, evidence = loadSubmission(pathToLabel, pathToEvidence)
+
+    updateSubmission(dict(submissions.iloc[0]), label, evidence)
+
+    printSubmissions(getSubmissions())
+
+
+# parse batch submission manifest into list of
+# (submissionType, submissionName, pathToLabel, pathToEvidence) tuples
+def loadManifest(pathToManifest):
+
+    root = os.path.dirname(os.path.abspath(pathToManifest))
+
+    runs = []
+    with open(pathToManifest, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                submissionType, submissionName, pathToLabel, pathToEvidence = \
+                    line.split()
+            except ValueError:
+                reportErrorAndExit('Malformed manifest line: %s' % line)
+            if submissionType not in ('primary', 'contrastive'):
+                reportErrorAndExit(
+                    'Unknown submission type "%s".' % submissionType)
+            runs.append((submissionType, submissionName,
+                         os.path.join(root, pathToLabel),
+                         os.path.join(root, pathToEvidence)))
+
+    return runs
+
+
+def modeBatch(pathToManifest, stream=False):
+
+    runs = loadManifest(pathToManifest)
+
+    # -------------------------------------------------------------------------
+    # check that runs (and existing submissions) respect submission rules
+    # -------------------------------------------------------------------------
+
+    submissions = getSubmissions()
+    if submissions.empty:
+        existingTypes, existingNames = [], []
+    else:
+        existingTypes = list(submissions.type)
+        existingNames = list(submissions.name)
+
+    types = [submissionType for submissionType, _, _, _ in runs]
+    names = [submissionName for _, submissionName, _, _ in runs]
+
+    for submissionType, submissionName, _, _ in runs:
+        if (submissionType == 'primary') != (submissionName == 'primary'):
+            reportErrorAndExit(
+                'Please use "primary" as name for (and only for) '
+                'your primary submission.')
+
+    nPrimary = (existingTypes + types).count('primary')
+    if nPrimary > MAX_PRIMARY:
+        reportErrorAndExit(
+            'Please delete your existing '
+            'primary submission first.')
+
+    nContrastive = (existingTypes + types).count('contrastive')
+    if nContrastive > MAX_CONTRASTIVE:
+        reportErrorAndExit(
+            'Only %d contrastive submissions are allowed: please delete some '
+            'of your existing contrastive submissions first.' % (
+                MAX_CONTRASTIVE))
+
+    if len(set(existingNames + names)) != len(existingNames + names):
+        reportErrorAndExit(
+            'Please choose different names or '
+            'delete the existing submissions with same name.')
+
+    # -------------------------------------------------------------------------
+    # validate every run before uploading anything
+    # -------------------------------------------------------------------------
+
+    initializeForSubmission()
+
+    loaded = []
+    for submissionType, submissionName, pathToLabel, pathToEvidence in runs:
+        if GLOBAL_DEBUG:
+            debug('check %s run "%s".' % (submissionType, submissionName))
+        label, evidence = loadSubmission(pathToLabel, pathToEvidence,
+                                         stream=stream)
+        loaded.append((submissionType, submissionName, label, evidence))
+
+    # resolve once what each upload needs
+    getMe()
+    getTeam()
+    getCorpus()
+    getOrganizer()
+    getRobots()
+    getSubmissionQueue()
+
+    # -------------------------------------------------------------------------
+    # upload runs concurrently
+    # -------------------------------------------------------------------------
+
+    failed = []
+
+    def upload(submissionType, submissionName, label, evidence):
+        try:
+            createNewSubmission(submissionType, submissionName,
+                                label, evidence, showProgress=False)
+        except SystemExit:
+            failed.append(submissionName)
+        except Exception, e:
+            if GLOBAL_DEBUG:
+                debug('upload of "%s" failed: %s' % (submissionName, e))
+            failed.append(submissionName)
+
+    threads = [threading.Thread(target=upload, args=run) for run in loaded]
+
+    print 'Uploading %d runs...' % len(threads)
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    printSubmissions(getSubmissions())
+
+    if failed:
+        reportErrorAndExit(
+            'Unable to upload run(s): %s.' % ', '.join(failed))
+
+
+# export: per-video chunks of a partially downloaded layer are kept in a
+# hidden directory, stamped with the date of the exported run version.
+# chunks are plain text files (Arrow files for columnar exports, or empty
+# files for videos without annotations)
+def exportChunk(partial, videoID, fileType, suffix=''):
+    return os.path.join(partial, '%s.%s%s' % (videoID, fileType, suffix))
+
+
+def modeExport(directory, names=None, workers=4, fileFormat='text'):
+
+    from common import COMPRESSION, COLUMNAR, SCHEMA
+    from common import saveTable, createTextFile, loadLabel, loadEvidence
+    import pandas as pd
+    import shutil
+
+    # both 'gz' and '.gz' are accepted
+    suffix = '' if fileFormat == 'text' else \
+        '.' + fileFormat.lower().lstrip('.')
+    if suffix and suffix not in COMPRESSION and suffix not in COLUMNAR:
+        reportErrorAndExit('Unsupported export format "%s".' % fileFormat)
+
+    # text chunks are simply concatenated into exported text files, while
+    # columnar exports (which need pyarrow anyway) are assembled from
+    # lossless Arrow chunks
+    chunkSuffix = '.arrow' if suffix in COLUMNAR else ''
+
+    # -------------------------------------------------------------------------
+    # select runs
+    # -------------------------------------------------------------------------
+
+    submissions = getSubmissions()
+    if submissions.empty:
+        print 'No submissions.'
+        return
+
+    if names:
+        known = set(submissions.name) | set(submissions.label)
+        unknown = [name for name in names if name not in known]
+        if unknown:
+            reportErrorAndExit('Unknown run(s): %s.' % ', '.join(unknown))
+        submissions = submissions[submissions.name.isin(names) |
+                                  submissions.label.isin(names)]
+
+    # incomplete runs are still being uploaded
+    incomplete = submissions.status != SUBMISSION_STATUS_OK
+    for name in submissions.name[incomplete]:
+        print 'Skipping incomplete run "%s".' % name
+    submissions = submissions[~incomplete]
+
+    initializeForSubmission()
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    # -------------------------------------------------------------------------
+    # find what remains to be downloaded
+    # -------------------------------------------------------------------------
+
+    runs = []
+    partials = {}
+    done = set()
+
+    for _, submission in submissions.iterrows():
+
+        stem = '%s.%s' % (submission['user'], submission['name'])
+        paths = dict((fileType, os.path.join(
+            directory, '%s.%s%s' % (stem, fileType, suffix)))
+            for fileType in ['label', 'evidence'])
+
+        if all(os.path.exists(path) for path in paths.values()):
+            print 'Skipping already exported run "%s".' % stem
+            continue
+
+        # discard partial download of a previous version of the run (or of
+        # an unknown version, when interrupted before its stamp was written)
+        partial = os.path.join(directory, '.%s.part' % stem)
+        stamp = os.path.join(partial, 'date')
+        if os.path.isdir(partial):
+            date = None
+            if os.path.exists(stamp):
+                with open(stamp, 'r') as f:
+                    date = f.read()
+            if date != submission['date']:
+                shutil.rmtree(partial)
+
+        if not os.path.isdir(partial):
+            os.makedirs(partial)
+            with open(stamp, 'w') as f:
+                f.write(submission['date'])
+
+        layers = {'label': submission['label'],
+                  'evidence': submission['evidence']}
+        for fileType, layer in layers.items():
+            partials[layer] = (partial, fileType)
+            for videoID in GLOBAL_VIDEO_MAPPING:
+                if os.path.exists(exportChunk(partial, videoID, fileType,
+                                              chunkSuffix)):
+                    done.add((layer, videoID))
+
+        runs.append((stem, partial, paths))
+
+    if not runs:
+        return
+
+    # -------------------------------------------------------------------------
+    # download missing videos concurrently, each one saved as soon as
+    # downloaded so that interrupted exports can be resumed
+    # -------------------------------------------------------------------------
+
+    nTasks = len(partials) * len(GLOBAL_VIDEO_MAPPING) - len(done)
+    progress = startProgress('Downloading runs: ', max(1, nTasks))
+
+    data = {'label': LABEL_DATA, 'evidence': EVIDENCE_DATA}
+    failed = 0
+
+    for i, (layer, videoID, annotations) in enumerate(iterLayerAnnotations(
+            partials, workers=workers, skip=done)):
+
+        progress.update(i)
+
+        if annotations is None:
+            failed += 1
+            continue
+
+        partial, fileType = partials[layer]
+        try:
+            frame = annotationsToFrame(annotations, data[fileType],
+                                       fileType)
+        except ValueError, e:
+            reportErrorAndExit(e.message)
+
+        chunk = exportChunk(partial, videoID, fileType, chunkSuffix)
+        temporary = os.path.join(partial, '.' + os.path.basename(chunk))
+        if len(frame) > 0:
+            saveTable(frame, temporary)
+        else:
+            open(temporary, 'w').close()
+        os.rename(temporary, chunk)
+
+    progress.finish()
+
+    if failed:
+        reportErrorAndExit(
+            'Unable to download %d videos: run export again to resume.' % (
+                failed))
+
+    # -------------------------------------------------------------------------
+    # assemble runs, videos in upload order
+    # -------------------------------------------------------------------------
+
+    load = {'label': loadLabel, 'evidence': loadEvidence}
+
+    for stem, partial, paths in runs:
+
+        for fileType, path in paths.items():
+
+            chunks = [exportChunk(partial, videoID, fileType, chunkSuffix)
+                      for videoID in sorted(GLOBAL_VIDEO_MAPPING)]
+            chunks = [chunk for chunk in chunks
+                      if os.path.getsize(chunk) > 0]
+
+            # write then rename, so that exported files are always complete
+            temporary = os.path.join(directory,
+                                     '.' + os.path.basename(path))
+
+            if suffix in COLUMNAR:
+                frames = [load[fileType](chunk) for chunk in chunks]
+                frame = pd.concat(frames, ignore_index=True) if frames \
+                    else pd.DataFrame(columns=SCHEMA[fileType])
+                saveTable(frame, temporary)
+
+            else:
+                with createTextFile(temporary) as f:
+                    for chunk in chunks:
+                        with open(chunk, 'rb') as g:
+                            shutil.copyfileobj(g, f)
+
+            os.rename(temporary, path)
+
+        shutil.rmtree(partial)
+
+    print 'Exported %d runs to %s.' % (len(runs), directory)
+
+
 if __name__ == '__main__':
 
     arguments = docopt(__doc__, version='0.1.2')
@@ -774,10 +1689,19 @@ if __name__ == '__main__':
     if arguments['--debug']:
         GLOBAL_DEBUG = True
 
+    atexit.register(reportStatistics, pathToStats=arguments['--stats'])
+
+    stream = arguments['--stream']
+
+    GLOBAL_SEGMENTS = arguments['--segments']
+    if stream and GLOBAL_SEGMENTS:
+        reportErrorAndExit('--stream cannot be used with --segments.')
+
     url = arguments['--url']
     username = arguments['--login']
     password = arguments['--password']
-    initialize(url, username=username, password=password)
+    initialize(url, username=username, password=password,
+               compress=arguments['--gzip'])
 
     if arguments['date']:
         modeDate()
@@ -796,10 +1720,26 @@ if __name__ == '__main__':
     if arguments['primary']:
         pathToLabel = arguments['<run.label>']
         pathToEvidence = arguments['<run.evidence>']
-        modePrimary(pathToLabel, pathToEvidence)
+        modePrimary(pathToLabel, pathToEvidence, stream=stream)
 
     if arguments['contrastive']:
         submissionName = arguments['<run>']
         pathToLabel = arguments['<run.label>']
         pathToEvidence = arguments['<run.evidence>']
-        modeContrastive(pathToLabel, pathToEvidence, submissionName)
+        modeContrastive(pathToLabel, pathToEvidence, submissionName,
+                        stream=stream)
+
+    if arguments['update']:
+        submissionName = arguments['<run>']
+        pathToLabel = arguments['<run.label>']
+        pathToEvidence = arguments['<run.evidence>']
+        modeUpdate(pathToLabel, pathToEvidence, submissionName)
+
+    if arguments['batch']:
+        pathToManifest = arguments['<manifest>']
+        modeBatch(pathToManifest, stream=stream)
+
+    if arguments['export']:
+        modeExport(arguments['<directory>'], names=arguments['<name>'],
+                   workers=int(arguments['--workers']),
+                   fileFormat=arguments['--format'])
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2015 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+"""Instrumented HTTP transport for the Camomile client"""
+
+import json
+import re
+import threading
+import time
+import zlib
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# upper bounds (in milliseconds) of latency histogram bins
+LATENCY_BINS = [10, 30, 100, 300, 1000, 3000, 10000]
+
+# Camomile (MongoDB) identifiers are replaced by this placeholder
+# so that statistics are aggregated per endpoint rather than per URL
+ID_PLACEHOLDER = ':id'
+ID_PATTERN = re.compile(r'(?<=/)[0-9a-f]{24}(?=/|$)')
+
+# request bodies smaller than this (in bytes) are never compressed
+COMPRESSION_THRESHOLD = 1024
+
+# status code meaning that server does not accept compressed bodies
+# (some servers answer 400 instead, mentioning the encoding in their body)
+COMPRESSION_REFUSED = 415
+
+
+def gzipCompress(data):
+    if isinstance(data, unicode):
+        data = data.encode('utf-8')
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+# whether `response` (to a gzip-compressed request) refuses compression,
+# as opposed to any other bad request
+def compressionRefused(response):
+    if response.status_code == COMPRESSION_REFUSED:
+        return True
+    if response.status_code != 400:
+        return False
+    text = response.text.lower()
+    return 'encoding' in text or 'gzip' in text
+
+
+def endpoint(method, url):
+    path = requests.utils.urlparse(url).path
+    return '%s %s' % (method.upper(), ID_PATTERN.sub(ID_PLACEHOLDER, path))
+
+
+class RequestStatistics(object):
+    """Per-endpoint request counts, latency histograms and bytes"""
+
+    def __init__(self):
+        super(RequestStatistics, self).__init__()
+        self.endpoints = {}
+        self.compression = {'count': 0, 'raw': 0, 'compressed': 0,
+                            'time': 0.}
+        self._lock = threading.Lock()
+
+    def add(self, method, url, latency, sent, received, status):
+        # requests may be sent concurrently (e.g. batch submission)
+        with self._lock:
+            self._add(method, url, latency, sent, received, status)
+
+    def _add(self, method, url, latency, sent, received, status):
+
+        key = endpoint(method, url)
+        stats = self.endpoints.setdefault(key, {
+            'count': 0, 'errors': 0, 'latency': 0.,
+            'histogram': [0] * (len(LATENCY_BINS) + 1),
+            'sent': 0, 'received': 0})
+
+        stats['count'] += 1
+        stats['errors'] += 1 if status >= 400 else 0
+        stats['latency'] += latency
+        stats['sent'] += sent
+        stats['received'] += received
+
+        milliseconds = 1000. * latency
+        b = 0
+        while b < len(LATENCY_BINS) and milliseconds >= LATENCY_BINS[b]:
+            b += 1
+        stats['histogram'][b] += 1
+
+    def addCompression(self, raw, compressed, elapsed):
+        with self._lock:
+            self.compression['count'] += 1
+            self.compression['raw'] += raw
+            self.compression['compressed'] += compressed
+            self.compression['time'] += elapsed
+
+    def total(self, key):
+        return sum(stats[key] for stats in self.endpoints.values())
+
+    def summary(self, connections=None):
+
+        lines = []
+
+        header = '%-42s %6s %6s %9s %9s %11s %11s' % (
+            'endpoint', 'count', 'errors', 'mean(ms)', 'total(s)',
+            'sent(B)', 'recv(B)')
+        lines.append(header)
+
+        for key in sorted(self.endpoints):
+            stats = self.endpoints[key]
+            lines.append('%-42s %6d %6d %9.1f %9.2f %11d %11d' % (
+                key, stats['count'], stats['errors'],
+                1000. * stats['latency'] / stats['count'], stats['latency'],
+                stats['sent'], stats['received']))
+
+        lines.append('%-42s %6d %6d %9s %9.2f %11d %11d' % (
+            'TOTAL', self.total('count'), self.total('errors'), '',
+            self.total('latency'), self.total('sent'),
+            self.total('received')))
+
+        # latency histogram (all endpoints)
+        bins = ['<%d' % upper for upper in LATENCY_BINS]
+        bins.append('>=%d' % LATENCY_BINS[-1])
+        histogram = [sum(stats['histogram'][b]
+                         for stats in self.endpoints.values())
+                     for b in range(len(bins))]
+        lines.append('latency (ms): ' + ' '.join(
+            '%s:%d' % (b, n) for b, n in zip(bins, histogram)))
+
+        if connections is not None:
+            lines.append('connections opened: %d for %d requests' % (
+                connections, self.total('count')))
+
+        c = self.compression
+        if c['count'] > 0:
+            lines.append(
+                'gzip: %d bodies, %d B -> %d B (ratio %.1f), '
+                '%.3f s spent compressing' % (
+                    c['count'], c['raw'], c['compressed'],
+                    1. * c['raw'] / max(1, c['compressed']), c['time']))
+
+        return '\n'.join(lines)
+
+    def toJSON(self, connections=None):
+        return {'bins': LATENCY_BINS,
+                'connections': connections,
+                'compression': self.compression,
+                'endpoints': self.endpoints}
+
+
+class InstrumentedSession(requests.Session):
+    """Keep-alive session with a connection pool, recording every request
+
+    Parameters
+    ----------
+    poolsize : int, optional
+        Maximum number of connections kept alive per host.
+    compress : boolean, optional
+        Send large request bodies gzip-compressed. Compression is disabled
+        for the rest of the session as soon as the server refuses it.
+    """
+
+    def __init__(self, poolsize=10, compress=False):
+        super(InstrumentedSession, self).__init__()
+        adapter = HTTPAdapter(pool_connections=poolsize,
+                              pool_maxsize=poolsize)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+        self.statistics = RequestStatistics()
+        self.compress = compress
+
+    def request(self, method, url, **kwargs):
+
+        data = kwargs.get('data', None)
+        if (not self.compress or not isinstance(data, basestring) or
+                len(data) < COMPRESSION_THRESHOLD):
+            return self._request(method, url, **kwargs)
+
+        t = time.time()
+        compressed = gzipCompress(data)
+        self.statistics.addCompression(len(data), len(compressed),
+                                       time.time() - t)
+
+        gzipped = dict(kwargs)
+        gzipped['data'] = compressed
+        gzipped['headers'] = dict(kwargs.get('headers', None) or {})
+        gzipped['headers']['Content-Encoding'] = 'gzip'
+
+        response = self._request(method, url, **gzipped)
+
+        # server does not support compressed bodies: send it again as is
+        if compressionRefused(response):
+            self.compress = False
+            response = self._request(method, url, **kwargs)
+
+        return response
+
+    def _request(self, method, url, **kwargs):
+
+        t = time.time()
+        response = super(InstrumentedSession, self).request(
+            method, url, **kwargs)
+        latency = time.time() - t
+
+        body = response.request.body
+        sent = len(body) if body is not None else 0
+        received = len(response.content)
+        self.statistics.add(method, url, latency, sent, received,
+                            response.status_code)
+
+        return response
+
+    def connections(self):
+        """Number of connections opened so far"""
+        n = 0
+        for adapter in set(self.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                n += pools[key].num_connections
+        return n
+
+    def summary(self):
+        return self.statistics.summary(connections=self.connections())
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.statistics.toJSON(connections=self.connections()),
+                      f, indent=2, sort_keys=True)
+
+
+def instrument(client, poolsize=10, compress=False):
+    """Make Camomile `client` send its requests through an instrumented session
+
+    Returns
+    -------
+    session : InstrumentedSession
+    """
+
+    # Camomile relies on tortilla, whose root client owns a requests session
+    tortilla = client._api._parent
+
+    session = InstrumentedSession(poolsize=poolsize, compress=compress)
+    session.headers.update(tortilla.session.headers)
+    session.cookies.update(tortilla.session.cookies)
+    tortilla.session.close()
+    tortilla.session = session
+
+    return session